@@ -0,0 +1,1108 @@
+"""This module contains benchmarks of the PokeDex. Each benchmark prints its
+results as json so they can be compared from run to run."""
+
+import argparse
+import asyncio
+from collections import Counter
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import math
+import os.path
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+import zlib
+
+from aiohttp import ClientSession, web
+
+API_URL = "https://pokeapi.co/api/v2"
+STUB_HOST = "127.0.0.1"
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+FULL_DEX_SIZE = 1025
+MOVE_COUNT = 919
+ABILITY_COUNT = 307
+TYPES = ['normal', 'fighting', 'flying', 'poison', 'ground', 'rock', 'bug',
+         'ghost', 'steel', 'fire', 'water', 'grass', 'electric', 'psychic',
+         'ice', 'dragon', 'dark', 'fairy']
+STATS = ['hp', 'attack', 'defense', 'special-attack', 'special-defense',
+         'speed']
+DAMAGE_CLASSES = ['status', 'physical', 'special']
+GENERATIONS = ['generation-i', 'generation-ii', 'generation-iii',
+               'generation-iv', 'generation-v', 'generation-vi',
+               'generation-vii', 'generation-viii', 'generation-ix']
+
+
+def load_pokedex(path: str = None):
+    """
+    Imports the pokedex module, from another path if one is given so the
+    benchmarks can be run against an older version of it. It is registered
+    as the pokedex module so worker processes can unpickle its classes.
+    :param path: a String
+    :return: a module
+    """
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "pokedex.py")
+    spec = importlib.util.spec_from_file_location("pokedex", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def resource(endpoint: str, id_: int, name: str, api_url: str = API_URL):
+    """
+    Creates a named reference to a resource like those of the PokeAPI
+    :param endpoint: a String
+    :param id_: an int
+    :param name: a String
+    :param api_url: a String
+    :return: a dict
+    """
+    return {"name": name, "url": f"{api_url}/{endpoint}/{id_}/"}
+
+
+def make_pokemon(id_: int, api_url: str = API_URL) -> dict:
+    """
+    Creates a json dict shaped like a PokeAPI Pokemon
+    :param id_: an int
+    :param api_url: a String
+    :return: a dict
+    """
+    rng = random.Random(id_)
+    move_ids = rng.sample(range(1, MOVE_COUNT + 1), rng.randint(20, 140))
+    return {
+        "id": id_,
+        "name": f"pokemon-{id_}",
+        "height": rng.randint(1, 200),
+        "weight": rng.randint(1, 9999),
+        "base_experience": rng.randint(30, 300),
+        "stats": [{"base_stat": rng.randint(5, 255), "effort": 0,
+                   "stat": resource("stat", i, name, api_url)}
+                  for i, name in enumerate(STATS, 1)],
+        "types": [{"slot": slot, "type": resource("type", i, TYPES[i - 1],
+                                                  api_url)}
+                  for slot, i in enumerate(
+                      rng.sample(range(1, 19), rng.randint(1, 2)), 1)],
+        "abilities": [{"is_hidden": slot == 3, "slot": slot,
+                       "ability": resource("ability", i, f"ability-{i}",
+                                           api_url)}
+                      for slot, i in enumerate(
+                          rng.sample(range(1, ABILITY_COUNT + 1),
+                                     rng.randint(1, 3)), 1)],
+        "moves": [{"move": resource("move", i, f"move-{i}", api_url),
+                   "version_group_details": [
+                       {"level_learned_at": rng.choice([0, 0, 1, 5, 15, 30]),
+                        "move_learn_method": resource("move-learn-method", 1,
+                                                      "level-up", api_url),
+                        "version_group": resource("version-group", group,
+                                                  f"version-group-{group}",
+                                                  api_url)}
+                       for group in range(1, rng.randint(2, 12))]}
+                  for i in move_ids]
+    }
+
+
+def make_move(id_: int, api_url: str = API_URL) -> dict:
+    """
+    Creates a json dict shaped like a PokeAPI Move
+    :param id_: an int
+    :param api_url: a String
+    :return: a dict
+    """
+    rng = random.Random(-id_)
+    return {
+        "id": id_,
+        "name": f"move-{id_}",
+        "accuracy": rng.choice([None, 70, 85, 90, 95, 100]),
+        "power": rng.choice([None, 40, 60, 80, 90, 120]),
+        "pp": rng.choice([5, 10, 15, 20, 35]),
+        "generation": resource("generation", id_ % 9 + 1,
+                               GENERATIONS[id_ % 9], api_url),
+        "type": resource("type", id_ % 18 + 1, TYPES[id_ % 18], api_url),
+        "damage_class": resource("move-damage-class", id_ % 3 + 1,
+                                 DAMAGE_CLASSES[id_ % 3], api_url),
+        "effect_entries": [{"effect": f"Effect of move {id_}.",
+                            "short_effect": f"Short effect of move {id_}.",
+                            "language": resource("language", 9, "en",
+                                                 api_url)}]
+    }
+
+
+def make_ability(id_: int, api_url: str = API_URL) -> dict:
+    """
+    Creates a json dict shaped like a PokeAPI Ability
+    :param id_: an int
+    :param api_url: a String
+    :return: a dict
+    """
+    return {
+        "id": id_,
+        "name": f"ability-{id_}",
+        "generation": resource("generation", id_ % 9 + 1,
+                               GENERATIONS[id_ % 9], api_url),
+        "effect_entries": [{"effect": f"Effect of ability {id_}.",
+                            "short_effect": f"Short effect of ability {id_}.",
+                            "language": resource("language", 9, "en",
+                                                 api_url)}],
+        "pokemon": [{"is_hidden": False, "slot": 1,
+                     "pokemon": resource("pokemon", i, f"pokemon-{i}",
+                                         api_url)}
+                    for i in range(id_, FULL_DEX_SIZE, ABILITY_COUNT)]
+    }
+
+
+def make_stat(id_: int, api_url: str = API_URL) -> dict:
+    """
+    Creates a json dict shaped like a PokeAPI Stat
+    :param id_: an int
+    :param api_url: a String
+    :return: a dict
+    """
+    return {"id": id_, "name": STATS[id_ - 1], "is_battle_only": False}
+
+
+def make_type(id_: int, api_url: str = API_URL) -> dict:
+    """
+    Creates a json dict shaped like a PokeAPI Type
+    :param id_: an int
+    :param api_url: a String
+    :return: a dict
+    """
+    rng = random.Random(-2000 - id_)
+    relations = {'double_damage_to': [], 'half_damage_to': [],
+                 'no_damage_to': []}
+    for i, name in enumerate(TYPES, 1):
+        relation = rng.choices(list(relations) + [None],
+                               weights=[3, 3, 1, 11])[0]
+        if relation:
+            relations[relation].append(resource("type", i, name, api_url))
+    return {"id": id_, "name": TYPES[id_ - 1], "damage_relations": relations}
+
+
+def measure_memory(create, payloads: list) -> int:
+    """
+    Measures the memory retained by the PokeData created from json text
+    :param create: a function creating a PokeData from a json dict
+    :param payloads: a list of json Strings
+    :return: the number of bytes retained per PokeData
+    """
+    gc.collect()
+    tracemalloc.start()
+    datum = [create(json.loads(payload)) for payload in payloads]
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained // len(datum)
+
+
+def benchmark_memory(pokedex, options) -> dict:
+    """
+    Measures the bytes retained per Pokemon for a full-dex load
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results
+    """
+    size = options.size
+    data_handler = pokedex.DataHandler()
+    payloads = [json.dumps(make_pokemon(id_)) for id_ in range(1, size + 1)]
+    results = {"pokemon": size,
+               "bytes_per_pokemon": measure_memory(
+                   data_handler.create_pokemon, payloads)}
+
+    def create_expanded(pokemon_data):
+        return data_handler.build_pokemon_expanded(pokemon_data, lookup)
+
+    gc.collect()
+    tracemalloc.start()
+    lookup = {}
+    for id_ in range(1, len(STATS) + 1):
+        lookup[f"{API_URL}/stat/{id_}/"] = \
+            data_handler.create_stat(make_stat(id_))
+    for id_ in range(1, ABILITY_COUNT + 1):
+        lookup[f"{API_URL}/ability/{id_}/"] = \
+            data_handler.create_ability(make_ability(id_))
+    for id_ in range(1, MOVE_COUNT + 1):
+        lookup[f"{API_URL}/move/{id_}/"] = \
+            data_handler.create_move(make_move(id_))
+    details, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["bytes_per_pokemon_expanded"] = \
+        measure_memory(create_expanded, payloads) + details // size
+    return results
+
+
+class StubServer:
+    """A local stand-in for the PokeAPI serving fixture payloads with a
+    configurable latency, jitter and error rate, and ETags to revalidate
+    them with. It runs its own event loop in a background thread so the
+    PokeDex can be benchmarked as is."""
+
+    makers = {
+        'pokemon': (make_pokemon, FULL_DEX_SIZE),
+        'ability': (make_ability, ABILITY_COUNT),
+        'move': (make_move, MOVE_COUNT),
+        'stat': (make_stat, len(STATS)),
+        'type': (make_type, len(TYPES))
+    }
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, fixtures: str = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures = fixtures
+        self.payloads = {}
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.connections = set()
+        self.paths = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.port = None
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.random = random.Random(0)
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{STUB_HOST}:{self.port}/api/v2"
+
+    def payload(self, endpoint: str, key: str) -> bytes:
+        """
+        Retrieves the json of a resource, reading it from the fixture
+        directory as {endpoint}/{key}.json if one is given
+        :param endpoint: a String
+        :param key: a String of an ID or name
+        :return: bytes, or None if there is no such resource
+        """
+        if (endpoint, key) in self.payloads:
+            return self.payloads[(endpoint, key)]
+        payload = None
+        if self.fixtures:
+            path = os.path.join(self.fixtures, endpoint, f"{key}.json")
+            if os.path.isfile(path):
+                with open(path, mode='rb') as fixture:
+                    payload = fixture.read()
+        elif endpoint in self.makers:
+            make, count = self.makers[endpoint]
+            id_ = int(key.rpartition('-')[2]) if key[-1:].isdigit() else 0
+            if 1 <= id_ <= count:
+                payload = json.dumps(make(id_, self.api_url)).encode('utf-8')
+        self.payloads[(endpoint, key)] = payload
+        return payload
+
+    def count_request(self, request: web.Request):
+        """
+        Counts a request, per path, and the client connection it came from
+        :param request: a web.Request
+        """
+        self.requests += 1
+        self.paths[request.path] += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.count_request(request)
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.in_flight -= 1
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+        endpoint = request.match_info['endpoint']
+        key = request.match_info['key'].lower()
+        payload = self.payload(endpoint, key)
+        if payload is None:
+            raise web.HTTPNotFound()
+        etag = f'"{zlib.crc32(payload):08x}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            raise web.HTTPNotModified(headers={"ETag": etag})
+        self.bytes_sent += len(payload)
+        return web.Response(body=payload, content_type='application/json',
+                            headers={"ETag": etag})
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        self.count_request(request)
+        endpoint = request.match_info['endpoint']
+        if endpoint not in self.makers:
+            raise web.HTTPNotFound()
+        count = self.makers[endpoint][1]
+        limit = int(request.query.get('limit', 20))
+        offset = int(request.query.get('offset', 0))
+        next_url = None
+        if offset + limit < count:
+            next_url = f"{self.api_url}/{endpoint}/?limit={limit}" \
+                       f"&offset={offset + limit}"
+        last = min(count, offset + limit)
+        results = [resource(endpoint, id_, f"{endpoint}-{id_}", self.api_url)
+                   for id_ in range(offset + 1, last + 1)]
+        return web.json_response({"count": count, "next": next_url,
+                                  "previous": None, "results": results})
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        """
+        started = threading.Event()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_get('/api/v2/{endpoint}/', self.handle_list)
+            app.router.add_get('/api/v2/{endpoint}/{key}/', self.handle)
+            app.router.add_get('/api/v2/{endpoint}/{key}', self.handle)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, STUB_HOST, 0)
+            await site.start()
+            self.port = self.runner.addresses[0][1]
+            started.set()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self.loop)
+        started.wait()
+
+    def stop(self):
+        """
+        Stops serving and ends the background thread
+        """
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(),
+                                         self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def percentiles(samples: list) -> dict:
+    """
+    Summarizes latency samples in milliseconds
+    :param samples: a list of seconds
+    :return: a dict
+    """
+    samples = sorted(samples)
+
+    def percentile(fraction):
+        index = max(0, math.ceil(fraction * len(samples)) - 1)
+        return round(samples[index] * 1000, 3)
+
+    return {"p50_ms": percentile(0.5), "p90_ms": percentile(0.9),
+            "p99_ms": percentile(0.99),
+            "mean_ms": round(statistics.mean(samples) * 1000, 3)}
+
+
+def run_pokedex(pokedex, api_url: str, mode: str, input_: str,
+                output: str, expanded: bool = False,
+                cache_dir: str = None, cache_ttl: int = None,
+                workers: int = 0) -> float:
+    """
+    Runs PokeDex.start_pokedex once and times it, without a cache unless a
+    cache directory is given
+    :param pokedex: the pokedex module
+    :param api_url: a String
+    :param mode: a String
+    :param input_: a String of an ID or an input file
+    :param output: a String of the report file
+    :param expanded: a bool
+    :param cache_dir: a String
+    :param cache_ttl: an int
+    :param workers: the number of worker processes
+    :return: the number of seconds it took
+    """
+    request = pokedex.PokeRequest()
+    request.mode = mode
+    request.input = input_
+    request.expanded = expanded
+    request.output = output
+    request.use_cache = cache_dir is not None
+    if cache_dir is not None:
+        request.cache_dir = cache_dir
+        request.cache_ttl = cache_ttl
+    request.api_url = api_url
+    request.workers = workers
+    pokedex_ = pokedex.PokeDex()
+    pokedex_.set_request(request)
+    with contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        pokedex_.start_pokedex()
+        return time.perf_counter() - start
+
+
+def benchmark_end_to_end(pokedex, options) -> dict:
+    """
+    Measures the throughput and latency percentiles of
+    PokeDex.start_pokedex for each mode, with a single input and with an
+    input file, against a StubServer
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by scenario
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    scenarios = [('pokemon', False), ('pokemon', True), ('ability', False),
+                 ('move', False)]
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_file = os.path.join(directory, "input.txt")
+            output = os.path.join(directory, "report.txt")
+            with open(input_file, mode='w', encoding='utf-8') as ids:
+                ids.write('\n'.join(map(str, range(1, options.batch + 1))))
+            for mode, expanded in scenarios:
+                name = f"{mode}_expanded" if expanded else mode
+                requests = server.requests
+                single = [run_pokedex(pokedex, server.api_url, mode,
+                                      str(run % options.batch + 1), output,
+                                      expanded)
+                          for run in range(options.repeats)]
+                batch = [run_pokedex(pokedex, server.api_url, mode,
+                                     input_file, output, expanded)
+                         for _ in range(max(1, options.repeats // 5))]
+                results[name] = {
+                    "single": percentiles(single),
+                    "file": dict(percentiles(batch), items=options.batch,
+                                 items_per_second=round(
+                                     options.batch / statistics.mean(batch))),
+                    "upstream_requests": server.requests - requests
+                }
+    finally:
+        server.stop()
+    results["stub"] = {"latency": options.latency, "jitter": options.jitter,
+                       "error_rate": options.error_rate,
+                       "errors": server.errors}
+    return results
+
+
+def benchmark_input_specs(pokedex, options) -> dict:
+    """
+    Measures the upstream requests and the time taken by an input spec of
+    a range of IDs, and by one repeating every ID of it three times, by ID,
+    by name and in upper case, which should not cost any more requests
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by input spec
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    ids = f"1-{options.batch}"
+    specs = {
+        'range': ids,
+        'duplicated': ','.join([ids, ids, ','.join(
+            f"Pokemon-{id_}" for id_ in range(1, options.batch + 1))])
+    }
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.txt")
+            for name, spec in specs.items():
+                requests = server.requests
+                elapsed = run_pokedex(pokedex, server.api_url, 'pokemon',
+                                      spec, output)
+                results[name] = {
+                    "seconds": round(elapsed, 3),
+                    "upstream_requests": server.requests - requests
+                }
+    finally:
+        server.stop()
+    return results
+
+
+def benchmark_library(pokedex, options) -> dict:
+    """
+    Measures the time taken and the upstream requests of concurrent batch
+    lookups sharing one PokeDexClient in the event loop of the benchmark,
+    compared with the same lookups streamed
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by interface
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    callers = 10
+    batches = [range(caller * options.batch + 1,
+                     (caller + 1) * options.batch + 1)
+               for caller in range(callers)]
+
+    async def fetch(client):
+        return await asyncio.gather(*(client.fetch_pokemon(batch)
+                                      for batch in batches))
+
+    async def stream(client):
+        async def drain(batch):
+            return [pokemon async for pokemon in client.stream_pokemon(
+                batch, ordered=False)]
+        return await asyncio.gather(*(drain(batch) for batch in batches))
+
+    async def run(lookup):
+        async with pokedex.PokeDexClient(use_cache=False,
+                                         api_url=server.api_url) as client:
+            return await lookup(client)
+
+    results = {}
+    try:
+        for name, lookup in (('fetch', fetch), ('stream', stream)):
+            requests = server.requests
+            start = time.perf_counter()
+            found = asyncio.run(run(lookup))
+            elapsed = time.perf_counter() - start
+            items = sum(map(len, found))
+            results[name] = {
+                "seconds": round(elapsed, 3),
+                "items": items,
+                "items_per_second": round(items / elapsed),
+                "errors": sum(isinstance(pokemon, Exception)
+                              for batch in found for pokemon in batch),
+                "upstream_requests": server.requests - requests
+            }
+    finally:
+        server.stop()
+    return results
+
+
+def benchmark_service(pokedex, options) -> dict:
+    """
+    Measures the latency percentiles of warm /pokemon/<name> lookups of a
+    running PokeDexService, over HTTP with a keep-alive session and by
+    calling the service in process, once a first cold lookup of each name
+    has been answered from the stub server
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    request = pokedex.PokeRequest()
+    request.mode = 'serve'
+    request.use_cache = False
+    request.api_url = server.api_url
+    pokedex_ = pokedex.PokeDex()
+    pokedex_.set_request(request)
+    service = pokedex.PokeDexService(pokedex_)
+    names = [f"pokemon-{id_}" for id_ in range(1, options.batch + 1)]
+
+    async def run():
+        async with pokedex_.api_caller:
+            runner = web.AppRunner(service.create_app(), access_log=None)
+            await runner.setup()
+            try:
+                site = web.TCPSite(runner, STUB_HOST, 0)
+                await site.start()
+                url = f"http://{STUB_HOST}:{runner.addresses[0][1]}/pokemon"
+                async with ClientSession() as session:
+                    start = time.perf_counter()
+                    for name in names:
+                        async with session.get(f"{url}/{name}") as response:
+                            await response.read()
+                    cold = time.perf_counter() - start
+                    requests = server.requests
+                    http, in_process = [], []
+                    for _ in range(options.repeats):
+                        for name in names:
+                            start = time.perf_counter()
+                            async with session.get(f"{url}/{name}") \
+                                    as response:
+                                await response.read()
+                            http.append(time.perf_counter() - start)
+                            start = time.perf_counter()
+                            await service.lookup('pokemon', name)
+                            in_process.append(time.perf_counter() - start)
+                    return cold, server.requests - requests, http, in_process
+            finally:
+                await runner.cleanup()
+
+    try:
+        cold, upstream, http, in_process = asyncio.run(run())
+    finally:
+        server.stop()
+    http = percentiles(http)
+    return {
+        "cold_lookups_seconds": round(cold, 3),
+        "warm_lookups": len(names) * options.repeats,
+        "warm_upstream_requests": upstream,
+        "warm_http": http,
+        "warm_in_process": percentiles(in_process),
+        "warm_http_sub_millisecond": http["p50_ms"] < 1
+    }
+
+
+def benchmark_revalidation(pokedex, options) -> dict:
+    """
+    Measures the bytes downloaded and the time taken by a periodic full
+    refresh of an input file whose cached responses have all expired,
+    compared with the first download of it
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by run
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_file = os.path.join(directory, "input.txt")
+            output = os.path.join(directory, "report.txt")
+            cache_dir = os.path.join(directory, "cache")
+            with open(input_file, mode='w', encoding='utf-8') as ids:
+                ids.write('\n'.join(map(str, range(1, options.batch + 1))))
+            for run in ('download', 'refresh'):
+                requests = server.requests
+                bytes_sent = server.bytes_sent
+                not_modified = server.not_modified
+                elapsed = run_pokedex(pokedex, server.api_url, 'pokemon',
+                                      input_file, output, True, cache_dir, 0)
+                results[run] = {
+                    "seconds": round(elapsed, 3),
+                    "upstream_requests": server.requests - requests,
+                    "not_modified": server.not_modified - not_modified,
+                    "bytes_downloaded": server.bytes_sent - bytes_sent
+                }
+    finally:
+        server.stop()
+    return results
+
+
+def benchmark_sync(pokedex, options) -> dict:
+    """
+    Measures the requests sent and the bytes downloaded by a sync of a
+    full store, a sync with nothing new, a sync revalidating every
+    resource once they are all due, and a snapshot and the first sync
+    after it
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by run
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = os.path.join(directory, "store.db")
+            snapshot = os.path.join(directory, "snapshot.db")
+            cache_dir = os.path.join(directory, "cache")
+            runs = (('initial', 'sync', store, DEFAULT_CACHE_TTL),
+                    ('unchanged', 'sync', store, DEFAULT_CACHE_TTL),
+                    ('revalidate', 'sync', store, 0),
+                    ('snapshot', 'snapshot', snapshot, DEFAULT_CACHE_TTL),
+                    ('after_snapshot', 'sync', snapshot, DEFAULT_CACHE_TTL))
+            for run, mode, input_, cache_ttl in runs:
+                requests = server.requests
+                bytes_sent = server.bytes_sent
+                not_modified = server.not_modified
+                elapsed = run_pokedex(pokedex, server.api_url, mode, input_,
+                                      None, False, cache_dir, cache_ttl)
+                results[run] = {
+                    "seconds": round(elapsed, 3),
+                    "upstream_requests": server.requests - requests,
+                    "not_modified": server.not_modified - not_modified,
+                    "bytes_downloaded": server.bytes_sent - bytes_sent
+                }
+    finally:
+        server.stop()
+    return results
+
+
+def time_command(args: list, repeats: int) -> float:
+    """
+    Runs a command in a fresh interpreter a number of times
+    :param args: a list of the arguments of the interpreter
+    :param repeats: an int
+    :return: the median number of milliseconds a run took
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1e3, 1)
+
+
+def benchmark_startup(pokedex, options) -> dict:
+    """
+    Measures the cold start of the command line in fresh interpreters, for
+    --help and for a lookup answered from a warm cache, with the modules
+    python -X importtime reports the lookup imported
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results
+    """
+    server = StubServer()
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            cache_dir = os.path.join(directory, "cache")
+            run_pokedex(pokedex, server.api_url, 'pokemon', '25', os.devnull,
+                        False, cache_dir, DEFAULT_CACHE_TTL)
+            lookup = [pokedex.__file__, 'pokemon', '25', '--api-url',
+                      server.api_url, '--cache-dir', cache_dir, '--output',
+                      os.devnull]
+            requests = server.requests
+            importtime = subprocess.run(
+                [sys.executable, '-X', 'importtime'] + lookup,
+                capture_output=True, text=True).stderr
+            imports = {}
+            for line in importtime.splitlines():
+                if line.startswith("import time:") and "|" in line:
+                    _, cumulative, name = line.split('|')
+                    if cumulative.strip().isdigit() and name[2:3] != ' ':
+                        imports[name.strip()] = int(cumulative) / 1e3
+            results = {
+                "help_ms": time_command([pokedex.__file__, '--help'],
+                                        options.repeats),
+                "cached_lookup_ms": time_command(lookup, options.repeats),
+                "cached_lookup_upstream_requests":
+                    server.requests - requests,
+                "cached_lookup_import_ms": round(sum(imports.values()), 1),
+                "cached_lookup_imports_aiohttp": any(
+                    name.partition('.')[0] == "aiohttp" for name in imports),
+                "slowest_imports_ms": dict(sorted(
+                    ((name, round(ms, 1)) for name, ms in imports.items()),
+                    key=lambda item: -item[1])[:5])
+            }
+    finally:
+        server.stop()
+    if options.startup_budget:
+        results["within_budget"] = \
+            results["cached_lookup_ms"] <= options.startup_budget
+    return results
+
+
+def benchmark_scaling(pokedex, options) -> dict:
+    """
+    Measures how creating and rendering a full dex of expanded Pokemon
+    scales with the number of worker processes, once every response is
+    cached
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by number of workers
+    """
+    server = StubServer(options.latency, options.jitter, options.error_rate,
+                        options.fixtures)
+    server.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_file = os.path.join(directory, "input.txt")
+            output = os.path.join(directory, "report.txt")
+            cache_dir = os.path.join(directory, "cache")
+            with open(input_file, mode='w', encoding='utf-8') as ids:
+                ids.write('\n'.join(map(str, range(1, options.size + 1))))
+            run_pokedex(pokedex, server.api_url, 'pokemon', input_file,
+                        output, True, cache_dir, DEFAULT_CACHE_TTL)
+            for workers in (0, 1, 2, 4, 8):
+                elapsed = min(
+                    run_pokedex(pokedex, server.api_url, 'pokemon',
+                                input_file, output, True, cache_dir,
+                                DEFAULT_CACHE_TTL, workers)
+                    for _ in range(max(1, options.repeats // 10)))
+                results[f"workers_{workers}"] = {
+                    "seconds": round(elapsed, 3),
+                    "pokemon_per_second": round(options.size / elapsed)
+                }
+    finally:
+        server.stop()
+    baseline = results["workers_0"]["seconds"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["seconds"], 2)
+    return results
+
+
+def benchmark_micro(pokedex, options) -> dict:
+    """
+    Measures the time to create each class of PokeData with DataHandler and
+    to render it with __str__
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of microseconds per call
+    """
+    data_handler = pokedex.DataHandler()
+    payloads = {
+        'pokemon': (data_handler.create_pokemon, make_pokemon(25)),
+        'ability': (data_handler.create_ability, make_ability(25)),
+        'move': (data_handler.create_move, make_move(25)),
+        'stat': (data_handler.create_stat, make_stat(2))
+    }
+    results = {}
+    for name, (create, payload) in payloads.items():
+        data = create(payload)
+        results[name] = {}
+        for label, statement in (('create_us', lambda: create(payload)),
+                                 ('str_us', data.__str__)):
+            timer = timeit.Timer(statement)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=5, number=number))
+            results[name][label] = round(best / number * 1e6, 3)
+    return results
+
+
+def benchmark_formats(pokedex, options) -> dict:
+    """
+    Measures the throughput of each output format writing a full dex
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of records per second by format
+    """
+    size = options.size
+    data_handler = pokedex.DataHandler()
+    datum = [data_handler.create_pokemon(make_pokemon(id_))
+             for id_ in range(1, size + 1)]
+    request = pokedex.PokeRequest()
+    pokedex_ = pokedex.PokeDex()
+    pokedex_.request = request
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for output_format in ('text', 'jsonl', 'csv', 'columnar'):
+            request.output_format = output_format
+            request.output = os.path.join(directory, output_format)
+            start = time.perf_counter()
+            serializer = pokedex_.open_report()
+            for data in datum:
+                serializer.write(data)
+            serializer.close()
+            serializer.output.close()
+            elapsed = time.perf_counter() - start
+            results[output_format] = {
+                "records_per_second": round(size / elapsed),
+                "bytes": os.path.getsize(request.output)
+            }
+    return results
+
+
+def benchmark_decoding(pokedex, options) -> dict:
+    """
+    Measures the time and the memory allocated to decode the responses of
+    each mode with each available json decoder, with and without the field
+    projection of PokeAPICaller.decode
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results by mode and decoder
+    """
+    api_caller = pokedex.PokeAPICaller()
+    makers = {'pokemon': (make_pokemon, options.size),
+              'ability': (make_ability, ABILITY_COUNT),
+              'move': (make_move, MOVE_COUNT),
+              'stat': (make_stat, len(STATS))}
+    results = {}
+    for mode, (make, count) in makers.items():
+        url = getattr(api_caller, f"{mode}_url").format(1)
+        payloads = [json.dumps(make(id_)).encode('utf-8')
+                    for id_ in range(1, count + 1)]
+        projected = [api_caller.decode(url, payload) for payload in payloads]
+        results[mode] = {
+            "items": count,
+            "bytes": sum(map(len, payloads)),
+            "projected_bytes": sum(len(json.dumps(data, separators=(',', ':')))
+                                   for data in projected)
+        }
+        for name, loads in pokedex.JSON_DECODERS.items():
+            if loads is None:
+                continue
+            api_caller.loads = loads
+            for label, decode in (
+                    ('full', loads),
+                    ('projected',
+                     lambda payload: api_caller.decode(url, payload))):
+                gc.collect()
+                tracemalloc.start()
+                datum = [decode(payload) for payload in payloads]
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del datum
+                start = time.perf_counter()
+                for payload in payloads:
+                    decode(payload)
+                elapsed = time.perf_counter() - start
+                results[mode][f"{name}_{label}"] = {
+                    "us_per_item": round(elapsed / count * 1e6, 3),
+                    "retained_bytes_per_item": retained // count,
+                    "peak_bytes": peak
+                }
+    return results
+
+
+def benchmark_query(pokedex, options) -> dict:
+    """
+    Measures the time to load a full dex into a PokeIndex and to answer
+    typical queries over it
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of milliseconds and matches per query
+    """
+    data_handler = pokedex.DataHandler()
+    datum = [data_handler.create_pokemon(make_pokemon(id_))
+             for id_ in range(1, options.size + 1)]
+    datum += [data_handler.create_move(make_move(id_))
+              for id_ in range(1, MOVE_COUNT + 1)]
+    datum += [data_handler.create_ability(make_ability(id_))
+              for id_ in range(1, ABILITY_COUNT + 1)]
+    start = time.perf_counter()
+    index = pokedex.PokeIndex()
+    index.add_all(datum)
+    results = {"index_ms": round((time.perf_counter() - start) * 1e3, 3),
+               "records": len(index), "queries": {}}
+    queries = (
+        "pokemon type=fire speed>100 sort=-speed",
+        "pokemon ability=ability-1,ability-2,ability-3,ability-4 hp>=80",
+        "pokemon move=move-1 fields=name,type limit=20",
+        "move power>=90 damage_class=physical generation=generation-ii",
+        "move type!=normal accuracy=100 sort=-power limit=10",
+        "ability generation=generation-iii sort=name"
+    )
+    for text in queries:
+        query = pokedex.PokeQuery.parse(text)
+        index.select(query)
+        timer = timeit.Timer(lambda: index.select(query))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number))
+        results["queries"][text] = {
+            "ms": round(best / number * 1e3, 4),
+            "matches": index.select(query)[2]
+        }
+    return results
+
+
+def benchmark_tables(pokedex, options) -> dict:
+    """
+    Measures the time to compute the PokeTables of a full dex, the size of
+    its tables file and the time to rank the best counters to teams of one
+    to six Pokemon over it, in Python loops and vectorized with NumPy when
+    it is installed
+    :param pokedex: the pokedex module
+    :param options: the argparse.Namespace of the benchmarks
+    :return: a dict of results
+    """
+    data_handler = pokedex.DataHandler()
+    pokemon = [data_handler.create_pokemon(make_pokemon(id_))
+               for id_ in range(1, options.size + 1)]
+    moves = [data_handler.create_move(make_move(id_))
+             for id_ in range(1, MOVE_COUNT + 1)]
+    types = [make_type(id_) for id_ in range(1, len(TYPES) + 1)]
+    start = time.perf_counter()
+    tables = pokedex.PokeTables.build(pokemon, moves, types)
+    results = {"build_ms": round((time.perf_counter() - start) * 1e3, 3),
+               "pokemon": len(tables)}
+    output = io.BytesIO()
+    tables.write(output)
+    results["file_bytes"] = output.tell()
+    output.seek(0)
+    start = time.perf_counter()
+    pokedex.PokeTables.read(output)
+    results["read_ms"] = round((time.perf_counter() - start) * 1e3, 3)
+    vectorized = pokedex.PokeTables.vectorized
+    passes = {'loops': False, 'vectorized': True} if vectorized \
+        else {'loops': False}
+    results["counters"] = {}
+    try:
+        for size in (1, 6):
+            team = list(range(1, size + 1))
+            for name, vectorize in passes.items():
+                tables.vectorized = vectorize
+                timer = timeit.Timer(lambda: tables.best_counters(team))
+                number, _ = timer.autorange()
+                best = min(timer.repeat(repeat=3, number=number))
+                results["counters"][f"team_of_{size}_{name}"] = {
+                    "ms": round(best / number * 1e3, 3),
+                    "best": tables.best_counters(team, 1)[0][0]
+                }
+    finally:
+        del tables.vectorized
+    results["numpy"] = vectorized
+    return results
+
+
+BENCHMARKS = {
+    'memory': benchmark_memory,
+    'decoding': benchmark_decoding,
+    'formats': benchmark_formats,
+    'end_to_end': benchmark_end_to_end,
+    'input_specs': benchmark_input_specs,
+    'library': benchmark_library,
+    'service': benchmark_service,
+    'revalidation': benchmark_revalidation,
+    'sync': benchmark_sync,
+    'scaling': benchmark_scaling,
+    'query': benchmark_query,
+    'tables': benchmark_tables,
+    'startup': benchmark_startup,
+    'micro': benchmark_micro
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs='*',
+                        help="The benchmarks to run, all of them by default: "
+                             f"{', '.join(BENCHMARKS)}")
+    parser.add_argument("--pokedex", default=None,
+                        help="The path of the pokedex module to benchmark")
+    parser.add_argument("--size", type=int, default=FULL_DEX_SIZE,
+                        help="The number of Pokemon of a full dex")
+    parser.add_argument("--batch", type=int, default=100,
+                        help="The number of IDs in the input file of the "
+                             "end to end benchmark, and of names looked up "
+                             "in the service benchmark")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help="The number of single input runs of the end to "
+                             "end benchmark per mode, and of warm lookups of "
+                             "each name in the service benchmark")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="The seconds the stub server waits before "
+                             "answering")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="The maximum random seconds added to the "
+                             "latency of the stub server")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="The fraction of requests the stub server "
+                             "answers with a 503")
+    parser.add_argument("--fixtures", default=None,
+                        help="A directory of recorded payloads served by the "
+                             "stub server as {endpoint}/{id}.json instead of "
+                             "generated ones")
+    parser.add_argument("--output", default=None,
+                        help="A file the json results are written to")
+    parser.add_argument("--startup-budget", type=float, default=None,
+                        help="The maximum milliseconds of a cached lookup "
+                             "in the startup benchmark, which fails when it "
+                             "is exceeded")
+    args = parser.parse_args()
+    names = args.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+    pokedex = load_pokedex(args.pokedex)
+    results = {name: BENCHMARKS[name](pokedex, args) for name in names}
+    results_json = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as output:
+            output.write(results_json)
+    print(results_json)
+    if results.get('startup', {}).get('within_budget') is False:
+        sys.exit("The cached lookup took longer than the startup budget")
+
+
+if __name__ == '__main__':
+    main()
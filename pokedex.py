@@ -1,11 +1,122 @@
 """This module contains the classes required for a PokeDex to retrieve
 information from the PokeAPI and display it."""
 
+from __future__ import annotations
+
 import argparse
-import aiohttp
-import asyncio
 from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import ChainMap, OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+import csv
+import glob
+import importlib
+import importlib.util
+import io
+from itertools import accumulate, chain
+import json
 import os.path
+import random
+import re
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class LazyModule:
+    """A module that is only imported when one of its attributes is first
+    used, replacing itself with the module from then on, so the command
+    line does not load aiohttp or asyncio on paths that do not need them"""
+
+    def __init__(self, name: str, alias: str = None):
+        self.name = name
+        self.alias = alias or name
+
+    def __getattr__(self, attribute: str):
+        module = importlib.import_module(self.name)
+        globals()[self.alias] = module
+        return getattr(module, attribute)
+
+
+aiohttp = LazyModule('aiohttp')
+web = LazyModule('aiohttp.web', 'web')
+asyncio = LazyModule('asyncio')
+numpy = LazyModule('numpy')
+futures_process = LazyModule('concurrent.futures.process', 'futures_process')
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+DEFAULT_API_URL = "https://pokeapi.co/api/v2/"
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "pokedex")
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_CACHE_SIZE = 50000
+DEFAULT_MEMORY_CACHE_SIZE = 1024
+DEFAULT_CACHE_FLUSH_SIZE = 256
+DEFAULT_ALIAS_LIMIT = 8192
+DEFAULT_CONNECTION_LIMIT = 100
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 20
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+DEFAULT_CONCURRENCY = 50
+DEFAULT_RATE = 0
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+DEFAULT_STREAM_WINDOW = 100
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_SNAPSHOT_CHUNK = 200
+MANIFEST_SUFFIX = ".manifest.json"
+DEFAULT_ROW_GROUP_SIZE = 65536
+COLUMNAR_MAGIC = b"PKDX"
+COLUMNAR_VERSION = 1
+TABLES_MAGIC = b"PKDT"
+TABLES_VERSION = 1
+DEFAULT_COUNTERS = 10
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_WORKER_CHUNK = 64
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JSON_DECODERS = {
+    'json': json.loads,
+    'orjson': orjson.loads if orjson else None
+}
+# The fields of a Pokemon used to create its PokeData, every other field
+# is dropped as soon as a response is decoded. A nested dict keeps the
+# given fields of an object or of each object of a list, and a
+# (limit, fields) tuple keeps only the first items of a list. Only
+# Pokemon are projected: dropping their version group details saves most
+# of their memory, while projecting the much smaller Abilities, Moves and
+# Stats costs more time than it saves.
+REFERENCE_FIELDS = {'name': None, 'url': None}
+FIELD_PROJECTIONS = {
+    'pokemon': {'name': None, 'id': None, 'height': None, 'weight': None,
+                'stats': {'base_stat': None, 'stat': REFERENCE_FIELDS},
+                'types': {'type': REFERENCE_FIELDS},
+                'abilities': {'ability': REFERENCE_FIELDS},
+                'moves': {'move': REFERENCE_FIELDS,
+                          'version_group_details': (
+                              1, {'level_learned_at': None})}}
+}
+SNAPSHOT_FIELDS = {
+    'pokemon': ('name', 'id', 'height', 'weight', 'stats', 'types',
+                'abilities', 'moves'),
+    'ability': ('name', 'id', 'generation', 'effect_entries', 'pokemon'),
+    'move': ('name', 'id', 'generation', 'accuracy', 'power', 'pp', 'type',
+             'damage_class', 'effect_entries'),
+    'stat': ('name', 'id', 'is_battle_only'),
+    'type': ('name', 'id', 'damage_relations')
+}
 
 
 def setup_request_commandline():
@@ -15,11 +126,31 @@ def setup_request_commandline():
     """
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("mode", choices=['pokemon', 'ability', 'move'],
-                        help="The type of Pokemon data that will be retrieved")
+    parser.add_argument("mode", choices=['pokemon', 'ability', 'move',
+                                         'snapshot', 'sync', 'serve',
+                                         'query', 'tables', 'counters'],
+                        help="The type of Pokemon data that will be "
+                             "retrieved, 'snapshot' to download every "
+                             "resource into a local store, 'sync' to update "
+                             "it with the new and changed resources only, "
+                             "'serve' to run the PokeDex as a local HTTP "
+                             "service, 'query' to filter the cached or "
+                             "stored PokeData, 'tables' to precompute the "
+                             "stat, type and coverage tables of the cached "
+                             "or stored Pokemon or 'counters' to rank the "
+                             "best counters to a team with them")
 
-    parser.add_argument("input", help="The ID/name or text file of IDs/name "
-                                      "that needs to be queried ")
+    parser.add_argument("input", help="The IDs/names that need to be "
+                                      "queried, as a comma separated list of "
+                                      "IDs, names, ranges of IDs like 1-151 "
+                                      "and 'all', a text file of them, a glob "
+                                      "of text files such as 'ids/*.txt' or "
+                                      "'-' to read them from stdin, the file "
+                                      "of the store in snapshot and sync "
+                                      "modes, the [host:]port to listen on in "
+                                      "serve mode, the query in query mode, "
+                                      "the file of the tables in tables mode "
+                                      "or the team in counters mode")
     parser.add_argument("--expanded", action='store_true', help="Determines if"
                                                                 " certain "
                                                                 "attributes "
@@ -27,13 +158,120 @@ def setup_request_commandline():
     parser.add_argument("--output", default="print",
                         help="The output of the program. This is 'print' by "
                              "default, but can be set to a file name as well.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="The directory of the persistent response cache")
+    parser.add_argument("--no-cache", action='store_true',
+                        help="Disables the response cache")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL,
+                        help="The number of seconds a cached response stays "
+                             "fresh")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="The maximum number of responses kept in the "
+                             "persistent cache before the least recently "
+                             "used ones are evicted")
+    parser.add_argument("--connections", type=int,
+                        default=DEFAULT_CONNECTION_LIMIT,
+                        help="The maximum number of open connections to the "
+                             "PokeAPI, 0 for no limit")
+    parser.add_argument("--connections-per-host", type=int,
+                        default=DEFAULT_CONNECTION_LIMIT_PER_HOST,
+                        help="The maximum number of open connections to a "
+                             "single host, 0 for no limit")
+    parser.add_argument("--concurrency", type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help="The maximum number of requests in flight at "
+                             "the same time, at least 1")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="The maximum number of requests started per "
+                             "second, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help="The number of times a request is retried "
+                             "after a timeout, 429 or 5xx response")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="The number of seconds before a single request "
+                             "times out, greater than 0")
+    parser.add_argument("--stream", action='store_true',
+                        help="Reads, retrieves and reports the input one "
+                             "item at a time instead of all at once")
+    parser.add_argument("--ordered", action='store_true',
+                        help="Keeps the streamed report in the order of the "
+                             "input")
+    parser.add_argument("--stream-window", type=int,
+                        default=DEFAULT_STREAM_WINDOW,
+                        help="The maximum number of streamed items being "
+                             "retrieved or waiting to be reported, at least "
+                             "1")
+    parser.add_argument("--format", default='text',
+                        choices=['text', 'jsonl', 'csv', 'columnar'],
+                        help="The format of the report. This is 'text' by "
+                             "default")
+    parser.add_argument("--stats", action='store_true',
+                        help="Prints the counts, bytes and latency of each "
+                             "stage once the run is complete")
+    parser.add_argument("--metrics-file", default=None,
+                        help="A file the metrics of each stage are written "
+                             "to in the Prometheus text format")
+    parser.add_argument("--stale-while-revalidate", action='store_true',
+                        help="Answers with expired cached responses right "
+                             "away while they are revalidated in the "
+                             "background")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL,
+                        help="The base URL of the PokeAPI, to use a mirror")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="The number of worker processes creating and "
+                             "rendering PokeData, 0 to do it in the main "
+                             "process")
+    parser.add_argument("--offline", default=None,
+                        help="Resolves every request from a store created "
+                             "in snapshot mode instead of the PokeAPI")
+    parser.add_argument("--decoder", choices=['auto', 'json', 'orjson'],
+                        default='auto',
+                        help="The json decoder of PokeAPI responses, 'auto' "
+                             "uses orjson when it is installed")
+    parser.add_argument("--tables", default=None,
+                        help="A file of tables written in tables mode that "
+                             "counters mode reads instead of computing them")
+    parser.add_argument("--limit", type=int, default=DEFAULT_COUNTERS,
+                        help="The number of counters reported in counters "
+                             "mode")
     try:
         args = parser.parse_args()
+        if args.stream and args.workers > 0:
+            parser.error("--stream cannot be combined with --workers")
+        if args.stream_window < 1:
+            parser.error("--stream-window must be at least 1")
+        if args.concurrency < 1:
+            parser.error("--concurrency must be at least 1")
+        if args.timeout <= 0:
+            parser.error("--timeout must be greater than 0")
         request_ = PokeRequest()
         request_.mode = args.mode
         request_.input = args.input
         request_.expanded = args.expanded
         request_.output = args.output
+        request_.use_cache = not args.no_cache
+        request_.cache_dir = args.cache_dir
+        request_.cache_ttl = args.cache_ttl
+        request_.cache_size = args.cache_size
+        request_.stale_while_revalidate = args.stale_while_revalidate
+        request_.connection_limit = args.connections
+        request_.connection_limit_per_host = args.connections_per_host
+        request_.concurrency = args.concurrency
+        request_.rate = args.rate
+        request_.retries = args.retries
+        request_.timeout = args.timeout
+        request_.stream = args.stream
+        request_.ordered = args.ordered
+        request_.stream_window = args.stream_window
+        request_.workers = args.workers
+        request_.offline = args.offline
+        request_.output_format = args.format
+        request_.api_url = args.api_url
+        request_.stats = args.stats
+        request_.metrics_file = args.metrics_file
+        request_.decoder = args.decoder
+        request_.tables = args.tables
+        request_.limit = args.limit
         return request_
     except Exception as e:
         print(f"Error! Could not read arguments.\n{e}")
@@ -49,10 +287,34 @@ class PokeRequest:
         self.input = None
         self.expanded = False
         self.output = None
+        self.use_cache = True
+        self.cache_dir = DEFAULT_CACHE_DIR
+        self.cache_ttl = DEFAULT_CACHE_TTL
+        self.cache_size = DEFAULT_CACHE_SIZE
+        self.stale_while_revalidate = False
+        self.connection_limit = DEFAULT_CONNECTION_LIMIT
+        self.connection_limit_per_host = DEFAULT_CONNECTION_LIMIT_PER_HOST
+        self.concurrency = DEFAULT_CONCURRENCY
+        self.rate = DEFAULT_RATE
+        self.retries = DEFAULT_RETRIES
+        self.timeout = DEFAULT_TIMEOUT
+        self.stream = False
+        self.ordered = False
+        self.stream_window = DEFAULT_STREAM_WINDOW
+        self.workers = 0
+        self.offline = None
+        self.output_format = 'text'
+        self.api_url = DEFAULT_API_URL
+        self.stats = False
+        self.metrics_file = None
+        self.decoder = 'auto'
+        self.tables = None
+        self.limit = DEFAULT_COUNTERS
 
     def __str__(self):
         return f"Mode: {self.mode}\nInput: {self.input}" \
-               f"\nExpanded: {self.expanded}\nOutput: {self.output}"
+               f"\nExpanded: {self.expanded}\nOutput: {self.output}" \
+               f"\nCache: {self.cache_dir if self.use_cache else None}"
 
 
 class PokeDex:
@@ -61,52 +323,170 @@ class PokeDex:
 
     def __init__(self):
         self.api_caller = PokeAPICaller()
-        self.data_handler = DataHandler()
+        self.data_handler = DataHandler(self.api_caller)
         self.file_handler = FileHandler()
+        self.metrics = NullMetrics()
         self.request = None
 
+    def set_metrics(self, metrics):
+        """
+        Sets the Metrics recording the stages of the PokeDex
+        :param metrics: a Metrics, or a NullMetrics to disable them
+        """
+        self.metrics = metrics
+        self.api_caller.metrics = metrics
+        self.api_caller.scheduler.metrics = metrics
+        self.data_handler.metrics = metrics
+
     def set_request(self, request_: PokeRequest):
         """
         Sets the PokeRequest for the PokeDex
         :param request_: a PokeRequest
         """
         self.request = request_
+        if request_.stats or request_.metrics_file \
+                or request_.mode == 'serve':
+            self.set_metrics(Metrics())
+        else:
+            self.set_metrics(NullMetrics())
+        if self.api_caller.cache:
+            self.api_caller.cache.close()
+            self.api_caller.cache = None
+        self.set_decoder(request_.decoder)
+        if request_.use_cache and not request_.offline:
+            self.api_caller.cache = ResponseCache(
+                request_.cache_dir, request_.cache_ttl, request_.cache_size,
+                decode=self.api_caller.decode)
+        self.api_caller.stale_while_revalidate = \
+            request_.stale_while_revalidate
+        self.api_caller.set_api_url(request_.api_url)
+        self.api_caller.connection_limit = request_.connection_limit
+        self.api_caller.connection_limit_per_host = \
+            request_.connection_limit_per_host
+        self.api_caller.scheduler = RequestScheduler(
+            request_.concurrency, request_.rate, request_.retries,
+            request_.timeout)
+        self.api_caller.scheduler.metrics = self.metrics
+        if self.api_caller.store:
+            self.api_caller.store.close()
+        self.api_caller.store = \
+            SnapshotStore(request_.offline) if request_.offline else None
+
+    def set_decoder(self, decoder: str):
+        """
+        Sets the json decoder of the PokeAPICaller, falling back to the
+        standard library when orjson is asked for but not installed
+        :param decoder: a String, 'auto', 'json' or 'orjson'
+        """
+        if decoder == 'auto':
+            decoder = 'orjson' if orjson else 'json'
+        elif decoder == 'orjson' and orjson is None:
+            print("orjson is not installed, using json instead.",
+                  file=sys.stderr)
+            decoder = 'json'
+        self.api_caller.loads = JSON_DECODERS[decoder]
+
+    def report_cache_stats(self):
+        """
+        Reports the number of cache hits and misses of the last run, and
+        how many expired responses were revalidated or served stale
+        """
+        cache = self.api_caller.cache
+        if cache:
+            stats = f"Cache: {cache.hits} hits, {cache.misses} misses"
+            if cache.revalidated or cache.served_stale:
+                stats += f", {cache.revalidated} revalidated, " \
+                         f"{cache.served_stale} served stale"
+            print(stats, file=sys.stderr)
+
+    def report_metrics(self):
+        """
+        Prints the metrics of each stage if the PokeRequest asks for them
+        and writes them to its metrics file in the Prometheus text format
+        """
+        if not self.metrics.enabled:
+            return
+        if self.request.stats:
+            print(self.metrics.report(), file=sys.stderr)
+        if self.request.metrics_file:
+            try:
+                with open(self.request.metrics_file, mode='w',
+                          encoding='utf-8') as metrics_file:
+                    metrics_file.write(self.metrics.prometheus())
+            except OSError:
+                print("Unable to write the metrics file.", file=sys.stderr)
 
-    def retrieve_file_input(self):
+    def report_request_stats(self):
         """
-        Retrieves the parameters used to define the API endpoints
+        Reports the number of requests coalesced with an identical request
+        in flight and the number of retried requests
+        """
+        coalesced = self.api_caller.coalesced
+        retried = self.api_caller.scheduler.retried
+        if coalesced or retried:
+            print(f"Requests: {coalesced} coalesced, {retried} retried",
+                  file=sys.stderr)
+
+    def report_expanded_stats(self):
+        """
+        Reports how many lookups were saved by sharing the details of
+        expanded Pokemon. Details are resolved from the cache or downloaded,
+        which the cache stats tell apart.
+        """
+        references = self.data_handler.expanded_references
+        resolved = self.data_handler.expanded_resolved
+        if references:
+            print(f"Expanded: {resolved} unique details resolved for "
+                  f"{references} references ({references - resolved} "
+                  f"lookups saved)", file=sys.stderr)
+
+    def retrieve_input(self):
+        """
+        Retrieves the parameters used to define the API endpoints from the
+        input spec of the PokeRequest
         :return: a list
         """
-        file_path = self.request.input
-        return self.file_handler.handle_input_file(file_path)
+        with self.metrics.timer('file_read', 'input'):
+            return list(self.file_handler.iter_input_spec(self.request.input))
 
-    def call_poke_api(self, poke_param):
+    async def list_all_params(self, mode: str) -> list:
         """
-        Makes a call to the PokeAPI with a specified URL parameter to
-        retrieve a list of json data
-        :param poke_param:a String
-        :return:a list
+        Retrieves the IDs of every resource of a mode, from the
+        SnapshotStore when the requests are resolved offline
+        :param mode: a String, 'pokemon', 'ability' or 'move'
+        :return: a list of Strings
         """
-        multi_request_map = {
-            'pokemon': self.api_caller.process_pokemon_requests,
-            'ability': self.api_caller.process_ability_requests,
-            'move': self.api_caller.process_move_requests
-        }
-        single_request_map = {
-            'pokemon': self.api_caller.process_pokemon_request,
-            'ability': self.api_caller.process_ability_request,
-            'move': self.api_caller.process_move_request
+        if self.api_caller.store:
+            return [str(id_) for id_ in sorted(self.api_caller.store.ids_of(
+                mode))]
+        resources = await self.api_caller.process_list_request(mode)
+        return [resource["url"].rstrip('/').rpartition('/')[2]
+                for resource in resources]
+
+    async def call_poke_api(self, poke_params: list) -> tuple:
+        """
+        Makes a call to the PokeAPI for each resource of a list of URL
+        parameters, retrieving a resource requested more than once, by name
+        or by ID, only once
+        :param poke_params: a list
+        :return: a tuple of the list of the positions of the json data of
+        each parameter and the list of json data of each resource
+        """
+        url_map = {
+            'pokemon': self.api_caller.pokemon_url,
+            'ability': self.api_caller.ability_url,
+            'move': self.api_caller.move_url
         }
-        params = poke_param
-        if os.path.isfile(self.request.input):
-            poke_data = \
-                asyncio.run(multi_request_map[self.request.mode](params))
-        else:
-            poke_data = \
-                [asyncio.run(single_request_map[self.request.mode](params))]
-        return poke_data
+        url = url_map[self.request.mode]
+        if 'all' in poke_params:
+            all_params = await self.list_all_params(self.request.mode)
+            poke_params = list(chain.from_iterable(
+                all_params if poke_param == 'all' else [poke_param]
+                for poke_param in poke_params))
+        return await self.api_caller.process_unique_requests(
+            url, poke_params)
 
-    def create_poke_data(self, poke_data):
+    async def create_poke_data(self, poke_data):
         """
         Uses a list of json data and creates a Pokemon Data object
         :param poke_data: a list
@@ -115,241 +495,3974 @@ class PokeDex:
         poke_data_map = {
             'pokemon': self.data_handler.create_pokemons,
             'ability': self.data_handler.create_abilities,
-            'move': self.data_handler.create_moves,
-            'expanded': self.data_handler.create_pokemons_expanded
+            'move': self.data_handler.create_moves
         }
         if self.request.expanded and self.request.mode == 'pokemon':
-            datum = poke_data_map['expanded'](poke_data)
+            datum = \
+                await self.data_handler.create_pokemons_expanded(poke_data)
         else:
             datum = poke_data_map[self.request.mode](poke_data)
         return datum
 
+    def create_serializer(self, output):
+        """
+        Creates the Serializer of the output format of the PokeRequest
+        :param output: a file
+        :return: a Serializer
+        """
+        serializer_map = {
+            'text': TextSerializer,
+            'jsonl': JsonLinesSerializer,
+            'csv': CsvSerializer,
+            'columnar': ColumnarSerializer
+        }
+        return serializer_map[self.request.output_format](output)
+
+    def open_report(self):
+        """
+        Opens the output of the PokeRequest and the Serializer writing to it
+        :return: a Serializer
+        """
+        binary = self.request.output_format == 'columnar'
+        output = self.file_handler.open_output_stream(self.request.output,
+                                                      binary)
+        return self.create_serializer(output)
+
+    def close_report(self, serializer):
+        """
+        Finishes a report and closes its output unless it is the console
+        :param serializer: a Serializer
+        """
+        serializer.close()
+        self.close_output(serializer.output)
+
+    def close_output(self, output):
+        """
+        Closes the output of a report unless it is the console
+        :param output: a file
+        """
+        if output not in (sys.stdout, getattr(sys.stdout, 'buffer', None)):
+            output.close()
+            print(f"Report successfully written to {self.request.output}!")
+
     def report_poke_data(self, datum):
         """
         Generates a report of the PokeData retrieved
         :param datum: a PokeData
         """
-        dashes = "-" * 30
-        if self.request.output == 'print':
+        serializer = self.open_report()
+        try:
+            with self.metrics.timer('report', self.request.output_format,
+                                    len(datum)):
+                for data in datum:
+                    serializer.write(data)
+        finally:
+            self.close_report(serializer)
+
+    async def run_pokedex(self, poke_api_param):
+        """
+        Retrieves, creates and reports the PokeData of the PokeRequest
+        using a single session shared by every call to the PokeAPI
+        :param poke_api_param: a String or a list
+        """
+        async with self.api_caller:
+            try:
+                order, poke_data_param = \
+                    await self.call_poke_api(poke_api_param)
+            except PokeAPIError as error:
+                print(error, file=sys.stderr)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                print(f"Error! Could not reach the PokeAPI: {error!r}",
+                      file=sys.stderr)
+            else:
+                if self.request.workers > 0:
+                    await self.report_in_workers(
+                        [poke_data_param[position] for position in order])
+                else:
+                    poke_datum = \
+                        await self.create_poke_data(poke_data_param)
+                    self.report_poke_data([poke_datum[position]
+                                           for position in order])
+
+    async def report_in_workers(self, poke_data: list):
+        """
+        Creates and renders the PokeData of a list of json data in a pool of
+        worker processes, writing the rendered chunks in input order as
+        they are ready
+        :param poke_data: a list
+        """
+        details = None
+        if self.request.expanded and self.request.mode == 'pokemon':
+            details = await self.data_handler.fetch_detail_payloads(poke_data)
+        serializer = self.open_report()
+        renderer = ProcessRenderer(self.request.workers, self.request.mode,
+                                   type(serializer))
+        try:
+            with self.metrics.timer('report', self.request.output_format,
+                                    len(poke_data)):
+                async for rendered in renderer.render(poke_data, details):
+                    serializer.write_rendered(rendered)
+        finally:
+            renderer.close()
+            self.close_report(serializer)
+
+    async def stream_requests(self, requests: asyncio.Queue,
+                              window: asyncio.Semaphore, workers: int):
+        """
+        Lazily reads the input of the PokeRequest into a queue of requests
+        :param requests: an asyncio.Queue
+        :param window: an asyncio.Semaphore bounding the items in flight
+        :param workers: the number of workers consuming the queue
+        """
+        poke_params = self.file_handler.iter_input_spec(self.request.input)
+        index = 0
+        for poke_param in poke_params:
+            for param in await self.list_all_params(self.request.mode) \
+                    if poke_param == 'all' else [poke_param]:
+                await window.acquire()
+                await requests.put((index, param))
+                index += 1
+        for _ in range(workers):
+            await requests.put(None)
+
+    async def stream_worker(self, requests: asyncio.Queue,
+                            results: asyncio.Queue):
+        """
+        Retrieves and creates the PokeData of queued requests until the
+        queue is closed. An item whose PokeData cannot be created results in
+        a PokeAPIError in its place, like a failed request.
+        :param requests: an asyncio.Queue
+        :param results: an asyncio.Queue
+        """
+        url_map = {
+            'pokemon': self.api_caller.pokemon_url,
+            'ability': self.api_caller.ability_url,
+            'move': self.api_caller.move_url
+        }
+        url = url_map[self.request.mode]
+        while True:
+            item = await requests.get()
+            if item is None:
+                break
+            index, poke_param = item
+            item_url = self.api_caller.canonical_url(url.format(poke_param))
+            poke_data = await self.api_caller.get_data_or_error(item_url)
+            try:
+                datum = await self.create_poke_data([poke_data])
+            except Exception as e:
+                datum = [PokeAPIError(
+                    item_url, message=f"Unable to create the PokeData: "
+                                      f"{type(e).__name__}: {e}")]
+            await results.put((index, datum[0]))
+
+    async def stream_report(self, results: asyncio.Queue,
+                            window: asyncio.Semaphore, serializer):
+        """
+        Writes the PokeData of the results as they arrive, holding back
+        early results until their turn if the PokeRequest is ordered
+        :param results: an asyncio.Queue
+        :param window: an asyncio.Semaphore bounding the items in flight
+        :param serializer: a Serializer
+        """
+        pending = {}
+        next_index = 0
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            index, data = item
+            pending[index] = data
+            if not self.request.ordered:
+                next_index = index
+            while next_index in pending:
+                with self.metrics.timer('report', self.request.output_format):
+                    serializer.write(pending.pop(next_index))
+                next_index += 1
+                window.release()
+
+    async def stream_pokedex(self):
+        """
+        Retrieves, creates and reports the PokeData of the PokeRequest one
+        item at a time through bounded queues, so the report starts as soon
+        as the first response arrives and memory use does not grow with the
+        size of the input
+        """
+        window = asyncio.Semaphore(self.request.stream_window)
+        requests = asyncio.Queue(self.request.stream_window)
+        results = asyncio.Queue()
+        workers = max(1, min(self.request.concurrency,
+                             self.request.stream_window))
+        serializer = self.open_report()
+        try:
+            async with self.api_caller:
+                reporter = asyncio.create_task(
+                    self.stream_report(results, window, serializer))
+                await asyncio.gather(
+                    self.stream_requests(requests, window, workers),
+                    *[self.stream_worker(requests, results)
+                      for _ in range(workers)])
+                await results.put(None)
+                await reporter
+        finally:
+            self.close_report(serializer)
+
+    async def create_snapshot(self):
+        """
+        Downloads every resource of the PokeAPI used by the PokeDex into
+        the SnapshotStore named by the input of the PokeRequest, recording
+        the validators of each resource and the time it was checked in a
+        sync manifest, so the first sync of the store revalidates it
+        instead of downloading it again
+        """
+        store = SnapshotStore(self.request.input)
+        manifest = {"endpoints": {}}
+        try:
+            async with self.api_caller:
+                for endpoint in SNAPSHOT_FIELDS:
+                    resources = \
+                        await self.api_caller.process_list_request(endpoint)
+                    urls = [resource["url"] for resource in resources]
+                    entries = {}
+                    checked_at = time.time()
+                    for start in range(0, len(urls), DEFAULT_SNAPSHOT_CHUNK):
+                        results = await asyncio.gather(*[
+                            self.api_caller.get_data_with_validators(url)
+                            for url in urls[start:start +
+                                            DEFAULT_SNAPSHOT_CHUNK]],
+                            return_exceptions=True)
+                        for result in results:
+                            if isinstance(result, PokeAPIError):
+                                print(result)
+                                continue
+                            if isinstance(result, BaseException):
+                                raise result
+                            data, validators = result
+                            store.put(endpoint, data)
+                            entries[str(data["id"])] = {
+                                'checked_at': checked_at,
+                                'validators': validators}
+                        store.commit()
+                    manifest["endpoints"][endpoint] = {
+                        "resources": entries, "count": len(urls),
+                        "synced_at": checked_at}
+                    print(f"Stored {len(entries)} of {len(urls)} {endpoint} "
+                          f"resources")
+        finally:
+            store.close()
+            manifest.update(api_url=self.api_caller.api_url,
+                            synced_at=time.time())
+            self.file_handler.write_manifest(
+                self.request.input + MANIFEST_SUFFIX, manifest)
+        print(f"Snapshot successfully written to {self.request.input}!")
+
+    def load_local_data(self, kind: str):
+        """
+        Creates the PokeData of every resource of a kind from the
+        SnapshotStore when the requests are resolved offline, or else from
+        the responses in the cache, without calling the PokeAPI
+        :param kind: a String, 'pokemon', 'move' or 'ability'
+        :return: a list of PokeData, or None if there is nothing to load from
+        """
+        create_map = {
+            'pokemon': self.data_handler.create_pokemon,
+            'move': self.data_handler.create_move,
+            'ability': self.data_handler.create_ability
+        }
+        if self.api_caller.store:
+            datum = self.api_caller.store.iter_endpoint(kind)
+        elif self.api_caller.cache and self.api_caller.cache.disk:
+            prefix = self.api_caller.normalize_url(
+                f"{self.api_caller.api_url}/{kind}/")
+            datum = self.api_caller.cache.iter_endpoint(prefix)
+        else:
+            return None
+        poke_data = []
+        skipped = 0
+        with self.metrics.timer('load', kind):
             for data in datum:
+                try:
+                    poke_data.append(create_map[kind](data))
+                except (KeyError, IndexError, TypeError):
+                    skipped += 1
+        if skipped:
+            print(f"Skipped {skipped} incomplete {kind} resources",
+                  file=sys.stderr)
+        return poke_data
+
+    def create_index(self, kind: str):
+        """
+        Loads the PokeData of a kind into a PokeIndex from the SnapshotStore
+        or the cache
+        :param kind: a String, 'pokemon', 'move' or 'ability'
+        :return: a PokeIndex, or None if there is nothing to load from
+        """
+        if kind not in PokeIndex.kinds.values():
+            raise QueryError(f"Unknown kind: {kind}, expected one of "
+                             f"{', '.join(PokeIndex.kinds.values())}")
+        poke_data = self.load_local_data(kind)
+        if poke_data is None:
+            return None
+        index = PokeIndex()
+        with self.metrics.timer('index', kind, len(poke_data)):
+            index.add_all(poke_data)
+        return index
+
+    def report_query_results(self, fields: list, results: list):
+        """
+        Writes the results of a PokeQuery in the output format of the
+        PokeRequest, as an aligned table in the text format
+        :param fields: a list of the names of the fields of the results
+        :param results: a list of tuples
+        """
+        output = self.file_handler.open_output_stream(self.request.output)
+        output_format = self.request.output_format
+        try:
+            if output_format == 'jsonl':
+                for result in results:
+                    output.write(json.dumps(dict(zip(fields, result))))
+                    output.write('\n')
+            elif output_format == 'csv':
+                writer = csv.writer(output)
+                writer.writerow(fields)
+                writer.writerows([CsvSerializer.join_list(value)
+                                  if isinstance(value, list) else value
+                                  for value in result] for result in results)
+            else:
+                cells = [fields] + [[', '.join(map(str, value))
+                                     if isinstance(value, list) else str(value)
+                                     for value in result]
+                                    for result in results]
+                widths = [max(len(row[column]) for row in cells)
+                          for column in range(len(fields))]
+                for row in cells:
+                    output.write('  '.join(cell.ljust(width) for cell, width
+                                           in zip(row, widths)).rstrip())
+                    output.write('\n')
+        finally:
+            self.close_output(output)
+
+    async def query_pokedex(self):
+        """
+        Answers the PokeQuery given as the input of the PokeRequest over
+        the PokeData of the SnapshotStore or the cache
+        """
+        if self.request.output_format == 'columnar':
+            print("Query results cannot be written in the columnar format")
+            return
+        try:
+            query = PokeQuery.parse(self.request.input)
+            index = self.create_index(query.kind)
+            if index is None:
+                print("Nothing to query, please use a cache or --offline "
+                      "with a snapshot")
+                return
+            with self.metrics.timer('query', query.kind):
+                fields, results, matched = index.select(query)
+        except QueryError as e:
+            print(f"Invalid query: {e}")
+            return
+        self.report_query_results(fields, results)
+        print(f"{matched} of {len(index)} {query.kind} matched, showing "
+              f"{len(results)}", file=sys.stderr)
+
+    async def retrieve_types(self) -> list:
+        """
+        Retrieves the json data of every type, from the SnapshotStore when
+        the requests are resolved offline or else from the cache or the
+        PokeAPI, as there are only a few of them
+        :return: a list of dicts
+        """
+        if self.api_caller.store:
+            return list(self.api_caller.store.iter_endpoint('type'))
+        resources = await self.api_caller.process_list_request('type')
+        datum = await self.api_caller.process_multiple_url(
+            [resource["url"] for resource in resources])
+        for data in datum:
+            if isinstance(data, PokeAPIError):
                 print(data)
-                print(dashes)
+        return [data for data in datum if not isinstance(data, PokeAPIError)]
+
+    async def retrieve_missing_moves(self, pokemon: list,
+                                     moves: list) -> list:
+        """
+        Retrieves the Moves learnt by a list of Pokemon that are missing
+        from a list of Moves, from the cache or the PokeAPI, as the move
+        coverage of the Pokemon cannot be computed without them. Missing
+        Moves are only reported when the requests are resolved offline.
+        :param pokemon: a list of Pokemon
+        :param moves: a list of Moves
+        :return: a list of the Moves retrieved
+        """
+        known = {move.name for move in moves}
+        missing = list(OrderedDict.fromkeys(
+            name for data in pokemon for name, _ in data.moves
+            if name not in known))
+        if not missing:
+            return []
+        if self.api_caller.store:
+            print(f"{len(missing)} Moves learnt by the Pokemon are missing "
+                  f"from the store, their coverage is left out",
+                  file=sys.stderr)
+            return []
+        print(f"Retrieving {len(missing)} Moves learnt by the Pokemon that "
+              f"are missing from the cache", file=sys.stderr)
+        datum = await self.api_caller.process_multiple_url(
+            [self.api_caller.move_url.format(name) for name in missing])
+        failed = [data for data in datum if isinstance(data, PokeAPIError)]
+        if failed:
+            print(f"Unable to retrieve {len(failed)} Moves, their coverage "
+                  f"is left out", file=sys.stderr)
+        return [self.data_handler.create_move(data) for data in datum
+                if not isinstance(data, PokeAPIError)]
+
+    async def create_tables(self):
+        """
+        Computes the PokeTables of the Pokemon and Moves of the
+        SnapshotStore or the cache and of every type, retrieving the Moves
+        learnt by the Pokemon that are missing
+        :return: a PokeTables, or None if there is nothing to compute them
+        from
+        """
+        pokemon = self.load_local_data('pokemon')
+        if not pokemon:
+            return None
+        moves = self.load_local_data('move') or []
+        async with self.api_caller:
+            types = await self.retrieve_types()
+            if not types:
+                return None
+            moves += await self.retrieve_missing_moves(pokemon, moves)
+        with self.metrics.timer('tables', 'pokemon', len(pokemon)):
+            return PokeTables.build(pokemon, moves, types)
+
+    async def tables_pokedex(self):
+        """
+        Writes the PokeTables of the SnapshotStore or the cache to the file
+        named by the input of the PokeRequest
+        """
+        try:
+            tables = await self.create_tables()
+        except PokeAPIError as e:
+            print(f"Unable to retrieve the types: {e}")
+            return
+        if tables is None:
+            print("Nothing to compute the tables from, please use a cache or "
+                  "--offline with a snapshot")
+            return
+        try:
+            with open(self.request.input, mode='wb') as output:
+                tables.write(output)
+        except OSError:
+            print("Unable to write the tables file.")
+            return
+        covered = sum(1 for bits in tables.coverage if bits)
+        print(f"Move coverage of {covered} of {len(tables)} Pokemon",
+              file=sys.stderr)
+        print(f"Tables of {len(tables)} Pokemon and "
+              f"{len(tables.type_names)} types successfully written to "
+              f"{self.request.input}!")
+
+    async def counters_pokedex(self):
+        """
+        Reports the best counters to the team given as the input of the
+        PokeRequest, from the tables file of the PokeRequest if it has one
+        """
+        if self.request.output_format == 'columnar':
+            print("Counters cannot be written in the columnar format")
+            return
+        team = self.retrieve_input()
+        if self.request.tables:
+            try:
+                with open(self.request.tables, mode='rb') as input_file:
+                    tables = PokeTables.read(input_file)
+            except (OSError, ValueError):
+                print("Unable to read the tables file.")
+                return
         else:
-            data_str = ''
-            for data in datum:
-                data_str += data.__str__() + '\n' + dashes + '\n'
-            self.file_handler.handle_output_file(self.request.output, data_str)
+            try:
+                tables = await self.create_tables()
+            except PokeAPIError as e:
+                print(f"Unable to retrieve the types: {e}")
+                return
+            if tables is None:
+                print("Nothing to compute the counters from, please use a "
+                      "cache, --offline with a snapshot or --tables")
+                return
+        try:
+            with self.metrics.timer('counters', 'pokemon', len(tables)):
+                counters = tables.best_counters(team, self.request.limit)
+        except KeyError as e:
+            print(f"Unknown team member: {e.args[0]}")
+            return
+        self.report_query_results(['name', 'id', 'score', 'total',
+                                   'coverage'], counters)
+
+    async def sync_endpoint(self, store, endpoint: str,
+                            manifest: dict) -> dict:
+        """
+        Brings the resources of an endpoint in a SnapshotStore up to date,
+        downloading the resources that are new, revalidating the ones last
+        checked longer ago than the cache TTL and removing the ones that
+        are no longer listed
+        :param store: a SnapshotStore
+        :param endpoint: a String
+        :param manifest: the dict of the endpoint in the sync manifest,
+        updated in place
+        :return: a dict of the number of resources by outcome
+        """
+        resources = await self.api_caller.process_list_request(endpoint,
+                                                               cached=False)
+        listed = {}
+        for resource in resources:
+            key = resource["url"].rstrip('/').rpartition('/')[2]
+            if key.isdigit():
+                listed[int(key)] = resource["url"]
+        stored = store.ids_of(endpoint)
+        entries = manifest.setdefault("resources", {})
+        checked_at = time.time()
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0,
+                  'failed': 0}
+        for id_ in stored - listed.keys():
+            store.delete(endpoint, id_)
+            entries.pop(str(id_), None)
+            counts['removed'] += 1
+        ids = [id_ for id_ in listed if id_ not in stored
+               or checked_at - entries.get(str(id_), {}).get('checked_at', 0)
+               >= self.request.cache_ttl]
+        for start in range(0, len(ids), DEFAULT_SNAPSHOT_CHUNK):
+            chunk = ids[start:start + DEFAULT_SNAPSHOT_CHUNK]
+            results = await asyncio.gather(*[
+                self.api_caller.revalidate_data(
+                    listed[id_], entries.get(str(id_), {}).get('validators'))
+                for id_ in chunk], return_exceptions=True)
+            for id_, result in zip(chunk, results):
+                if isinstance(result, PokeAPIError):
+                    print(result)
+                    counts['failed'] += 1
+                    continue
+                if isinstance(result, BaseException):
+                    raise result
+                data, validators = result
+                if data is None:
+                    counts['unchanged'] += 1
+                elif id_ not in stored:
+                    store.put(endpoint, data)
+                    counts['new'] += 1
+                elif store.compact(endpoint, data) != store.get(endpoint, id_):
+                    store.put(endpoint, data)
+                    counts['changed'] += 1
+                else:
+                    counts['unchanged'] += 1
+                entries[str(id_)] = {'checked_at': checked_at,
+                                     'validators': validators}
+            store.commit()
+        manifest.update(count=len(listed), synced_at=checked_at, last=counts)
+        return counts
+
+    async def sync_pokedex(self):
+        """
+        Brings the SnapshotStore named by the input of the PokeRequest up
+        to date with the PokeAPI, fetching only the resources that are new
+        or changed since the last sync as recorded in its sync manifest
+        """
+        manifest_path = self.request.input + MANIFEST_SUFFIX
+        manifest = self.file_handler.read_manifest(manifest_path)
+        if manifest.get("api_url", self.api_caller.api_url) \
+                != self.api_caller.api_url:
+            print("The store was synced with another PokeAPI, revalidating "
+                  "every resource")
+            manifest = {}
+        endpoints = manifest.setdefault("endpoints", {})
+        store = SnapshotStore(self.request.input)
+        scheduler = self.api_caller.scheduler
+        try:
+            async with self.api_caller:
+                for endpoint in SNAPSHOT_FIELDS:
+                    sent = scheduler.sent
+                    try:
+                        counts = await self.sync_endpoint(
+                            store, endpoint,
+                            endpoints.setdefault(endpoint, {}))
+                    except PokeAPIError as e:
+                        print(f"Unable to sync {endpoint} resources: {e}")
+                        continue
+                    print(f"Synced {endpoint}: {counts['new']} new, "
+                          f"{counts['changed']} changed, "
+                          f"{counts['unchanged']} unchanged, "
+                          f"{counts['removed']} removed, "
+                          f"{counts['failed']} failed in "
+                          f"{scheduler.sent - sent} requests")
+        finally:
+            store.close()
+            manifest.update(api_url=self.api_caller.api_url,
+                            synced_at=time.time())
+            self.file_handler.write_manifest(manifest_path, manifest)
+        print(f"Store successfully synced to {self.request.input}!")
+
+    async def serve_pokedex(self):
+        """
+        Runs the PokeDex as a local HTTP service listening on the
+        [host:]port given as the input of the PokeRequest until stopped
+        """
+        host, port = PokeDexService.parse_address(self.request.input)
+        service = PokeDexService(self)
+        async with self.api_caller:
+            runner = web.AppRunner(service.create_app())
+            await runner.setup()
+            try:
+                site = web.TCPSite(runner, host, port)
+                await site.start()
+                print(f"Serving PokeDex on http://{host}:{port}")
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
 
     def start_pokedex(self):
         """
-        Generate a report of PokeData based on a PokeRequest
+        Generate a report of PokeData based on a PokeRequest
+        """
+        if self.request:
+            if self.request.mode == 'snapshot':
+                pokedex_coroutine = self.create_snapshot()
+            elif self.request.mode == 'serve':
+                pokedex_coroutine = self.serve_pokedex()
+            elif self.request.mode == 'query':
+                pokedex_coroutine = self.query_pokedex()
+            elif self.request.mode == 'sync':
+                pokedex_coroutine = self.sync_pokedex()
+            elif self.request.mode == 'tables':
+                pokedex_coroutine = self.tables_pokedex()
+            elif self.request.mode == 'counters':
+                pokedex_coroutine = self.counters_pokedex()
+            elif self.request.stream:
+                pokedex_coroutine = self.stream_pokedex()
+            else:
+                pokedex_coroutine = None
+            try:
+                if pokedex_coroutine is None:
+                    pokedex_coroutine = \
+                        self.run_pokedex(self.retrieve_input())
+                asyncio.run(pokedex_coroutine)
+            except InputError as e:
+                print(f"{e}.. now stopping PokeDex")
+            except KeyboardInterrupt:
+                print("PokeDex stopped")
+            finally:
+                self.report_expanded_stats()
+                self.report_request_stats()
+                self.report_cache_stats()
+                self.report_metrics()
+                if self.api_caller.cache:
+                    self.api_caller.cache.close()
+                if self.api_caller.store:
+                    self.api_caller.store.close()
+        else:
+            print("Please set a Poke Request!")
+
+
+class PokeDexService:
+    """This class runs a PokeDex as a long-running HTTP service. Every
+    lookup shares the session and cache of the PokeDex, encoded responses
+    are kept in memory, and concurrent identical lookups are coalesced into
+    a single call to the PokeAPI."""
+
+    def __init__(self, pokedex: PokeDex,
+                 cache_size: int = DEFAULT_MEMORY_CACHE_SIZE):
+        self.pokedex = pokedex
+        self.api_caller = pokedex.api_caller
+        self.data_handler = pokedex.data_handler
+        self.serializer = JsonLinesSerializer(None)
+        self.responses = MemoryCache(cache_size)
+        self.ttl = pokedex.request.cache_ttl
+        self.in_flight = {}
+        self.lookups = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def parse_address(address: str) -> tuple:
+        """
+        Parses the [host:]port address the service listens on
+        :param address: a String
+        :return: a tuple of the host and the port
+        :raises InputError: if the address is not a [host:]port
+        """
+        host, _, port = address.strip().rpartition(':')
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            raise InputError(f"Invalid address {address}, expected "
+                             f"[host:]port such as 8080 or 0.0.0.0:8080")
+        return host or DEFAULT_SERVICE_HOST, int(port)
+
+    def create_app(self) -> web.Application:
+        """
+        Creates the web application routing requests to the service
+        :return: a web.Application
+        """
+        app = web.Application()
+        app.router.add_get('/stats', self.handle_stats)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.router.add_get('/{mode:pokemon|ability|move}/{key}',
+                           self.handle_lookup)
+        app.router.add_post('/batch', self.handle_batch)
+        return app
+
+    async def lookup(self, mode: str, key: str,
+                     expanded: bool = False) -> tuple:
+        """
+        Retrieves the encoded json of a PokeData, from memory if a fresh
+        copy was encoded already, or by joining a lookup of the same
+        PokeData that is in flight
+        :param mode: a String
+        :param key: a String of an ID or name
+        :param expanded: a bool
+        :return: a tuple of (HTTP status, json bytes)
+        """
+        self.lookups += 1
+        cache_key = f"{mode}/{key.strip().lower()}/{int(expanded)}"
+        entry = self.responses.get(cache_key)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            return entry[0]
+        task = self.in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.resolve(mode, key.strip().lower(), expanded))
+            self.in_flight[cache_key] = task
+            task.add_done_callback(
+                lambda _: self.in_flight.pop(cache_key, None))
+        else:
+            self.coalesced += 1
+        with self.pokedex.metrics.timer('lookup', mode):
+            response = await asyncio.shield(task)
+        if response[0] == 200:
+            self.responses.set(cache_key, response, time.time())
+        return response
+
+    async def resolve(self, mode: str, key: str, expanded: bool) -> tuple:
+        """
+        Retrieves and encodes the json of a PokeData
+        :param mode: a String
+        :param key: a String of an ID or name
+        :param expanded: a bool
+        :return: a tuple of (HTTP status, json bytes)
+        """
+        url_map = {
+            'pokemon': self.api_caller.pokemon_url,
+            'ability': self.api_caller.ability_url,
+            'move': self.api_caller.move_url
+        }
+        create_map = {
+            'pokemon': self.data_handler.create_pokemon,
+            'ability': self.data_handler.create_ability,
+            'move': self.data_handler.create_move
+        }
+        record_map = {
+            Pokemon: self.serializer.pokemon_record,
+            Ability: self.serializer.ability_record,
+            Moves: self.serializer.move_record
+        }
+        poke_data = \
+            await self.api_caller.get_data_or_error(url_map[mode].format(key))
+        if mode == 'pokemon' and expanded:
+            datum = await self.data_handler.create_pokemons_expanded(
+                [poke_data])
+        else:
+            datum = self.data_handler.create_datum(create_map[mode],
+                                                   [poke_data])
+        data = datum[0]
+        if isinstance(data, PokeAPIError):
+            record = {"error": data.message, "url": data.url,
+                      "status": data.status}
+            return data.status or 502, \
+                self.serializer.encoder.encode(record).encode('utf-8')
+        record = record_map[type(data)](data)
+        return 200, self.serializer.encoder.encode(record).encode('utf-8')
+
+    @staticmethod
+    def is_expanded(request: web.Request) -> bool:
+        """
+        Checks if a request asks for expanded details
+        :param request: a web.Request
+        :return: a bool
+        """
+        return request.query.get('expanded', '').lower() in ('1', 'true',
+                                                             'yes')
+
+    async def handle_lookup(self, request: web.Request) -> web.Response:
+        """
+        Answers GET /{mode}/{key}[?expanded=1]
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        status, body = await self.lookup(request.match_info['mode'],
+                                         request.match_info['key'],
+                                         self.is_expanded(request))
+        return web.Response(body=body, status=status,
+                            content_type='application/json')
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        """
+        Answers POST /batch with a json body of
+        {"mode": ..., "ids": [...], "expanded": false}, returning a json
+        array of the PokeData or errors in the order of the IDs
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        try:
+            batch = await request.json()
+            mode = batch["mode"]
+            ids = [str(id_) for id_ in batch["ids"]]
+            if mode not in ('pokemon', 'ability', 'move'):
+                raise ValueError(mode)
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(
+                text='Expected {"mode": "pokemon" | "ability" | "move", '
+                     '"ids": [...], "expanded": false}')
+        expanded = bool(batch.get("expanded", False))
+        responses = await asyncio.gather(
+            *[self.lookup(mode, id_, expanded) for id_ in ids])
+        body = b'[' + b','.join(body for _, body in responses) + b']'
+        return web.Response(body=body, content_type='application/json')
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """
+        Answers GET /metrics with the metrics of each stage in the
+        Prometheus text format
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        return web.Response(text=self.pokedex.metrics.prometheus(),
+                            content_type='text/plain')
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """
+        Answers GET /stats with the counters of the service
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        cache = self.api_caller.cache
+        return web.json_response({
+            "lookups": self.lookups,
+            "coalesced": self.coalesced,
+            "requests_coalesced": self.api_caller.coalesced,
+            "responses_cached": len(self.responses.entries),
+            "cache_hits": cache.hits if cache else 0,
+            "cache_misses": cache.misses if cache else 0,
+            "cache_revalidated": cache.revalidated if cache else 0,
+            "cache_served_stale": cache.served_stale if cache else 0
+        })
+
+
+class PokeDexClient:
+    """An asynchronous library interface to the PokeDex, retrieving PokeData
+    in the event loop of its caller. Options are the attributes of a
+    PokeRequest, e.g. PokeDexClient(offline="store.db", concurrency=100).
+    A failed item is returned as its PokeAPIError in place of its PokeData
+    instead of being raised, and nothing is printed or written. Responses
+    are only cached in memory unless a cache_dir is given.
+
+        async with PokeDexClient() as client:
+            pokemon = await client.fetch_pokemon([1, "pikachu"])
+            async for move in client.stream_moves("1-100"):
+                ...
+    """
+
+    def __init__(self, session: aiohttp.ClientSession = None, **options):
+        request_ = PokeRequest()
+        request_.cache_dir = None
+        for option, value in options.items():
+            if not hasattr(request_, option):
+                raise TypeError(f"Unknown PokeDexClient option: {option}")
+            setattr(request_, option, value)
+        self.pokedex = PokeDex()
+        self.pokedex.set_request(request_)
+        self.api_caller = self.pokedex.api_caller
+        self.data_handler = self.pokedex.data_handler
+        if session is not None:
+            self.api_caller.set_session(session)
+        self.url_map = {
+            'pokemon': self.api_caller.pokemon_url,
+            'ability': self.api_caller.ability_url,
+            'move': self.api_caller.move_url
+        }
+
+    async def __aenter__(self):
+        """
+        Keeps the session of the client open until it is closed
+        :return: a PokeDexClient
+        """
+        await self.api_caller.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the session of the client, unless it was given by the
+        caller, and its cache and store
+        """
+        if self.api_caller.session_users:
+            await self.api_caller.__aexit__(None, None, None)
+        if self.api_caller.cache:
+            self.api_caller.cache.close()
+        if self.api_caller.store:
+            self.api_caller.store.close()
+
+    async def iter_params(self, mode: str, ids):
+        """
+        Lazily yields the IDs or names of an ID, a name, an input spec such
+        as "1-151,pikachu" or 'all', or an iterable or async iterable of them
+        :param mode: a String, 'pokemon', 'ability' or 'move'
+        :param ids: a String, an int or an iterable
+        :return: an async generator of Strings
+        """
+        if isinstance(ids, (str, int)):
+            ids = [ids]
+        if not hasattr(ids, '__aiter__'):
+            ids = self.aiter(ids)
+        async for id_ in ids:
+            for param in FileHandler.expand_spec(str(id_)):
+                if param == 'all':
+                    for all_param in await self.pokedex.list_all_params(mode):
+                        yield all_param
+                else:
+                    yield param
+
+    @staticmethod
+    async def aiter(iterable):
+        """
+        Iterates an iterable asynchronously
+        :param iterable: an iterable
+        :return: an async generator
+        """
+        for item in iterable:
+            yield item
+
+    async def create(self, mode: str, poke_data: list, expanded: bool = False,
+                     lazy: bool = False) -> list:
+        """
+        Creates the PokeData of a list of json data
+        :param mode: a String
+        :param poke_data: a list of dicts or PokeAPIErrors
+        :param expanded: a bool, True for the expanded details of Pokemon
+        :param lazy: a bool, True to retrieve the expanded details of
+        Pokemon on first use or on prefetch()
+        :return: a list of PokeData or PokeAPIErrors
+        """
+        create_map = {
+            'pokemon': self.data_handler.create_pokemons,
+            'ability': self.data_handler.create_abilities,
+            'move': self.data_handler.create_moves
+        }
+        if mode == 'pokemon' and lazy:
+            return self.data_handler.create_pokemons_lazy(poke_data)
+        if mode == 'pokemon' and expanded:
+            return await self.data_handler.create_pokemons_expanded(
+                poke_data)
+        return create_map[mode](poke_data)
+
+    async def fetch(self, mode: str, ids, expanded: bool = False,
+                    lazy: bool = False) -> list:
+        """
+        Retrieves the PokeData of IDs or names concurrently, retrieving an
+        item requested more than once only once
+        :param mode: a String, 'pokemon', 'ability' or 'move'
+        :param ids: an ID, a name, an input spec or an iterable of them
+        :param expanded: a bool
+        :param lazy: a bool
+        :return: a list of PokeData or PokeAPIErrors in the order of the IDs
+        """
+        params = [param async for param in self.iter_params(mode, ids)]
+        async with self.api_caller:
+            order, poke_data = await self.api_caller.process_unique_requests(
+                self.url_map[mode], params)
+            datum = await self.create(mode, poke_data, expanded, lazy)
+        return [datum[position] for position in order]
+
+    async def retrieve(self, mode: str, param: str, expanded: bool = False,
+                       lazy: bool = False):
+        """
+        Retrieves the PokeData of an ID or name
+        :param mode: a String
+        :param param: a String
+        :param expanded: a bool
+        :param lazy: a bool
+        :return: a PokeData or a PokeAPIError
+        """
+        poke_data = await self.api_caller.get_data_or_error(
+            self.api_caller.canonical_url(self.url_map[mode].format(param)))
+        datum = await self.create(mode, [poke_data], expanded, lazy)
+        return datum[0]
+
+    async def stream(self, mode: str, ids, expanded: bool = False,
+                     lazy: bool = False, ordered: bool = True,
+                     window: int = DEFAULT_STREAM_WINDOW):
+        """
+        Lazily retrieves the PokeData of IDs or names, keeping at most a
+        window of them in flight, and yields them as they arrive
+        :param mode: a String, 'pokemon', 'ability' or 'move'
+        :param ids: an ID, a name, an input spec, or an iterable or async
+        iterable of them
+        :param expanded: a bool
+        :param lazy: a bool
+        :param ordered: a bool, False to yield items as soon as they arrive
+        instead of in the order of the IDs
+        :param window: an int
+        :return: an async generator of PokeData or PokeAPIErrors
+        """
+        params = self.iter_params(mode, ids)
+        indexes = {}
+        results = {}
+        started = 0
+        next_index = 0
+        exhausted = False
+        async with self.api_caller:
+            try:
+                while indexes or not exhausted:
+                    while not exhausted and len(indexes) < window:
+                        try:
+                            param = await params.__anext__()
+                        except StopAsyncIteration:
+                            exhausted = True
+                            break
+                        task = asyncio.ensure_future(
+                            self.retrieve(mode, param, expanded, lazy))
+                        indexes[task] = started
+                        started += 1
+                    if not indexes:
+                        break
+                    done, _ = await asyncio.wait(
+                        indexes, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        results[indexes.pop(task)] = task.result()
+                    if not ordered:
+                        for index in sorted(results):
+                            yield results.pop(index)
+                    while next_index in results:
+                        yield results.pop(next_index)
+                        next_index += 1
+            finally:
+                for task in indexes:
+                    task.cancel()
+
+    async def fetch_pokemon(self, ids, expanded: bool = False,
+                            lazy: bool = False) -> list:
+        """
+        Retrieves the Pokemon of IDs or names
+        :param ids: an ID, a name, an input spec or an iterable of them
+        :param expanded: a bool
+        :param lazy: a bool
+        :return: a list of Pokemon or PokeAPIErrors
+        """
+        return await self.fetch('pokemon', ids, expanded, lazy)
+
+    async def fetch_abilities(self, ids) -> list:
+        """
+        Retrieves the Abilities of IDs or names
+        :param ids: an ID, a name, an input spec or an iterable of them
+        :return: a list of Abilities or PokeAPIErrors
+        """
+        return await self.fetch('ability', ids)
+
+    async def fetch_moves(self, ids) -> list:
+        """
+        Retrieves the Moves of IDs or names
+        :param ids: an ID, a name, an input spec or an iterable of them
+        :return: a list of Moves or PokeAPIErrors
+        """
+        return await self.fetch('move', ids)
+
+    def stream_pokemon(self, ids, expanded: bool = False, lazy: bool = False,
+                       ordered: bool = True,
+                       window: int = DEFAULT_STREAM_WINDOW):
+        """
+        Lazily retrieves the Pokemon of IDs or names
+        :return: an async generator of Pokemon or PokeAPIErrors
+        """
+        return self.stream('pokemon', ids, expanded, lazy, ordered, window)
+
+    def stream_abilities(self, ids, ordered: bool = True,
+                         window: int = DEFAULT_STREAM_WINDOW):
+        """
+        Lazily retrieves the Abilities of IDs or names
+        :return: an async generator of Abilities or PokeAPIErrors
+        """
+        return self.stream('ability', ids, ordered=ordered, window=window)
+
+    def stream_moves(self, ids, ordered: bool = True,
+                     window: int = DEFAULT_STREAM_WINDOW):
+        """
+        Lazily retrieves the Moves of IDs or names
+        :return: an async generator of Moves or PokeAPIErrors
+        """
+        return self.stream('move', ids, ordered=ordered, window=window)
+
+
+class FileHandler:
+    """This class is responsible for handling input and output files for
+    PokeData"""
+
+    @staticmethod
+    def iter_input_file(file_path: str):
+        """
+        Lazily yields the parameters used to complete Poke API end points,
+        skipping blank lines
+        :param file_path: a String
+        :return: a generator of Strings
+        """
+        try:
+            input_file = open(file_path, mode='r', encoding='utf-8')
+        except Exception:
+            raise InputError("Unable to read from input file")
+        with input_file:
+            for line in input_file:
+                line = line.strip()
+                if line:
+                    yield line
+
+    @staticmethod
+    def expand_spec(spec: str):
+        """
+        Lazily yields the parameters of a comma separated list of names,
+        IDs, ranges of IDs such as '1-151' and 'all'
+        :param spec: a String
+        :return: a generator of Strings
+        :raises InputError: if a range of IDs ends before it starts
+        """
+        for part in spec.split(','):
+            part = part.strip()
+            start, separator, stop = part.partition('-')
+            if separator and start.isdigit() and stop.isdigit():
+                if int(stop) < int(start):
+                    raise InputError(f"Invalid range {part}, the first ID "
+                                     f"must not be greater than the last")
+                yield from map(str, range(int(start), int(stop) + 1))
+            elif part:
+                yield part
+
+    @staticmethod
+    def iter_input_files(pattern: str):
+        """
+        Lazily yields the lines of every text file matching a glob pattern,
+        file by file in the sorted order of their paths
+        :param pattern: a String such as 'batches/*.txt'
+        :return: a generator of Strings
+        :raises InputError: if no file matches the pattern
+        """
+        file_paths = sorted(path for path in glob.glob(pattern)
+                            if os.path.isfile(path))
+        if not file_paths:
+            raise InputError(f"No input file matches {pattern}")
+        for file_path in file_paths:
+            yield from FileHandler.iter_input_file(file_path)
+
+    @staticmethod
+    def iter_input_spec(spec: str):
+        """
+        Lazily yields the parameters of an input spec, which is '-' to read
+        lines from stdin, a text file with a spec on each line, a glob
+        pattern of such files, or a single comma separated list of names,
+        IDs, ranges of IDs and 'all'
+        :param spec: a String
+        :return: a generator of Strings
+        """
+        if spec == '-':
+            lines = (line.strip() for line in sys.stdin)
+        elif os.path.isfile(spec):
+            lines = FileHandler.iter_input_file(spec)
+        elif any(char in spec for char in '*?['):
+            lines = FileHandler.iter_input_files(spec)
+        else:
+            lines = [spec]
+        for line in lines:
+            yield from FileHandler.expand_spec(line)
+
+    @staticmethod
+    def open_output_stream(file_path: str, binary: bool = False):
+        """
+        Opens the buffered stream a report is written to incrementally
+        :param file_path: a String, or 'print' for the console
+        :param binary: a bool, True to open a binary stream
+        :return: a file
+        """
+        console = sys.stdout.buffer if binary else sys.stdout
+        if file_path == 'print':
+            return console
+        try:
+            if binary:
+                return open(file_path, mode='wb')
+            return open(file_path, mode='w', encoding='utf-8', newline='')
+        except Exception:
+            print("Unable to write to file. Now outputting to console:\n")
+            return console
+
+    @staticmethod
+    def read_manifest(file_path: str) -> dict:
+        """
+        Reads the manifest of the last sync of a store
+        :param file_path: a String
+        :return: a dict, empty if the store was never synced
+        """
+        try:
+            with open(file_path, mode='r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            print("Unable to read the sync manifest, revalidating every "
+                  "resource")
+            return {}
+
+    @staticmethod
+    def write_manifest(file_path: str, manifest: dict):
+        """
+        Writes the manifest of a sync, replacing the last one only once it
+        is complete
+        :param file_path: a String
+        :param manifest: a dict
+        """
+        try:
+            with open(file_path + ".tmp", mode='w',
+                      encoding='utf-8') as manifest_file:
+                json.dump(manifest, manifest_file, separators=(',', ':'))
+            os.replace(file_path + ".tmp", file_path)
+        except OSError:
+            print("Unable to write the sync manifest.")
+
+
+class NameTable:
+    """A table of names shared by PokeData, referenced by integer IDs"""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def id_of(self, name: str) -> int:
+        """
+        Retrieves the ID of a name, adding it to the table if it is new
+        :param name: a String
+        :return: an int
+        """
+        id_ = self.ids.get(name)
+        if id_ is None:
+            id_ = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return id_
+
+    def name_of(self, id_: int) -> str:
+        """
+        Retrieves the name of an ID
+        :param id_: an int
+        :return: a String
+        """
+        return self.names[id_]
+
+
+class NamedValues(Sequence):
+    """A compact sequence of (name, value) tuples, storing names as IDs of
+    a shared NameTable and both IDs and values in arrays of unsigned 16-bit
+    integers. Values must be within 0-65535 and a table holds at most 65536
+    names, an OverflowError is raised otherwise."""
+
+    __slots__ = ('table', 'name_ids', 'values')
+
+    def __init__(self, table: NameTable, pairs):
+        self.table = table
+        self.name_ids = array('H', [table.id_of(name) for name, _ in pairs])
+        self.values = array('H', [value for _, value in pairs])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.table.name_of(self.name_ids[index]), self.values[index]
+
+    def __len__(self):
+        return len(self.name_ids)
+
+
+class LazyDetails(Sequence):
+    """A sequence of the expanded stats, abilities or moves of a Pokemon
+    held as the names and URLs of their resources until they are first
+    used or prefetched, then retrieved in one batch by a DataHandler"""
+
+    __slots__ = ('data_handler', 'attribute', 'names', 'urls', 'items',
+                 'error')
+
+    def __init__(self, data_handler, attribute: str, references: list):
+        self.data_handler = data_handler
+        self.attribute = attribute
+        self.names = tuple(sys.intern(reference["name"])
+                           for reference in references)
+        self.urls = tuple(reference["url"] for reference in references)
+        self.items = None
+        self.error = None
+
+    @property
+    def resolved(self) -> bool:
+        return self.items is not None
+
+    def set_items(self, items: list):
+        """
+        Sets the PokeData of the details once they are retrieved, or the
+        error of the first one that could not be
+        :param items: a list of PokeData or PokeAPIError
+        """
+        self.error = next((item for item in items
+                           if isinstance(item, PokeAPIError)), None)
+        if self.error is None:
+            self.items = tuple(items)
+
+    async def prefetch(self):
+        """
+        Retrieves the details unless they already are
+        """
+        await self.data_handler.prefetch([self])
+
+    def resolve(self) -> tuple:
+        """
+        Retrieves the details on first use
+        :return: a tuple of PokeData
+        """
+        if self.items is None:
+            self.data_handler.resolve([self])
+        return self.items
+
+    def __getitem__(self, index):
+        return self.resolve()[index]
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.urls)
+
+
+class PokeData(ABC):
+    """An abstract class that all PokeData must inherit from"""
+
+    __slots__ = ('name', 'id_')
+
+    @abstractmethod
+    def __init__(self, name: str, id_: int):
+        self.name = name
+        self.id_ = id_
+
+    @abstractmethod
+    def __str__(self):
+        pass
+
+
+class Ability(PokeData):
+    """Class of PokeData representing Pokemon Abilities"""
+
+    __slots__ = ('generation', 'effect', 'effect_short', 'pokemon')
+
+    def __init__(self, name: str, id_: int, generation: str, effect: str,
+                 effect_short: str, pokemon: list):
+        super().__init__(name, id_)
+        self.generation = sys.intern(generation)
+        self.effect = effect
+        self.effect_short = effect_short
+        self.pokemon = tuple(sys.intern(name) for name in pokemon)
+
+    def __str__(self):
+        pokemon_str = '\n'.join(self.pokemon)
+        return f"Name: {self.name}\nID: {self.id_}" \
+               f"\nGeneration: {self.generation}\nEffect: {self.effect}" \
+               f"\nEffect (Short): {self.effect_short}" \
+               f"\nPokemon:\n{pokemon_str}"
+
+
+class Moves(PokeData):
+    """Class of PokeData representing Pokemon Moves"""
+
+    __slots__ = ('generation', 'accuracy', 'pp', 'power', 'type_',
+                 'damage_class', 'effect_short')
+
+    def __init__(self, name: str, id_: int, generation: str, accuracy: int,
+                 pp: int, power: int, type_: str, damage_class: str,
+                 effect_short: str):
+        super().__init__(name, id_)
+        self.generation = sys.intern(generation)
+        self.accuracy = accuracy
+        self.pp = pp
+        self.power = power
+        self.type_ = sys.intern(type_)
+        self.damage_class = sys.intern(damage_class)
+        self.effect_short = effect_short
+
+    def __str__(self):
+        return f"Name: {self.name}\nID: {self.id_}\n" \
+               f"Generation: {self.generation}\nAccuracy: {self.accuracy}\n" \
+               f"PP: {self.pp}\nPower: {self.power}\nType: {self.type_}\n" \
+               f"Damage Type: {self.damage_class}\n" \
+               f"Effect Short: {self.effect_short}"
+
+
+class Pokemon(PokeData):
+    """Class of PokeData representing Pokemon. Stats and moves given as
+    (name, value) tuples are stored as NamedValues referencing the name
+    tables of the DataHandler that created them. Expanded details may be
+    LazyDetails, retrieved in one batch when the Pokemon is rendered or
+    prefetched. Details that cannot be retrieved when it is rendered, such
+    as from a running event loop, are rendered by name."""
+
+    __slots__ = ('height', 'weight', 'stats', 'types', 'abilities', 'moves')
+
+    def __init__(self, name: str, id_: int, height: int, weight: int,
+                 stats: list, types: list, abilities: list, moves: list,
+                 stat_names: NameTable = None, move_names: NameTable = None):
+        super().__init__(name, id_)
+        self.height = height
+        self.weight = weight
+        self.stats = self.pack(stats, stat_names)
+        self.types = tuple(sys.intern(type_) for type_ in types)
+        self.abilities = abilities if isinstance(abilities, LazyDetails) \
+            else tuple(sys.intern(ability) if isinstance(ability, str)
+                       else ability for ability in abilities)
+        self.moves = self.pack(moves, move_names)
+
+    @staticmethod
+    def pack(values: list, table: NameTable):
+        """
+        Packs a list of (name, value) tuples into NamedValues, or a list of
+        PokeData into a tuple. LazyDetails are kept as they are.
+        :param values: a list or LazyDetails
+        :param table: a NameTable, or None for a table of its own
+        :return: a NamedValues, a tuple or LazyDetails
+        """
+        if isinstance(values, LazyDetails):
+            return values
+        if values and isinstance(values[0], tuple):
+            return NamedValues(table or NameTable(), values)
+        return tuple(values)
+
+    def lazy_details(self) -> list:
+        """
+        Retrieves the details of the Pokemon that are yet to be resolved
+        :return: a list of LazyDetails
+        """
+        return [details for details in (self.stats, self.abilities,
+                                        self.moves)
+                if isinstance(details, LazyDetails) and not details.resolved]
+
+    async def prefetch(self):
+        """
+        Retrieves every lazy detail of the Pokemon in one batch
+        """
+        lazy_details = self.lazy_details()
+        if lazy_details:
+            await lazy_details[0].data_handler.prefetch(lazy_details)
+
+    def resolve(self):
+        """
+        Retrieves every lazy detail of the Pokemon in one batch from
+        synchronous code
+        :raises PokeAPIError: if a detail could not be retrieved
+        :raises RuntimeError: if it is called from a running event loop
+        """
+        lazy_details = self.lazy_details()
+        if lazy_details:
+            lazy_details[0].data_handler.resolve(lazy_details)
+
+    @staticmethod
+    def shown(details):
+        """
+        Retrieves the details of a Pokemon to render, the names of the
+        ones that could not be resolved
+        :param details: a NamedValues, a tuple or LazyDetails
+        :return: a Sequence
+        """
+        if isinstance(details, LazyDetails) and not details.resolved:
+            return details.names
+        return details
+
+    def __str__(self):
+        try:
+            self.resolve()
+        except (PokeAPIError, RuntimeError):
+            pass
+        type_str = ''.join(f"{type_}\n" for type_ in self.types)
+        ability_str = ''.join(f"{ability}\n\n"
+                              for ability in self.shown(self.abilities))
+        if isinstance(self.stats, NamedValues):
+            stat_str = ''.join(f"{stat} - {value}\n"
+                               for stat, value in self.stats)
+        else:
+            stat_str = ''.join(f"{stat}\n" for stat in self.shown(self.stats))
+        if isinstance(self.moves, NamedValues):
+            move_str = ''.join(f"{move} - {level}\n"
+                               for move, level in self.moves)
+        else:
+            move_str = ''.join(f"{move}\n\n"
+                               for move in self.shown(self.moves))
+        return f"Name: {self.name}\nID: {self.id_}\n" \
+               f"Height: {self.height}\nWeight: {self.weight}\n\n" \
+               f"Stats:\n{stat_str}\nTypes:\n{type_str}\n" \
+               f"Abilities:\n{ability_str}Moves:\n{move_str}"
+
+
+class Stats(PokeData):
+    """Class of PokeData representing Pokemon Stats"""
+
+    __slots__ = ('is_battle_only',)
+
+    def __init__(self, name, id_, is_battle_only):
+        super().__init__(name, id_)
+        self.is_battle_only = is_battle_only
+
+    def __str__(self):
+        return f"Name: {self.name}\nID: {self.id_}\n" \
+               f"Is Battle Only: {self.is_battle_only}"
+
+
+class Serializer(ABC):
+    """An abstract class writing PokeData to a buffered output as they
+    come, with a writer for each class of PokeData"""
+
+    binary = False
+    fields = {
+        'Pokemon': ('name', 'id', 'height', 'weight', 'types', 'abilities',
+                    'stats', 'base_stats', 'moves', 'move_levels'),
+        'Ability': ('name', 'id', 'generation', 'effect', 'effect_short',
+                    'pokemon'),
+        'Moves': ('name', 'id', 'generation', 'accuracy', 'pp', 'power',
+                  'type', 'damage_class', 'effect_short'),
+        'Stats': ('name', 'id', 'is_battle_only')
+    }
+
+    def __init__(self, output):
+        self.output = output
+        self.writers = {
+            Pokemon: self.write_pokemon,
+            Ability: self.write_ability,
+            Moves: self.write_move,
+            Stats: self.write_stat,
+            PokeAPIError: self.write_error
+        }
+
+    def write(self, data):
+        """
+        Writes a PokeData, or reports the PokeAPIError of a failed request
+        :param data: a PokeData or a PokeAPIError
+        """
+        self.writers[type(data)](data)
+
+    def write_all(self, datum: list):
+        """
+        Writes a list of PokeData
+        :param datum: a list of PokeData or PokeAPIError
+        """
+        for data in datum:
+            self.writers[type(data)](data)
+
+    @staticmethod
+    def write_error(error):
+        """
+        Reports the PokeAPIError of a failed request on the console
+        :param error: a PokeAPIError
+        """
+        print(error, file=sys.stderr)
+
+    @staticmethod
+    def detail_names(details) -> list:
+        """
+        Names the expanded details of a Pokemon, without retrieving them
+        if they are LazyDetails
+        :param details: a tuple of PokeData or LazyDetails
+        :return: a list of Strings
+        """
+        if isinstance(details, LazyDetails):
+            return list(details.names)
+        return [detail if isinstance(detail, str) else detail.name
+                for detail in details]
+
+    @staticmethod
+    def flatten_pokemon(pokemon: Pokemon) -> tuple:
+        """
+        Flattens a Pokemon into the values of its fields, naming its
+        expanded details
+        :param pokemon: a Pokemon
+        :return: a tuple
+        """
+        if isinstance(pokemon.stats, NamedValues):
+            stats = [pokemon.stats.table.names[id_]
+                     for id_ in pokemon.stats.name_ids]
+            base_stats = pokemon.stats.values.tolist()
+        else:
+            stats = Serializer.detail_names(pokemon.stats)
+            base_stats = []
+        if isinstance(pokemon.moves, NamedValues):
+            moves = [pokemon.moves.table.names[id_]
+                     for id_ in pokemon.moves.name_ids]
+            move_levels = pokemon.moves.values.tolist()
+        else:
+            moves = Serializer.detail_names(pokemon.moves)
+            move_levels = []
+        abilities = Serializer.detail_names(pokemon.abilities)
+        return (pokemon.name, pokemon.id_, pokemon.height, pokemon.weight,
+                list(pokemon.types), abilities, stats, base_stats, moves,
+                move_levels)
+
+    @staticmethod
+    def flatten_ability(ability: Ability) -> tuple:
+        """
+        Flattens an Ability into the values of its fields
+        :param ability: an Ability
+        :return: a tuple
+        """
+        return (ability.name, ability.id_, ability.generation, ability.effect,
+                ability.effect_short, list(ability.pokemon))
+
+    @staticmethod
+    def flatten_move(move: Moves) -> tuple:
+        """
+        Flattens a Move into the values of its fields
+        :param move: a Move
+        :return: a tuple
+        """
+        return (move.name, move.id_, move.generation, move.accuracy, move.pp,
+                move.power, move.type_, move.damage_class, move.effect_short)
+
+    @staticmethod
+    def flatten_stat(stat: Stats) -> tuple:
+        """
+        Flattens a Stat into the values of its fields
+        :param stat: a Stat
+        :return: a tuple
+        """
+        return stat.name, stat.id_, stat.is_battle_only
+
+    @classmethod
+    def render(cls, datum: list):
+        """
+        Renders a list of PokeData into what write_rendered writes, so the
+        work can be done in another process
+        :param datum: a list of PokeData or PokeAPIError
+        :return: a String, or bytes for binary formats
+        """
+        buffer = io.BytesIO() if cls.binary else io.StringIO()
+        cls(buffer).write_all(datum)
+        return buffer.getvalue()
+
+    def write_rendered(self, rendered):
+        """
+        Writes PokeData rendered by render
+        :param rendered: a String, or bytes for binary formats
+        """
+        self.output.write(rendered)
+
+    @abstractmethod
+    def write_pokemon(self, pokemon: Pokemon):
+        pass
+
+    @abstractmethod
+    def write_ability(self, ability: Ability):
+        pass
+
+    @abstractmethod
+    def write_move(self, move: Moves):
+        pass
+
+    @abstractmethod
+    def write_stat(self, stat: Stats):
+        pass
+
+    def close(self):
+        """
+        Finishes writing and flushes the output
+        """
+        self.output.flush()
+
+
+class TextSerializer(Serializer):
+    """Serializer writing the human readable report of PokeData"""
+
+    dashes = "-" * 30
+
+    def write_text(self, data):
+        """
+        Writes the text of a PokeData followed by a separator
+        :param data: a PokeData
+        """
+        self.output.write(str(data))
+        self.output.write(f"\n{self.dashes}\n")
+
+    def write_error(self, error):
+        self.write_text(error)
+
+    def write_pokemon(self, pokemon: Pokemon):
+        self.write_text(pokemon)
+
+    def write_ability(self, ability: Ability):
+        self.write_text(ability)
+
+    def write_move(self, move: Moves):
+        self.write_text(move)
+
+    def write_stat(self, stat: Stats):
+        self.write_text(stat)
+
+
+class JsonLinesSerializer(Serializer):
+    """Serializer writing a json object per line for each PokeData, nesting
+    the expanded details of a Pokemon"""
+
+    def __init__(self, output):
+        super().__init__(output)
+        self.encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def write_record(self, record: dict):
+        """
+        Writes a json object on its own line
+        :param record: a dict
+        """
+        self.output.write(self.encoder.encode(record))
+        self.output.write('\n')
+
+    def write_error(self, error):
+        self.write_record({"error": error.message, "url": error.url,
+                           "status": error.status})
+
+    def pokemon_record(self, pokemon: Pokemon) -> dict:
+        """
+        Creates the json object of a Pokemon, naming the expanded details
+        that could not be resolved
+        :param pokemon: a Pokemon
+        :return: a dict
+        """
+        try:
+            pokemon.resolve()
+        except (PokeAPIError, RuntimeError):
+            pass
+        if isinstance(pokemon.stats, NamedValues):
+            stats = dict(pokemon.stats)
+        else:
+            stats = [stat if isinstance(stat, str)
+                     else self.stat_record(stat)
+                     for stat in pokemon.shown(pokemon.stats)]
+        if isinstance(pokemon.moves, NamedValues):
+            moves = [{"name": move, "level_learned_at": level}
+                     for move, level in pokemon.moves]
+        else:
+            moves = [move if isinstance(move, str)
+                     else self.move_record(move)
+                     for move in pokemon.shown(pokemon.moves)]
+        abilities = [ability if isinstance(ability, str)
+                     else self.ability_record(ability)
+                     for ability in pokemon.shown(pokemon.abilities)]
+        return {"name": pokemon.name, "id": pokemon.id_,
+                "height": pokemon.height, "weight": pokemon.weight,
+                "stats": stats, "types": list(pokemon.types),
+                "abilities": abilities, "moves": moves}
+
+    def ability_record(self, ability: Ability) -> dict:
+        """
+        Creates the json object of an Ability
+        :param ability: an Ability
+        :return: a dict
+        """
+        return dict(zip(self.fields['Ability'], self.flatten_ability(ability)))
+
+    def move_record(self, move: Moves) -> dict:
+        """
+        Creates the json object of a Move
+        :param move: a Move
+        :return: a dict
+        """
+        return dict(zip(self.fields['Moves'], self.flatten_move(move)))
+
+    def stat_record(self, stat: Stats) -> dict:
+        """
+        Creates the json object of a Stat
+        :param stat: a Stat
+        :return: a dict
+        """
+        return dict(zip(self.fields['Stats'], self.flatten_stat(stat)))
+
+    def write_pokemon(self, pokemon: Pokemon):
+        self.write_record(self.pokemon_record(pokemon))
+
+    def write_ability(self, ability: Ability):
+        self.write_record(self.ability_record(ability))
+
+    def write_move(self, move: Moves):
+        self.write_record(self.move_record(move))
+
+    def write_stat(self, stat: Stats):
+        self.write_record(self.stat_record(stat))
+
+
+class RowSerializer(Serializer):
+    """An abstract Serializer writing the flattened values of each PokeData
+    as a row, keeping state across rows so PokeData are rendered as rows
+    rather than as the output itself"""
+
+    @classmethod
+    def render(cls, datum: list) -> list:
+        """
+        Renders a list of PokeData into the flattened values of each one
+        :param datum: a list of PokeData or PokeAPIError
+        :return: a list of (class name, values) tuples
+        """
+        flatteners = {
+            Pokemon: cls.flatten_pokemon,
+            Ability: cls.flatten_ability,
+            Moves: cls.flatten_move,
+            Stats: cls.flatten_stat,
+            PokeAPIError: lambda error: error
+        }
+        return [(type(data).__name__, flatteners[type(data)](data))
+                for data in datum]
+
+    def write_rendered(self, rendered: list):
+        for name, values in rendered:
+            if name == 'PokeAPIError':
+                self.write_error(values)
+            else:
+                self.write_row(name, values)
+
+    @abstractmethod
+    def write_row(self, name: str, values: tuple):
+        pass
+
+    def write_pokemon(self, pokemon: Pokemon):
+        self.write_row('Pokemon', self.flatten_pokemon(pokemon))
+
+    def write_ability(self, ability: Ability):
+        self.write_row('Ability', self.flatten_ability(ability))
+
+    def write_move(self, move: Moves):
+        self.write_row('Moves', self.flatten_move(move))
+
+    def write_stat(self, stat: Stats):
+        self.write_row('Stats', self.flatten_stat(stat))
+
+
+class CsvSerializer(RowSerializer):
+    """Serializer writing a CSV row for each PokeData, joining list fields
+    with '|' and escaping '|' and '\\' within an item with a '\\'. A header
+    row is written whenever the class of PokeData changes."""
+
+    def __init__(self, output):
+        super().__init__(output)
+        self.writer = csv.writer(output)
+        self.header = None
+
+    def write_row(self, header: str, values: tuple):
+        """
+        Writes the values of a PokeData as a row
+        :param header: a String naming the fields of the row
+        :param values: a tuple
+        """
+        if header != self.header:
+            self.writer.writerow(self.fields[header])
+            self.header = header
+        self.writer.writerow([self.join_list(value)
+                              if isinstance(value, list) else value
+                              for value in values])
+
+    @staticmethod
+    def join_list(value: list) -> str:
+        """
+        Joins the items of a list field with '|', escaping '|' and '\\'
+        :param value: a list
+        :return: a String
+        """
+        return '|'.join(str(item).replace('\\', '\\\\').replace('|', '\\|')
+                        for item in value)
+
+
+class ColumnarSerializer(RowSerializer):
+    """Serializer writing PokeData column by column in a compact binary
+    format. Rows are buffered per class of PokeData and written as row
+    groups of up to DEFAULT_ROW_GROUP_SIZE rows.
+
+    The file starts with COLUMNAR_MAGIC and a version byte, followed by row
+    groups made of the class name, the row count, the column count and the
+    columns. Each column is its name, a kind and its data, all integers
+    being little-endian:
+    'i' - a validity byte per row then an int64 per row
+    's' - int64 offsets (rows + 1) then the utf-8 bytes of every string
+    'I' / 'S' - int64 list offsets (rows + 1) then an 'i' / 's' column of
+    every item"""
+
+    binary = True
+    kinds = {
+        'Pokemon': 'siiiSSSISI',
+        'Ability': 'sisssS',
+        'Moves': 'sisiiisss',
+        'Stats': 'sii'
+    }
+
+    def __init__(self, output, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__(output)
+        self.row_group_size = row_group_size
+        self.row_groups = {}
+        self.output.write(COLUMNAR_MAGIC + bytes([COLUMNAR_VERSION]))
+
+    def write_row(self, name: str, values: tuple):
+        """
+        Buffers the values of a PokeData, writing its row group once full
+        :param name: a String naming the class of the PokeData
+        :param values: a tuple
+        """
+        columns = self.row_groups.get(name)
+        if columns is None:
+            columns = self.row_groups[name] = \
+                [[] for _ in self.fields[name]]
+        for column, value in zip(columns, values):
+            column.append(value)
+        if len(columns[0]) >= self.row_group_size:
+            self.write_row_group(name)
+
+    @staticmethod
+    def encode_ints(values: list) -> bytes:
+        """
+        Encodes an 'i' column
+        :param values: a list of ints or None
+        :return: bytes
+        """
+        validity = bytes(value is not None for value in values)
+        ints = array('q', [int(value or 0) for value in values])
+        if sys.byteorder == 'big':
+            ints.byteswap()
+        return validity + ints.tobytes()
+
+    @staticmethod
+    def encode_offsets(lengths) -> bytes:
+        """
+        Encodes the int64 offsets of a list of lengths
+        :param lengths: an iterable of ints
+        :return: bytes
+        """
+        offsets = array('q', [0])
+        offsets.extend(accumulate(lengths))
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return offsets.tobytes()
+
+    def encode_strings(self, values: list) -> bytes:
+        """
+        Encodes an 's' column
+        :param values: a list of Strings
+        :return: bytes
+        """
+        encoded = [(value or '').encode('utf-8') for value in values]
+        return self.encode_offsets(map(len, encoded)) + b''.join(encoded)
+
+    def encode_column(self, kind: str, values: list) -> bytes:
+        """
+        Encodes the data of a column
+        :param kind: a String
+        :param values: a list
+        :return: bytes
+        """
+        if kind == 'i':
+            return self.encode_ints(values)
+        if kind == 's':
+            return self.encode_strings(values)
+        items = list(chain.from_iterable(values))
+        return self.encode_offsets(map(len, values)) + \
+            self.encode_column(kind.lower(), items)
+
+    def write_row_group(self, name: str):
+        """
+        Writes the buffered rows of a class of PokeData
+        :param name: a String naming the class of the PokeData
+        """
+        columns = self.row_groups.pop(name)
+        encoded_name = name.encode('utf-8')
+        self.output.write(struct.pack('<I', len(encoded_name)) +
+                          encoded_name)
+        self.output.write(struct.pack('<QH', len(columns[0]), len(columns)))
+        for field, kind, values in zip(self.fields[name], self.kinds[name],
+                                       columns):
+            encoded_field = field.encode('utf-8')
+            self.output.write(struct.pack('<H', len(encoded_field)) +
+                              encoded_field + kind.encode('ascii'))
+            self.output.write(self.encode_column(kind, values))
+
+    def close(self):
+        for name in list(self.row_groups):
+            self.write_row_group(name)
+        super().close()
+
+    @staticmethod
+    def read(input_file) -> list:
+        """
+        Reads the row groups of a file written by a ColumnarSerializer
+        :param input_file: a binary file
+        :return: a list of (class name, dict of column name to values)
+        """
+        data = input_file.read()
+        if data[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            raise ValueError("Not a columnar PokeData file")
+        position = len(COLUMNAR_MAGIC) + 1
+
+        def read_array(count):
+            nonlocal position
+            values = array('q')
+            values.frombytes(data[position:position + count * 8])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            position += count * 8
+            return values
+
+        def read_column(kind, rows):
+            nonlocal position
+            if kind == 'i':
+                validity = data[position:position + rows]
+                position += rows
+                return [value if valid else None for value, valid
+                        in zip(read_array(rows), validity)]
+            offsets = read_array(rows + 1)
+            if kind == 's':
+                blob = data[position:position + offsets[-1]]
+                position += offsets[-1]
+                return [blob[start:end].decode('utf-8') for start, end
+                        in zip(offsets, offsets[1:])]
+            items = read_column(kind.lower(), offsets[-1])
+            return [items[start:end] for start, end
+                    in zip(offsets, offsets[1:])]
+
+        row_groups = []
+        while position < len(data):
+            (length,) = struct.unpack_from('<I', data, position)
+            name = data[position + 4:position + 4 + length].decode('utf-8')
+            position += 4 + length
+            rows, column_count = struct.unpack_from('<QH', data, position)
+            position += 10
+            columns = {}
+            for _ in range(column_count):
+                (length,) = struct.unpack_from('<H', data, position)
+                field = data[position + 2:position + 2 + length]
+                kind = chr(data[position + 2 + length])
+                position += 3 + length
+                columns[field.decode('utf-8')] = read_column(kind, rows)
+            row_groups.append((name, columns))
+        return row_groups
+
+
+class InputError(Exception):
+    """An error reading the input spec of a PokeRequest"""
+
+
+class QueryError(Exception):
+    """An error in the text or the fields of a PokeQuery"""
+
+
+class PokeQuery:
+    """A query selecting the PokeData of one kind that meet every one of
+    its conditions, sorted by a field and projected onto a list of fields.
+    Queries are written as the kind followed by terms separated by spaces,
+    e.g. "pokemon type=fire speed>100 sort=-speed fields=name,speed limit=5".
+    A condition compares a field with =, !=, >, >=, < or <=, and = and !=
+    accept a comma separated list of values."""
+
+    term_pattern = re.compile(r'([a-z0-9_-]+)(>=|<=|!=|=|>|<)(.+)$')
+
+    def __init__(self, kind: str, conditions: list = None, sort: str = None,
+                 descending: bool = False, fields: list = None,
+                 limit: int = None):
+        self.kind = kind
+        self.conditions = conditions or []
+        self.sort = sort
+        self.descending = descending
+        self.fields = fields
+        self.limit = limit
+
+    @classmethod
+    def parse(cls, text: str):
+        """
+        Parses the text of a query
+        :param text: a String
+        :return: a PokeQuery
+        """
+        terms = text.lower().split()
+        if not terms:
+            raise QueryError("The query is empty")
+        query = cls(terms[0])
+        for term in terms[1:]:
+            match = cls.term_pattern.match(term)
+            if match is None:
+                raise QueryError(f"Invalid query term: {term}")
+            field, operator, value = match.groups()
+            if field in ('sort', 'fields', 'limit') and operator != '=':
+                raise QueryError(f"Invalid query term: {term}")
+            if field == 'sort':
+                query.descending = value.startswith('-')
+                query.sort = value.lstrip('-')
+            elif field == 'fields':
+                query.fields = [name for name in value.split(',') if name]
+            elif field == 'limit':
+                if not value.isdigit():
+                    raise QueryError(f"Invalid limit: {value}")
+                query.limit = int(value)
+            else:
+                query.conditions.append((field, operator, value))
+        return query
+
+
+class PokeIndex:
+    """In-memory secondary indexes over the Pokemon, Moves and Abilities
+    of a Pokedex. Every text field, such as a type or a generation, maps
+    each of its values to the set of records having it, and every number
+    field, such as a base stat, keeps its records sorted by value, so a
+    PokeQuery is answered by intersecting sets and bisecting ranges instead
+    of scanning the records. Records are sorted by ID unless the query
+    sorts them by another field, with the records missing it last."""
+
+    kinds = {Pokemon: 'pokemon', Moves: 'move', Ability: 'ability'}
+
+    def __init__(self):
+        self.records = {kind: [] for kind in self.kinds.values()}
+        self.rows = {kind: [] for kind in self.kinds.values()}
+        self.text_indexes = {kind: {} for kind in self.kinds.values()}
+        self.number_indexes = {kind: {} for kind in self.kinds.values()}
+        self.ranges = {kind: None for kind in self.kinds.values()}
+
+    @staticmethod
+    def pokemon_row(pokemon: Pokemon) -> dict:
+        """
+        Maps the fields a Pokemon is queried by to their values, with a
+        field for the base value of each of its stats
+        :param pokemon: a Pokemon
+        :return: a dict
+        """
+        row = {'name': pokemon.name, 'id': pokemon.id_,
+               'height': pokemon.height, 'weight': pokemon.weight,
+               'type': list(pokemon.types),
+               'ability': Serializer.detail_names(pokemon.abilities)}
+        if isinstance(pokemon.moves, NamedValues):
+            row['move'] = [pokemon.moves.table.names[id_]
+                           for id_ in pokemon.moves.name_ids]
+        else:
+            row['move'] = Serializer.detail_names(pokemon.moves)
+        if isinstance(pokemon.stats, NamedValues):
+            row.update(pokemon.stats)
+        return row
+
+    @staticmethod
+    def move_row(move: Moves) -> dict:
+        """
+        Maps the fields a Move is queried by to their values
+        :param move: a Move
+        :return: a dict
+        """
+        return {'name': move.name, 'id': move.id_,
+                'generation': move.generation, 'accuracy': move.accuracy,
+                'pp': move.pp, 'power': move.power, 'type': move.type_,
+                'damage_class': move.damage_class}
+
+    @staticmethod
+    def ability_row(ability: Ability) -> dict:
+        """
+        Maps the fields an Ability is queried by to their values
+        :param ability: an Ability
+        :return: a dict
+        """
+        return {'name': ability.name, 'id': ability.id_,
+                'generation': ability.generation,
+                'pokemon': list(ability.pokemon)}
+
+    def add(self, data: PokeData):
+        """
+        Adds a Pokemon, Move or Ability to the indexes of its fields
+        :param data: a PokeData
+        """
+        row_map = {
+            'pokemon': self.pokemon_row,
+            'move': self.move_row,
+            'ability': self.ability_row
+        }
+        kind = self.kinds[type(data)]
+        row = row_map[kind](data)
+        position = len(self.records[kind])
+        self.records[kind].append(data)
+        self.rows[kind].append(row)
+        self.ranges[kind] = None
+        for field, value in row.items():
+            if isinstance(value, (str, list)):
+                index = self.text_indexes[kind].setdefault(field, {})
+                for text in [value] if isinstance(value, str) else value:
+                    index.setdefault(text.lower(), set()).add(position)
+            else:
+                self.number_indexes[kind].setdefault(field, [])
+                if value is not None:
+                    self.number_indexes[kind][field].append((value, position))
+
+    def add_all(self, datum: list):
+        """
+        Adds a list of PokeData, skipping the PokeAPIErrors of failed
+        requests
+        :param datum: a list
+        """
+        for data in datum:
+            if not isinstance(data, PokeAPIError):
+                self.add(data)
+
+    def __len__(self):
+        return sum(len(records) for records in self.records.values())
+
+    def fields_of(self, kind: str) -> set:
+        """
+        Retrieves the fields the records of a kind can be queried by
+        :param kind: a String
+        :return: a set
+        """
+        return set(self.text_indexes[kind]) | set(self.number_indexes[kind])
+
+    def sorted_ranges(self, kind: str) -> dict:
+        """
+        Sorts the number indexes of a kind into the values and positions of
+        its records, once after every change
+        :param kind: a String
+        :return: a dict of field to a tuple of (values, positions)
+        """
+        if self.ranges[kind] is None:
+            self.ranges[kind] = {}
+            for field, entries in self.number_indexes[kind].items():
+                entries.sort()
+                self.ranges[kind][field] = ([value for value, _ in entries],
+                                            [position
+                                             for _, position in entries])
+        return self.ranges[kind]
+
+    def match(self, kind: str, field: str, operator: str, value: str) -> set:
+        """
+        Retrieves the positions of the records of a kind meeting a condition
+        :param kind: a String
+        :param field: a String
+        :param operator: a String
+        :param value: a String
+        :return: a set
+        """
+        if field in self.text_indexes[kind]:
+            if operator not in ('=', '!='):
+                raise QueryError(f"{field} can only be compared with = or !=")
+            index = self.text_indexes[kind][field]
+            positions = set().union(*[index.get(text, ())
+                                      for text in value.split(',')])
+        elif field in self.number_indexes[kind]:
+            values, sorted_positions = self.sorted_ranges(kind)[field]
+            try:
+                numbers = [float(number) for number in value.split(',')]
+            except ValueError:
+                raise QueryError(f"{field} must be compared with a number")
+            if operator in ('=', '!='):
+                positions = set().union(*[
+                    sorted_positions[bisect_left(values, number):
+                                     bisect_right(values, number)]
+                    for number in numbers])
+            else:
+                bounds_map = {
+                    '>': lambda number: (bisect_right(values, number),
+                                         len(values)),
+                    '>=': lambda number: (bisect_left(values, number),
+                                          len(values)),
+                    '<': lambda number: (0, bisect_left(values, number)),
+                    '<=': lambda number: (0, bisect_right(values, number))
+                }
+                if len(numbers) > 1:
+                    raise QueryError(f"{field} can only be compared with "
+                                     f"one number with {operator}")
+                start, stop = bounds_map[operator](numbers[0])
+                positions = set(sorted_positions[start:stop])
+        else:
+            raise QueryError(f"Unknown {kind} field: {field}")
+        if operator == '!=':
+            return set(range(len(self.records[kind]))) - positions
+        return positions
+
+    def select(self, query: PokeQuery) -> tuple:
+        """
+        Answers a PokeQuery
+        :param query: a PokeQuery
+        :return: a tuple of (fields, list of tuples of the values of the
+        fields of each record selected, number of records matched before
+        the limit of the query)
+        """
+        kind = query.kind
+        if kind not in self.records:
+            raise QueryError(f"Unknown kind: {kind}, expected one of "
+                             f"{', '.join(self.records)}")
+        fields = query.fields or list(OrderedDict.fromkeys(
+            ['name', 'id'] + [field for field, _, _ in query.conditions]
+            + ([query.sort] if query.sort else [])))
+        unknown = [field for field in fields + [query.sort or 'id']
+                   if field not in self.fields_of(kind)]
+        if unknown and self.records[kind]:
+            raise QueryError(f"Unknown {kind} field: {unknown[0]}")
+        matches = sorted((self.match(kind, *condition)
+                          for condition in query.conditions), key=len)
+        if matches:
+            positions = sorted(set.intersection(*matches))
+        else:
+            positions = range(len(self.records[kind]))
+        rows = self.rows[kind]
+        sort = query.sort or 'id'
+        present = [position for position in positions
+                   if rows[position].get(sort) is not None]
+        present.sort(key=lambda position: rows[position][sort],
+                     reverse=query.descending)
+        positions = present + [position for position in positions
+                               if rows[position].get(sort) is None]
+        matched = len(positions)
+        if query.limit is not None:
+            positions = positions[:query.limit]
+        return fields, [tuple(rows[position].get(field) for field in fields)
+                        for position in positions], matched
+
+
+class PokeTables:
+    """Precomputed tables of the Pokemon of a Pokedex for batch matchup
+    calculations: the base stats of every Pokemon, the damage multiplier of
+    every attacking type against every defending type and against every
+    Pokemon, and a bitset of the types of the damaging moves of every
+    Pokemon. Tables are typed arrays of one row per Pokemon, or per type for
+    the type chart, and batch functions run over every row in a single
+    vectorized pass as NumPy arrays when NumPy is installed, or in Python
+    loops otherwise.
+
+    A tables file starts with TABLES_MAGIC and a version byte, followed by
+    the length of a json header as a little-endian uint32, the header of
+    the names of the Pokemon, stats and types and of the item count of
+    each table, and the little-endian data of each table in that order."""
+
+    tables = {'ids': 'I', 'base_stats': 'H', 'effectiveness': 'f',
+              'defense': 'f', 'coverage': 'Q'}
+    relations = {'double_damage_to': 2.0, 'half_damage_to': 0.5,
+                 'no_damage_to': 0.0}
+    vectorized = NUMPY_AVAILABLE
+
+    def __init__(self, pokemon: list, stat_names: list, type_names: list):
+        self.pokemon = list(pokemon)
+        self.stat_names = list(stat_names)
+        self.type_names = list(type_names)
+        self.positions = {}
+        for name, typecode in self.tables.items():
+            setattr(self, name, array(typecode))
+
+    @classmethod
+    def build(cls, pokemon: list, moves: list, types: list):
+        """
+        Computes the tables of a list of Pokemon from the Moves they learn
+        and the json data of every type
+        :param pokemon: a list of Pokemon
+        :param moves: a list of Moves
+        :param types: a list of dicts of the type endpoint
+        :return: a PokeTables
+        """
+        pokemon = sorted(pokemon, key=lambda data: data.id_)
+        types = sorted(types, key=lambda data: data["id"])
+        if len(types) > 64:
+            raise ValueError("Move coverage is limited to 64 types")
+        stat_names = list(OrderedDict.fromkeys(
+            name for data in pokemon for name, _ in data.stats))
+        tables = cls([data.name for data in pokemon], stat_names,
+                     [data["name"] for data in types])
+        type_positions = {name: position for position, name
+                          in enumerate(tables.type_names)}
+        stat_positions = {name: position for position, name
+                          in enumerate(stat_names)}
+        count = len(types)
+        tables.effectiveness = array('f', [1.0]) * (count * count)
+        for attacking, type_data in enumerate(types):
+            for relation, multiplier in cls.relations.items():
+                for defending in type_data["damage_relations"].get(relation,
+                                                                   ()):
+                    position = type_positions.get(defending["name"])
+                    if position is not None:
+                        tables.effectiveness[attacking * count + position] \
+                            = multiplier
+        move_types = {move.name: type_positions.get(move.type_)
+                      for move in moves
+                      if move.power and move.damage_class != 'status'}
+        for data in pokemon:
+            tables.ids.append(data.id_)
+            stats = [0] * len(stat_names)
+            for name, value in data.stats:
+                stats[stat_positions[name]] = value
+            tables.base_stats.extend(stats)
+            defense = [1.0] * count
+            for type_ in data.types:
+                position = type_positions.get(type_)
+                if position is not None:
+                    for attacking in range(count):
+                        defense[attacking] *= tables.effectiveness[
+                            attacking * count + position]
+            tables.defense.extend(defense)
+            bits = 0
+            for move, _ in data.moves:
+                position = move_types.get(move)
+                if position is not None:
+                    bits |= 1 << position
+            tables.coverage.append(bits)
+        tables.index_positions()
+        return tables
+
+    def index_positions(self):
+        """
+        Maps the name and the ID of every Pokemon to its row
+        """
+        self.positions = {}
+        for position, (name, id_) in enumerate(zip(self.pokemon, self.ids)):
+            self.positions[name.lower()] = position
+            self.positions[str(id_)] = position
+
+    def write(self, output):
+        """
+        Writes the tables to a binary file
+        :param output: a binary file
+        """
+        header = json.dumps({
+            'pokemon': self.pokemon, 'stats': self.stat_names,
+            'types': self.type_names,
+            'tables': {name: len(getattr(self, name))
+                       for name in self.tables}
+        }, separators=(',', ':')).encode('utf-8')
+        output.write(TABLES_MAGIC + bytes([TABLES_VERSION]))
+        output.write(struct.pack('<I', len(header)) + header)
+        for name in self.tables:
+            table = getattr(self, name)
+            if sys.byteorder == 'big':
+                table = array(table.typecode, table)
+                table.byteswap()
+            output.write(table.tobytes())
+
+    @classmethod
+    def read(cls, input_file):
+        """
+        Reads the tables of a file written by PokeTables.write
+        :param input_file: a binary file
+        :return: a PokeTables
+        """
+        data = input_file.read()
+        if data[:len(TABLES_MAGIC) + 1] != \
+                TABLES_MAGIC + bytes([TABLES_VERSION]):
+            raise ValueError("Not a PokeTables file")
+        position = len(TABLES_MAGIC) + 1
+        (length,) = struct.unpack_from('<I', data, position)
+        header = json.loads(data[position + 4:position + 4 + length])
+        position += 4 + length
+        tables = cls(header['pokemon'], header['stats'], header['types'])
+        for name, typecode in cls.tables.items():
+            table = array(typecode)
+            size = header['tables'][name] * table.itemsize
+            table.frombytes(data[position:position + size])
+            if sys.byteorder == 'big':
+                table.byteswap()
+            setattr(tables, name, table)
+            position += size
+        tables.index_positions()
+        return tables
+
+    def __len__(self):
+        return len(self.pokemon)
+
+    def position_of(self, key) -> int:
+        """
+        Retrieves the row of a Pokemon
+        :param key: a String or int of the name or the ID of the Pokemon
+        :return: an int
+        """
+        position = self.positions.get(str(key).strip().lower())
+        if position is None:
+            raise KeyError(key)
+        return position
+
+    def row(self, name: str, position: int):
+        """
+        Retrieves a row of a table of one row per Pokemon
+        :param name: a String naming the table
+        :param position: an int
+        :return: an array
+        """
+        table = getattr(self, name)
+        width = len(table) // max(len(self.pokemon), 1)
+        return table[position * width:(position + 1) * width]
+
+    def stats_of(self, key) -> dict:
+        """
+        Retrieves the base stats of a Pokemon
+        :param key: a String or int of the name or the ID of the Pokemon
+        :return: a dict of stat names to base values
+        """
+        return dict(zip(self.stat_names,
+                        self.row('base_stats', self.position_of(key))))
+
+    def defense_of(self, key) -> dict:
+        """
+        Retrieves the damage multiplier of every attacking type against a
+        Pokemon
+        :param key: a String or int of the name or the ID of the Pokemon
+        :return: a dict of type names to multipliers
+        """
+        return dict(zip(self.type_names,
+                        self.row('defense', self.position_of(key))))
+
+    def coverage_of(self, key) -> list:
+        """
+        Retrieves the types of the damaging moves of a Pokemon
+        :param key: a String or int of the name or the ID of the Pokemon
+        :return: a list of type names
+        """
+        bits = self.coverage[self.position_of(key)]
+        return [type_ for position, type_ in enumerate(self.type_names)
+                if bits >> position & 1]
+
+    def matrix(self, name: str):
+        """
+        Views a table as a NumPy array of one row per Pokemon, or per type
+        for the type chart, without copying it
+        :param name: a String naming the table
+        :return: a numpy.ndarray
+        """
+        table = getattr(self, name)
+        rows = len(self.type_names) if name == 'effectiveness' \
+            else len(self.pokemon)
+        return numpy.frombuffer(table, dtype=table.typecode).reshape(
+            rows, len(table) // max(rows, 1))
+
+    def stat_totals(self) -> list:
+        """
+        Sums the base stats of every Pokemon
+        :return: a list of ints in the order of the Pokemon
+        """
+        if self.vectorized and self.pokemon:
+            return self.matrix('base_stats').sum(
+                axis=1, dtype=numpy.int64).tolist()
+        width = len(self.stat_names)
+        return [sum(self.base_stats[start:start + width])
+                for start in range(0, len(self.base_stats), width or 1)]
+
+    def score_counters(self, members: list) -> list:
+        """
+        Scores every Pokemon as a counter to a team in Python loops
+        :param members: a list of the rows of the team
+        :return: a list of floats in the order of the Pokemon
+        """
+        count = len(self.type_names)
+        covered = [[position for position in range(count)
+                    if bits >> position & 1] for bits in self.coverage]
+        defense = [self.defense[start:start + count]
+                   for start in range(0, len(self.defense), count or 1)]
+        scores = []
+        for position in range(len(self.pokemon)):
+            score = 0.0
+            for member in members:
+                score += max((defense[member][attacking]
+                              for attacking in covered[position]),
+                             default=0.0)
+                score -= max((defense[position][attacking]
+                              for attacking in covered[member]),
+                             default=0.0)
+            scores.append(score)
+        return scores
+
+    def score_counters_vectorized(self, members: list) -> list:
+        """
+        Scores every Pokemon as a counter to a team in a single pass over
+        the tables as NumPy arrays
+        :param members: a list of the rows of the team
+        :return: a list of floats in the order of the Pokemon
+        """
+        bits = numpy.arange(len(self.type_names), dtype=numpy.uint64)
+        covered = (self.matrix('coverage') >> bits & 1).astype(numpy.float32)
+        defense = self.matrix('defense')
+        offense = (covered[:, None, :] * defense[members][None, :, :]).max(
+            axis=2, initial=0.0).sum(axis=1)
+        threat = (covered[members][None, :, :] * defense[:, None, :]).max(
+            axis=2, initial=0.0).sum(axis=1)
+        return (offense - threat).tolist()
+
+    def best_counters(self, team, limit: int = DEFAULT_COUNTERS) -> list:
+        """
+        Ranks every Pokemon outside of a team as a counter to it. For each
+        member of the team, a counter scores the highest multiplier the
+        types of its damaging moves deal to the member, less the highest
+        multiplier the types of the member's deal to it. Ties are ranked
+        by base stat total, then by ID.
+        :param team: a list of the names or IDs of the Pokemon of the team
+        :param limit: the number of counters, None for every one
+        :return: a list of (name, ID, score, base stat total, list of the
+        types of the damaging moves) tuples
+        """
+        members = list(OrderedDict.fromkeys(self.position_of(key)
+                                            for key in team))
+        if self.vectorized and self.pokemon:
+            scores = self.score_counters_vectorized(members)
+        else:
+            scores = self.score_counters(members)
+        totals = self.stat_totals()
+        excluded = set(members)
+        ranked = sorted((position for position in range(len(self.pokemon))
+                         if position not in excluded),
+                        key=lambda position: (-scores[position],
+                                              -totals[position],
+                                              self.ids[position]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self.pokemon[position], self.ids[position], scores[position],
+                 totals[position], self.coverage_of(self.ids[position]))
+                for position in ranked]
+
+
+class NullMetrics:
+    """Metrics that record nothing, used when instrumentation is disabled
+    so the hooks cost next to nothing"""
+
+    enabled = False
+
+    def observe(self, stage: str, endpoint: str = '', seconds: float = None,
+                items: int = 1, size: int = 0, errors: int = 0,
+                retries: int = 0):
+        pass
+
+    def timer(self, stage: str, endpoint: str = '', items: int = 1):
+        return nullcontext()
+
+
+class StageMetrics:
+    """The counts, bytes and latency histogram of a stage and endpoint"""
+
+    __slots__ = ('count', 'timed', 'items', 'bytes', 'errors', 'retries',
+                 'seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.timed = 0
+        self.items = 0
+        self.bytes = 0
+        self.errors = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class Metrics(NullMetrics):
+    """Records counts, bytes and latency histograms per stage of the
+    PokeDex and per endpoint, reported as a table or in the Prometheus
+    text format"""
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+
+    def observe(self, stage: str, endpoint: str = '', seconds: float = None,
+                items: int = 1, size: int = 0, errors: int = 0,
+                retries: int = 0):
+        """
+        Records an operation of a stage
+        :param stage: a String
+        :param endpoint: a String
+        :param seconds: a float, or None for operations that are not timed
+        :param items: the number of items the operation handled
+        :param size: the number of bytes the operation handled
+        :param errors: the number of items the operation failed
+        :param retries: the number of times the operation is retried
+        """
+        metrics = self.stages.get((stage, endpoint))
+        if metrics is None:
+            metrics = self.stages[(stage, endpoint)] = StageMetrics()
+        metrics.count += 1
+        metrics.items += items
+        metrics.bytes += size
+        metrics.errors += errors
+        metrics.retries += retries
+        if seconds is not None:
+            metrics.timed += 1
+            metrics.seconds += seconds
+            metrics.max_seconds = max(metrics.max_seconds, seconds)
+            bucket = bisect_left(LATENCY_BUCKETS, seconds)
+            if bucket < len(LATENCY_BUCKETS):
+                metrics.buckets[bucket] += 1
+
+    @contextmanager
+    def timer(self, stage: str, endpoint: str = '', items: int = 1):
+        """
+        Times the operation of a stage run in a with block
+        :param stage: a String
+        :param endpoint: a String
+        :param items: the number of items the operation handles
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, endpoint, time.perf_counter() - start, items)
+
+    def report(self) -> str:
+        """
+        Creates a table of the metrics of each stage
+        :return: a String
+        """
+        lines = [f"{'Stage':<10} {'Endpoint':<22} {'Count':>8} "
+                 f"{'Items':>8} {'Bytes':>12} {'Errors':>7} {'Retries':>7} "
+                 f"{'Total ms':>10} {'Mean ms':>9} {'Max ms':>9}"]
+        for (stage, endpoint), metrics in sorted(self.stages.items()):
+            mean = metrics.seconds / max(metrics.timed, 1) * 1000
+            lines.append(f"{stage:<10} {endpoint or '-':<22} "
+                         f"{metrics.count:>8} {metrics.items:>8} "
+                         f"{metrics.bytes:>12} {metrics.errors:>7} "
+                         f"{metrics.retries:>7} "
+                         f"{metrics.seconds * 1000:>10.2f} {mean:>9.3f} "
+                         f"{metrics.max_seconds * 1000:>9.3f}")
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        """
+        Exports the metrics in the Prometheus text format
+        :return: a String
+        """
+        lines = [
+            "# HELP pokedex_stage_seconds Time spent in each stage.",
+            "# TYPE pokedex_stage_seconds histogram"
+        ]
+        for (stage, endpoint), metrics in sorted(self.stages.items()):
+            if not metrics.timed:
+                continue
+            labels = f'stage="{stage}",endpoint="{endpoint}"'
+            for bound, count in zip(LATENCY_BUCKETS,
+                                    accumulate(metrics.buckets)):
+                lines.append(f'pokedex_stage_seconds_bucket{{{labels},'
+                             f'le="{bound}"}} {count}')
+            lines.append(f'pokedex_stage_seconds_bucket{{{labels},'
+                         f'le="+Inf"}} {metrics.timed}')
+            lines.append(f'pokedex_stage_seconds_sum{{{labels}}} '
+                         f'{metrics.seconds}')
+            lines.append(f'pokedex_stage_seconds_count{{{labels}}} '
+                         f'{metrics.timed}')
+        for name, attribute, help_ in (
+                ('operations', 'count', "Operations run by each stage."),
+                ('items', 'items', "Items handled by each stage."),
+                ('bytes', 'bytes', "Bytes handled by each stage."),
+                ('errors', 'errors', "Items failed by each stage."),
+                ('retries', 'retries', "Operations retried by each stage.")):
+            lines.append(f"# HELP pokedex_stage_{name}_total {help_}")
+            lines.append(f"# TYPE pokedex_stage_{name}_total counter")
+            for (stage, endpoint), metrics in sorted(self.stages.items()):
+                lines.append(f'pokedex_stage_{name}_total{{stage="{stage}",'
+                             f'endpoint="{endpoint}"}} '
+                             f'{getattr(metrics, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+
+class CacheBackend(ABC):
+    """An abstract storage layer used by the ResponseCache"""
+
+    @abstractmethod
+    def get(self, url: str):
+        """
+        Retrieves a cached entry for a URL
+        :param url: a String
+        :return: a tuple of (body, stored_at, validators) or None
+        """
+        pass
+
+    @abstractmethod
+    def set(self, url: str, body, stored_at: float, validators: tuple = None):
+        """
+        Stores an entry for a URL
+        :param url: a String
+        :param body: the cached response
+        :param stored_at: a float timestamp
+        :param validators: a tuple of the ETag and Last-Modified headers of
+        the response, or None
+        """
+        pass
+
+    def touch(self, url: str, stored_at: float):
+        """
+        Marks the entry for a URL as stored again, once the server has
+        confirmed that it has not changed
+        :param url: a String
+        :param stored_at: a float timestamp
+        """
+        entry = self.get(url)
+        if entry is not None:
+            self.set(url, entry[0], stored_at, entry[2])
+
+    @abstractmethod
+    def delete(self, url: str):
+        """
+        Removes the entry for a URL
+        :param url: a String
+        """
+        pass
+
+    def close(self):
+        """
+        Releases any resources held by the backend
+        """
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """An in-memory cache of decoded responses with LRU eviction"""
+
+    def __init__(self, max_size: int = DEFAULT_MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, url: str):
+        entry = self.entries.get(url)
+        if entry is not None:
+            self.entries.move_to_end(url)
+        return entry
+
+    def set(self, url: str, body, stored_at: float, validators: tuple = None):
+        self.entries[url] = (body, stored_at, validators)
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def delete(self, url: str):
+        self.entries.pop(url, None)
+
+
+class DiskCache(CacheBackend):
+    """A persistent cache of raw responses stored in a SQLite database,
+    evicting the least recently used entries once it is full. Writes are
+    buffered in memory and committed in batches of flush_size by a writer
+    thread with a connection of its own, so a run does not wait on a commit
+    per response and an event loop is never blocked by one. Reads see the
+    buffered writes before they are committed."""
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_CACHE_SIZE,
+                 flush_size: int = DEFAULT_CACHE_FLUSH_SIZE):
+        self.path = os.path.join(cache_dir, "responses.sqlite3")
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.connection = None
+        self.write_connection = None
+        self.writer = None
+        self.pending = OrderedDict()
+        self.accessed = {}
+        self.writing = []
+        self.size = 0
+
+    def open_database(self):
+        """
+        Opens a connection to the database, creating it if it does not
+        exist yet
+        :return: a sqlite3.Connection
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, body TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "etag TEXT, last_modified TEXT)")
+        columns = {row[1] for row in connection.execute(
+            "PRAGMA table_info(responses)")}
+        for column in ('etag', 'last_modified'):
+            if column not in columns:
+                connection.execute(
+                    f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)")
+        connection.commit()
+        return connection
+
+    def connect(self):
+        """
+        Opens the connection the database is read with
+        :return: a sqlite3.Connection
+        """
+        if self.connection is None:
+            self.connection = self.open_database()
+        return self.connection
+
+    def get(self, url: str):
+        if url in self.pending:
+            row = self.pending[url]
+        else:
+            for batch in reversed(self.writing):
+                if url in batch:
+                    row = batch[url]
+                    break
+            else:
+                row = self.connect().execute(
+                    "SELECT body, stored_at, etag, last_modified "
+                    "FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        self.accessed[url] = time.time()
+        body, stored_at, etag, last_modified = row
+        validators = (etag, last_modified) if etag or last_modified else None
+        return self.decompress(body), stored_at, validators
+
+    @staticmethod
+    def compress(body) -> bytes:
+        """
+        Compresses the body of a response before it is written, which
+        makes PokeAPI responses about 25 times smaller
+        :param body: a String or bytes of json
+        :return: bytes
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return zlib.compress(body, 1)
+
+    @staticmethod
+    def decompress(body):
+        """
+        Decompresses the body of a response read from the database. Bodies
+        written uncompressed by earlier versions are returned as they are,
+        as json never starts with the zlib header.
+        :param body: a String or bytes
+        :return: a String or bytes of json
+        """
+        if isinstance(body, bytes) and body[:1] == b'x':
+            return zlib.decompress(body)
+        return body
+
+    def set(self, url: str, body, stored_at: float, validators: tuple = None):
+        etag, last_modified = validators or (None, None)
+        self.pending[url] = (body, stored_at, etag, last_modified)
+        self.pending.move_to_end(url)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def delete(self, url: str):
+        self.pending[url] = None
+        self.accessed.pop(url, None)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands the buffered writes to the writer thread, without waiting for
+        them to be committed from a running event loop
+        """
+        if not self.pending and not self.accessed:
+            return
+        batch, accessed = self.pending, self.accessed
+        self.pending, self.accessed = OrderedDict(), {}
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(
+                1, thread_name_prefix="pokedex-cache")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.writer.submit(self.write_batch, batch, accessed).result()
+            return
+        self.writing.append(batch)
+        future = loop.run_in_executor(self.writer, self.write_batch, batch,
+                                      accessed)
+        future.add_done_callback(lambda task: self.end_write(task, batch))
+
+    def end_write(self, future: asyncio.Future, batch: dict):
+        """
+        Forgets a batch once the writer thread is done with it, reporting
+        the error that kept it from being committed
+        :param future: an asyncio.Future of the write
+        :param batch: a dict of URLs to rows
+        """
+        self.writing = [writing for writing in self.writing
+                        if writing is not batch]
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Unable to write to the cache: {future.exception()}",
+                  file=sys.stderr)
+
+    def write_batch(self, batch: dict, accessed: dict):
+        """
+        Commits a batch of writes in a single transaction, evicting the
+        least recently used entries if the cache is full, in the writer
+        thread
+        :param batch: a dict of URLs to rows, or None for deleted entries
+        :param accessed: a dict of URLs to the time they were last read
+        """
+        if self.write_connection is None:
+            self.write_connection = self.open_database()
+            self.size = self.write_connection.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+        connection = self.write_connection
+        with connection:
+            for url, row in batch.items():
+                if row is None:
+                    cursor = connection.execute(
+                        "DELETE FROM responses WHERE url = ?", (url,))
+                    self.size -= cursor.rowcount
+                    continue
+                body, stored_at, etag, last_modified = row
+                body = self.compress(body)
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO responses (url, body, stored_at, "
+                    "accessed_at, etag, last_modified) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, body, stored_at, stored_at, etag, last_modified))
+                if cursor.rowcount:
+                    self.size += 1
+                else:
+                    connection.execute(
+                        "UPDATE responses SET body = ?, stored_at = ?, "
+                        "accessed_at = ?, etag = ?, last_modified = ? "
+                        "WHERE url = ?",
+                        (body, stored_at, stored_at, etag, last_modified,
+                         url))
+            connection.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE url = ?",
+                [(accessed_at, url) for url, accessed_at in accessed.items()
+                 if url not in batch])
+            if self.size > self.max_size:
+                self.evict(self.size - self.max_size)
+
+    def iter_prefix(self, prefix: str):
+        """
+        Lazily yields the URL and raw body of every committed entry whose
+        URL starts with a prefix
+        :param prefix: a String
+        :return: a generator of (url, body) tuples
+        """
+        for url, body in self.connect().execute(
+                "SELECT url, body FROM responses WHERE substr(url, 1, ?) = ? "
+                "ORDER BY url", (len(prefix), prefix)):
+            yield url, self.decompress(body)
+
+    def evict(self, count: int):
+        """
+        Removes the least recently used entries from the database, in the
+        writer thread
+        :param count: an int
+        """
+        cursor = self.write_connection.execute(
+            "DELETE FROM responses WHERE url IN (SELECT url FROM responses "
+            "ORDER BY accessed_at LIMIT ?)", (count,))
+        self.size -= cursor.rowcount
+
+    def close_writer(self):
+        """
+        Closes the connection of the writer thread
+        """
+        if self.write_connection is not None:
+            self.write_connection.close()
+            self.write_connection = None
+
+    def close(self):
+        """
+        Commits the buffered writes, waiting for the writer thread to be
+        done, and closes the database
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.submit(self.close_writer)
+            self.writer.shutdown(wait=True)
+            self.writer = None
+        self.writing = []
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class ResponseCache:
+    """A cache of PokeAPI responses keyed by URL, made of an in-memory LRU
+    in front of an optional persistent DiskCache"""
+
+    def __init__(self, cache_dir: str = None, ttl: int = DEFAULT_CACHE_TTL,
+                 max_size: int = DEFAULT_CACHE_SIZE,
+                 memory_size: int = DEFAULT_MEMORY_CACHE_SIZE,
+                 decode=None):
+        self.ttl = ttl
+        self.decode = decode or (lambda url, body: json.loads(body))
+        self.memory = MemoryCache(memory_size)
+        self.disk = DiskCache(cache_dir, max_size) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.served_stale = 0
+
+    def is_fresh(self, stored_at: float) -> bool:
+        """
+        Checks if an entry stored at a given time has not expired yet
+        :param stored_at: a float timestamp
+        :return: a bool
+        """
+        return self.ttl is None or time.time() - stored_at < self.ttl
+
+    def lookup(self, url: str):
+        """
+        Retrieves the cached entry of a URL, whether it is fresh or not, so
+        an expired entry can be revalidated with its validators
+        :param url: a String
+        :return: a tuple of (data, stored_at, validators) or None
+        """
+        entry = self.memory.get(url)
+        if entry is None and self.disk:
+            entry = self.disk.get(url)
+            if entry is not None:
+                entry = (self.decode(url, entry[0]), entry[1], entry[2])
+                self.memory.set(url, *entry)
+        if entry is None or not self.is_fresh(entry[1]):
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def get(self, url: str):
+        """
+        Retrieves the decoded response of a URL if a fresh copy is cached
+        :param url: a String
+        :return: a dict or None
+        """
+        entry = self.lookup(url)
+        if entry is None or not self.is_fresh(entry[1]):
+            return None
+        return entry[0]
+
+    def set(self, url: str, body: bytes, data: dict,
+            validators: tuple = None):
+        """
+        Stores the raw and decoded response of a URL
+        :param url: a String
+        :param body: bytes of json
+        :param data: a dict
+        :param validators: a tuple of the ETag and Last-Modified headers of
+        the response, or None
+        """
+        stored_at = time.time()
+        self.memory.set(url, data, stored_at, validators)
+        if self.disk:
+            self.disk.set(url, body, stored_at, validators)
+
+    def refresh(self, url: str):
+        """
+        Marks the cached response of a URL as fresh again after the server
+        answered its revalidation with 304 Not Modified
+        :param url: a String
+        """
+        stored_at = time.time()
+        self.revalidated += 1
+        self.memory.touch(url, stored_at)
+        if self.disk:
+            self.disk.touch(url, stored_at)
+
+    def iter_endpoint(self, prefix: str):
+        """
+        Lazily yields the decoded response of every resource of an endpoint
+        in the persistent store, whether it is fresh or not, once however
+        many URLs it was retrieved by
+        :param prefix: a String, the normalized URL of the endpoint
+        :return: a generator of dicts
+        """
+        if not self.disk:
+            return
+        seen = set()
+        for url, body in self.disk.iter_prefix(prefix):
+            key = url[len(prefix):].rstrip('/')
+            if not key or '/' in key or '?' in key:
+                continue
+            try:
+                data = self.decode(url, body)
+            except ValueError:
+                continue
+            if data.get("id") not in seen:
+                seen.add(data.get("id"))
+                yield data
+
+    def close(self):
+        """
+        Flushes and closes the persistent store
+        """
+        if self.disk:
+            self.disk.close()
+
+
+class SnapshotStore:
+    """A compact local store of PokeAPI resources saved in a SQLite
+    database, with in-memory indexes resolving IDs and names in O(1)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = None
+        self.index = None
+
+    def connect(self):
+        """
+        Opens the database, creating it if it does not exist yet
+        :return: a sqlite3.Connection
+        """
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                "endpoint TEXT NOT NULL, id INTEGER NOT NULL, "
+                "name TEXT NOT NULL, body BLOB NOT NULL, "
+                "PRIMARY KEY (endpoint, id))")
+        return self.connection
+
+    def load_index(self) -> dict:
+        """
+        Loads the index of (endpoint, ID or name) to the row of a resource
+        :return: a dict
+        """
+        if self.index is None:
+            self.index = {}
+            rows = self.connect().execute(
+                "SELECT rowid, endpoint, id, name FROM resources")
+            for rowid, endpoint, id_, name in rows:
+                self.index[(endpoint, str(id_))] = rowid
+                self.index[(endpoint, name)] = rowid
+        return self.index
+
+    @staticmethod
+    def compact(endpoint: str, data: dict) -> dict:
+        """
+        Strips a resource down to the fields used to create its PokeData
+        :param endpoint: a String
+        :param data: a dict
+        :return: a dict
+        """
+        compact = {field: data[field] for field in SNAPSHOT_FIELDS[endpoint]}
+        if compact.get("effect_entries"):
+            compact["effect_entries"] = [
+                DataHandler.effect_entry(data["effect_entries"])]
+        if endpoint == 'pokemon':
+            compact["moves"] = [
+                {"move": move["move"],
+                 "version_group_details": move["version_group_details"][:1]}
+                for move in data["moves"]]
+        return compact
+
+    def put(self, endpoint: str, data: dict):
+        """
+        Stores a resource, replacing any earlier copy of it
+        :param endpoint: a String
+        :param data: a dict
+        """
+        body = json.dumps(self.compact(endpoint, data), separators=(',', ':'))
+        cursor = self.connect().execute(
+            "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?)",
+            (endpoint, data["id"], data["name"],
+             zlib.compress(body.encode('utf-8'))))
+        if self.index is not None:
+            self.index[(endpoint, str(data["id"]))] = cursor.lastrowid
+            self.index[(endpoint, data["name"])] = cursor.lastrowid
+
+    def get(self, endpoint: str, key) -> dict:
+        """
+        Retrieves a resource by ID or name
+        :param endpoint: a String
+        :param key: a String or int
+        :return: a dict or None
+        """
+        rowid = self.load_index().get((endpoint, str(key).lower()))
+        if rowid is None:
+            return None
+        row = self.connection.execute(
+            "SELECT body FROM resources WHERE rowid = ?", (rowid,)).fetchone()
+        return json.loads(zlib.decompress(row[0]))
+
+    def get_url(self, url: str) -> dict:
+        """
+        Retrieves the resource of a PokeAPI URL
+        :param url: a String
+        :return: a dict or None
+        """
+        parts = [part for part in url.split('?')[0].split('/') if part]
+        if len(parts) < 2:
+            return None
+        return self.get(parts[-2], parts[-1])
+
+    def id_of(self, endpoint: str, key) -> int:
+        """
+        Retrieves the ID of a resource by ID or name
+        :param endpoint: a String
+        :param key: a String or int
+        :return: an int or None
+        """
+        rowid = self.load_index().get((endpoint, str(key).lower()))
+        if rowid is None:
+            return None
+        return self.connection.execute(
+            "SELECT id FROM resources WHERE rowid = ?", (rowid,)).fetchone()[0]
+
+    def ids_of(self, endpoint: str) -> set:
+        """
+        Retrieves the IDs of the stored resources of an endpoint
+        :param endpoint: a String
+        :return: a set of ints
+        """
+        return {id_ for (id_,) in self.connect().execute(
+            "SELECT id FROM resources WHERE endpoint = ?", (endpoint,))}
+
+    def delete(self, endpoint: str, id_: int):
+        """
+        Removes a resource from the store
+        :param endpoint: a String
+        :param id_: an int
+        """
+        self.connect().execute(
+            "DELETE FROM resources WHERE endpoint = ? AND id = ?",
+            (endpoint, id_))
+        self.index = None
+
+    def iter_endpoint(self, endpoint: str):
+        """
+        Lazily yields every resource of an endpoint in the order of their IDs
+        :param endpoint: a String
+        :return: a generator of dicts
+        """
+        rows = self.connect().execute(
+            "SELECT body FROM resources WHERE endpoint = ? ORDER BY id",
+            (endpoint,))
+        for (body,) in rows:
+            yield json.loads(zlib.decompress(body))
+
+    def commit(self):
+        """
+        Saves the resources stored so far
+        """
+        if self.connection is not None:
+            self.connection.commit()
+
+    def close(self):
+        """
+        Saves and closes the database
         """
-        if self.request:
-            if os.path.isfile(self.request.input):
-                poke_api_param = self.retrieve_file_input()
-            else:
-                poke_api_param = self.request.input
-            try:
-                poke_data_param = self.call_poke_api(poke_api_param)
-            except Exception:
-                print("Incorrect endpoint")
-            else:
-                poke_datum = self.create_poke_data(poke_data_param)
-                self.report_poke_data(poke_datum)
-        else:
-            print("Please set a Poke Request!")
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+            self.index = None
 
 
-class FileHandler:
-    """This class is responsible for handling input and output files for
-    PokeData"""
+class PokeAPIError(Exception):
+    """An error returned in place of the data of a failed PokeAPI request"""
 
-    @staticmethod
-    def handle_input_file(file_path: str) -> list:
+    def __init__(self, url: str, status: int = None, message: str = ''):
+        super().__init__(url, status, message)
+        self.url = url
+        self.status = status
+        self.message = message
+
+    @property
+    def retryable(self) -> bool:
         """
-        Retrieves a list of parameters used to complete Poke API end points
-        :param file_path: a String
-        :return:a list
+        Checks if the request may succeed when it is sent again
+        :return: a bool
         """
-        try:
-            with open(file_path, mode='r+', encoding='utf-8') as input_file:
-                content = [x.strip() for x in input_file.readlines()]
-        except Exception:
-            print("Unable to read from input file.. now stopping PokeDex")
-            exit()
-        else:
-            return content
+        return self.status is None or self.status == 429 \
+            or self.status >= 500
 
-    @staticmethod
-    def handle_output_file(file_path: str, datum):
+    def __str__(self):
+        status = f"{self.status} " if self.status else ''
+        return f"Error! Could not retrieve {self.url}: {status}{self.message}"
+
+
+class TokenBucket:
+    """A token bucket limiting the rate at which requests are started"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
         """
-        Writes a report of the PokeData to a specified file
-        :param file_path: a String
-        :param datum: a list
+        Waits until a token is available and takes it
         """
-        try:
-            with open(file_path, mode='w+', encoding='utf-8') as output_file:
-                output_file.writelines(datum)
-        except Exception:
-            dashes = "-" * 30
-            print("Unable to write to file. Now outputting to console:\n")
-            for data in datum:
-                print(data)
-                print(dashes)
-        else:
-            print(f"Report successfully written to {file_path}!")
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
 
 
-class PokeData(ABC):
-    """An abstract class that all PokeData must inherit from"""
+class RequestScheduler:
+    """This class schedules the requests sent to the PokeAPI, bounding the
+    number of requests in flight, limiting their rate and retrying failed
+    requests with exponential backoff and jitter"""
 
-    @abstractmethod
-    def __init__(self, name: str, id_: int):
-        self.name = name
-        self.id_ = id_
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 rate: float = DEFAULT_RATE, retries: int = DEFAULT_RETRIES,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 backoff: float = DEFAULT_BACKOFF):
+        self.concurrency = concurrency
+        self.semaphore = None
+        self.semaphore_loop = None
+        self.bucket = TokenBucket(rate) if rate > 0 else None
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.sent = 0
+        self.retried = 0
+        self.metrics = NullMetrics()
 
-    @abstractmethod
-    def __str__(self):
-        pass
+    def loop_semaphore(self) -> asyncio.Semaphore:
+        """
+        Retrieves the semaphore bounding the requests in flight in the
+        running event loop, creating it inside the loop the first time the
+        scheduler is used from it, as an asyncio.Semaphore may only be
+        used from a single loop and a PokeDex can run several in turn
+        :return: an asyncio.Semaphore
+        """
+        loop = asyncio.get_running_loop()
+        if self.semaphore_loop is not loop:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.semaphore_loop = loop
+        return self.semaphore
 
+    def backoff_delay(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Calculates how long to wait before retrying a request, honouring
+        the Retry-After header when the server sends one
+        :param attempt: an int
+        :param retry_after: a String
+        :return: a float
+        """
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), MAX_BACKOFF)
+        return random.uniform(0, min(self.backoff * 2 ** attempt,
+                                     MAX_BACKOFF))
 
-class Ability(PokeData):
-    """Class of PokeData representing Pokemon Abilities"""
+    async def fetch(self, session: aiohttp.ClientSession, url: str,
+                    headers: dict = None, endpoint: str = '') -> tuple:
+        """
+        Sends a GET request, retrying it until it succeeds or runs out of
+        retries. A conditional request answered with 304 Not Modified
+        succeeds without a body. Every attempt is recorded as a network
+        operation of the endpoint, whether it succeeds, fails or is retried.
+        :param session: a aiohttp.ClientSession
+        :param url: a String
+        :param headers: a dict of request headers
+        :param endpoint: a String labelling the metrics of the request
+        :return: a tuple of the bytes of the response body, decoded by the
+        PokeAPICaller without an intermediate String, or None if it was not
+        modified, and the response headers
+        """
+        attempt = 0
+        while True:
+            retry_after = None
+            error = None
+            size = 0
+            async with self.loop_semaphore():
+                if self.bucket:
+                    await self.bucket.acquire()
+                self.sent += 1
+                start = time.perf_counter()
+                try:
+                    async with session.get(
+                            url, headers=headers,
+                            timeout=aiohttp.ClientTimeout(
+                                total=self.timeout)) as response:
+                        if response.status == 200:
+                            body = await response.read()
+                            size = len(body)
+                            return body, response.headers
+                        if response.status == 304 and headers:
+                            return None, response.headers
+                        error = PokeAPIError(url, response.status,
+                                             response.reason)
+                        retry_after = response.headers.get("Retry-After")
+                except asyncio.TimeoutError:
+                    error = PokeAPIError(url, message="Request timed out")
+                except aiohttp.ClientError as e:
+                    error = PokeAPIError(url, message=str(e))
+                finally:
+                    retry = error is not None and error.retryable \
+                        and attempt < self.retries
+                    self.metrics.observe('network', endpoint,
+                                         time.perf_counter() - start,
+                                         size=size,
+                                         errors=int(error is not None),
+                                         retries=int(retry))
+            if not retry:
+                raise error
+            await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+            attempt += 1
+            self.retried += 1
 
-    def __init__(self, name: str, id_: int, generation: str, effect: str,
-                 effect_short: str, pokemon: list):
-        super().__init__(name, id_)
-        self.generation = generation
-        self.effect = effect
-        self.effect_short = effect_short
-        self.pokemon = pokemon
 
-    def __str__(self):
-        pokemon_str = '\n'.join(self.pokemon)
-        return f"Name: {self.name}\nID: {self.id_}" \
-               f"\nGeneration: {self.generation}\nEffect: {self.effect}" \
-               f"\nEffect (Short): {self.effect_short}" \
-               f"\nPokemon:\n{pokemon_str}"
+class PokeAPICaller:
+    """Class responbiel for making calls to the PokeAPI"""
 
+    def __init__(self, cache: ResponseCache = None,
+                 connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+                 connection_limit_per_host: int =
+                 DEFAULT_CONNECTION_LIMIT_PER_HOST,
+                 scheduler: RequestScheduler = None,
+                 store: SnapshotStore = None,
+                 api_url: str = DEFAULT_API_URL):
+        self.set_api_url(api_url)
+        self.cache = cache
+        self.store = store
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.scheduler = scheduler or RequestScheduler()
+        self.session = None
+        self.owns_session = False
+        self.session_users = 0
+        self.in_flight = {}
+        self.aliases = OrderedDict()
+        self.alias_limit = DEFAULT_ALIAS_LIMIT
+        self.coalesced = 0
+        self.metrics = NullMetrics()
+        self.loads = json.loads
+        self.projections = FIELD_PROJECTIONS
+        self.stale_while_revalidate = False
+        self.refreshing = set()
 
-class Moves(PokeData):
-    """Class of PokeData representing Pokemon Moves"""
+    def set_api_url(self, api_url: str):
+        """
+        Sets the base URL of the API the endpoint URLs are built from
+        :param api_url: a String
+        """
+        api_url = api_url.rstrip('/')
+        self.api_url = api_url
+        self.ability_url = api_url + "/ability/{}/"
+        self.pokemon_url = api_url + "/pokemon/{}/"
+        self.move_url = api_url + "/move/{}/"
+        self.stat_url = api_url + "/stat/{}/"
+        self.list_url = api_url + "/{}/?limit={}&offset={}"
 
-    def __init__(self, name: str, id_: int, generation: str, accuracy: int,
-                 pp: int, power: int, type_: str, damage_class: str,
-                 effect_short: str):
-        super().__init__(name, id_)
-        self.generation = generation
-        self.accuracy = accuracy
-        self.pp = pp
-        self.power = power
-        self.type_ = type_
-        self.damage_class = damage_class
-        self.effect_short = effect_short
+    def endpoint_of(self, url: str) -> str:
+        """
+        Retrieves the name of the endpoint of a URL, used to label metrics
+        :param url: a String
+        :return: a String
+        """
+        path = url.partition('?')[0]
+        if path.startswith(self.api_url):
+            path = path[len(self.api_url):]
+        return path.strip('/').partition('/')[0]
 
-    def __str__(self):
-        return f"Name: {self.name}\nID: {self.id_}\n" \
-               f"Generation: {self.generation}\nAccuracy: {self.accuracy}\n" \
-               f"PP: {self.pp}\nPower: {self.power}\nType: {self.type_}\n" \
-               f"Damage Type: {self.damage_class}\n" \
-               f"Effect Short: {self.effect_short}"
+    @staticmethod
+    def project(data, fields: dict):
+        """
+        Keeps only the given fields of a decoded json object, or of each
+        object of a list
+        :param data: a dict or a list
+        :param fields: a dict mapping the fields kept to the fields kept of
+        their own value, or None to keep the whole value
+        :return: a dict or a list
+        """
+        if isinstance(data, list):
+            return [PokeAPICaller.project(item, fields) for item in data]
+        if not isinstance(data, dict):
+            return data
+        projected = {}
+        for field, nested in fields.items():
+            if field not in data:
+                continue
+            value = data[field]
+            if isinstance(nested, tuple):
+                limit, nested = nested
+                value = value[:limit] if isinstance(value, list) else value
+            if nested is not None:
+                value = PokeAPICaller.project(value, nested)
+            projected[field] = value
+        return projected
 
+    def decode(self, url: str, body) -> dict:
+        """
+        Decodes the body of a response, keeping only the fields of a
+        Pokemon needed to create its PokeData. Other resources and lists of
+        resources are kept whole.
+        :param url: a String
+        :param body: a String or bytes of json
+        :return: a dict
+        """
+        data = self.loads(body)
+        fields = None if '?' in url \
+            else self.projections.get(self.endpoint_of(url))
+        return self.project(data, fields) if fields else data
 
-class Pokemon(PokeData):
-    """Class of PokeData representing Pokemon"""
+    async def __aenter__(self):
+        """
+        Starts using the shared ClientSession, which is only opened once a
+        response has to be downloaded
+        :return: a PokeAPICaller
+        """
+        self.session_users += 1
+        return self
 
-    def __init__(self, name: str, id_: int, height: int, weight: int,
-                 stats: list, types: list, abilities: list, moves: list):
-        super().__init__(name, id_)
-        self.height = height
-        self.weight = weight
-        self.stats = stats
-        self.types = types
-        self.abilities = abilities
-        self.moves = moves
+    def open_session(self) -> aiohttp.ClientSession:
+        """
+        Opens the shared ClientSession unless one is already open, so runs
+        answered from the cache or the SnapshotStore never load aiohttp
+        :return: a aiohttp.ClientSession
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.owns_session = True
+        return self.session
 
-    def __str__(self):
-        stat_str = ''
-        type_str = ''
-        ability_str = ''
-        move_str = ''
-        for type_ in self.types:
-            type_str += f"{type_}\n"
-        if isinstance(self.stats[0], Stats):
-            for stat in self.stats:
-                stat_str += f"{stat}\n"
-            for ability in self.abilities:
-                ability_str += f"{ability}\n\n"
-            for move in self.moves:
-                move_str += f"{move}\n\n"
-        else:
-            for stat in self.stats:
-                stat_str += f"{stat[0]} - {stat[1]}\n"
-            for ability in self.abilities:
-                ability_str += f"{ability}\n\n"
-            for move in self.moves:
-                move_str += f"{move[0]} - {move[1]}\n"
-        return f"Name: {self.name}\nID: {self.id_}\n" \
-               f"Height: {self.height}\nWeight: {self.weight}\n\n" \
-               f"Stats:\n{stat_str}\nTypes:\n{type_str}\n" \
-               f"Abilities:\n{ability_str}Moves:\n{move_str}"
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """
+        Closes the shared ClientSession once its last user is done with it,
+        after the background refreshes of stale responses have finished
+        """
+        self.session_users -= 1
+        if self.session_users == 0 and self.refreshing:
+            await asyncio.gather(*self.refreshing, return_exceptions=True)
+        if self.session_users == 0 and self.session is not None \
+                and self.owns_session:
+            session, self.session = self.session, None
+            await session.close()
 
+    @contextmanager
+    def detached_session(self):
+        """
+        Sets the shared ClientSession aside while a new event loop runs,
+        so the loop opens and closes a session of its own instead of using
+        one bound to another loop, then puts it back
+        """
+        state = self.session, self.owns_session, self.session_users
+        self.session, self.owns_session, self.session_users = None, False, 0
+        try:
+            yield
+        finally:
+            self.session, self.owns_session, self.session_users = state
 
-class Stats(PokeData):
-    """Class of PokeData representing Pokemon Stats"""
+    def set_session(self, session: aiohttp.ClientSession):
+        """
+        Shares a ClientSession opened by the caller, which is left open for
+        the caller to close
+        :param session: a aiohttp.ClientSession
+        """
+        self.session = session
+        self.owns_session = False
 
-    def __init__(self, name, id_, is_battle_only):
-        super().__init__(name, id_)
-        self.is_battle_only = is_battle_only
+    def canonical_url(self, url: str) -> str:
+        """
+        Normalizes a URL, resolving the name of a resource to its ID when
+        the alias is known or the resource is in the SnapshotStore, so a
+        resource requested by name and by ID shares one key
+        :param url: a String
+        :return: a String
+        """
+        url = self.normalize_url(url)
+        if self.store and '?' not in url:
+            prefix, _, key = url.rstrip('/').rpartition('/')
+            if not key.isdigit():
+                id_ = self.store.id_of(prefix.rpartition('/')[2], key)
+                if id_ is not None:
+                    return f"{prefix}/{id_}/"
+        return url
 
-    def __str__(self):
-        return f"Name: {self.name}\nID: {self.id_}\n" \
-               f"Is Battle Only: {self.is_battle_only}"
+    def normalize_url(self, url: str) -> str:
+        """
+        Normalizes a URL so requests for the same resource share one key,
+        ignoring case and trailing slashes, and mapping names to the ID of
+        resources already retrieved
+        :param url: a String
+        :return: a String
+        """
+        path, separator, query = url.strip().partition('?')
+        url = path.lower().rstrip('/') + '/' + separator + query
+        alias = self.aliases.get(url)
+        if alias is None:
+            return url
+        self.aliases.move_to_end(url)
+        return alias
 
+    def learn_aliases(self, url: str, data: dict):
+        """
+        Records the URLs of a resource by name and by ID as aliases of
+        each other, forgetting the least recently used aliases once there
+        are more than alias_limit
+        :param url: a String
+        :param data: a dict
+        """
+        if '?' in url or not isinstance(data, dict) \
+                or "id" not in data or "name" not in data:
+            return
+        prefix, _, _ = url.rstrip('/').rpartition('/')
+        id_url = f"{prefix}/{data['id']}/"
+        for alias in {f"{prefix}/{str(data['name']).lower()}/", url}:
+            if alias != id_url:
+                self.aliases[alias] = id_url
+                self.aliases.move_to_end(alias)
+        while len(self.aliases) > self.alias_limit:
+            self.aliases.popitem(last=False)
 
-class PokeAPICaller:
-    """Class responbiel for making calls to the PokeAPI"""
+    async def get_data(self, url: str,
+                       session: aiohttp.ClientSession = None) -> dict:
+        """
+        Retrieves data from a specified API endpoint URL, using the cache
+        when a fresh response is available, or the SnapshotStore only when
+        the requests are resolved offline. Expired responses are revalidated
+        with the server, or served as they are while they are revalidated
+        in the background in stale-while-revalidate mode. Concurrent
+        requests for the same normalized URL share a single download.
+        :param url: a string
+        :param session: a aio.httpClientSession, the shared session is used
+        if it is not provided
+        :return: a dict
+        """
+        url = self.normalize_url(url)
+        if self.store:
+            with self.metrics.timer('store', self.endpoint_of(url)):
+                data = self.store.get_url(url)
+            if data is None:
+                raise PokeAPIError(url, 404, "Not Found in snapshot")
+            return data
+        entry = None
+        if self.cache:
+            entry = self.cache.lookup(url)
+            if entry is not None and self.cache.is_fresh(entry[1]):
+                self.metrics.observe('cache_hit', self.endpoint_of(url))
+                return entry[0]
+            if entry is not None and self.stale_while_revalidate:
+                self.cache.served_stale += 1
+                self.metrics.observe('cache_stale', self.endpoint_of(url))
+                task = self.start_download(url, session, entry)
+                if task not in self.refreshing:
+                    self.refreshing.add(task)
+                    task.add_done_callback(self.end_refresh)
+                return entry[0]
+        return await asyncio.shield(self.start_download(url, session, entry))
 
-    def __init__(self):
-        self.ability_url = "https://pokeapi.co/api/v2/ability/{}/"
-        self.pokemon_url = "https://pokeapi.co/api/v2/pokemon/{}/"
-        self.move_url = "https://pokeapi.co/api/v2/move/{}/"
+    def start_download(self, url: str, session: aiohttp.ClientSession = None,
+                       entry: tuple = None) -> asyncio.Future:
+        """
+        Starts downloading a URL unless a download of it is already in
+        flight
+        :param url: a String
+        :param session: a aio.httpClientSession
+        :param entry: the expired cache entry of the URL, or None
+        :return: an asyncio.Future of the download
+        """
+        task = self.in_flight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.download_data(url, session, entry))
+            self.in_flight[url] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(url, None))
+        else:
+            self.coalesced += 1
+        return task
+
+    def end_refresh(self, task: asyncio.Future):
+        """
+        Forgets a finished background refresh, discarding its error as the
+        stale response was already served
+        :param task: an asyncio.Future
+        """
+        self.refreshing.discard(task)
+        if not task.cancelled():
+            task.exception()
 
     @staticmethod
-    async def get_data(url: str,
-                       session: aiohttp.ClientSession) -> dict:
+    def conditional_headers(validators: tuple) -> dict:
         """
-        Retrieves data from a specified API endpoint URL
-        :param url: a string
+        Creates the headers revalidating a cached response
+        :param validators: a tuple of the ETag and Last-Modified headers of
+        the cached response, or None
+        :return: a dict, or None if the response cannot be revalidated
+        """
+        if not validators:
+            return None
+        etag, last_modified = validators
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    @staticmethod
+    def validators_of(headers) -> tuple:
+        """
+        Retrieves the validators of a response from its headers
+        :param headers: a Mapping of response headers
+        :return: a tuple of the ETag and Last-Modified headers, or None
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        return (etag, last_modified) if etag or last_modified else None
+
+    async def download_data(self, url: str,
+                            session: aiohttp.ClientSession = None,
+                            entry: tuple = None) -> dict:
+        """
+        Downloads and decodes the data of a URL, storing it in the cache.
+        An expired cache entry is revalidated and refreshed as is if the
+        server answers that it has not been modified.
+        :param url: a String
         :param session: a aio.httpClientSession
+        :param entry: the expired cache entry of the URL, or None
         :return: a dict
         """
-        response = await session.request(method="GET", url=url)
-        ability_json_dict = await response.json()
-        return ability_json_dict
+        endpoint = self.endpoint_of(url)
+        headers = self.conditional_headers(entry[2]) if entry else None
+        start = time.perf_counter()
+        body, response_headers = await self.scheduler.fetch(
+            session or self.open_session(), url, headers, endpoint)
+        downloaded = time.perf_counter()
+        if body is None:
+            self.metrics.observe('revalidate', endpoint, downloaded - start)
+            self.cache.refresh(url)
+            return entry[0]
+        try:
+            json_dict = self.decode(url, body)
+        except ValueError:
+            raise PokeAPIError(url, message="Response is not valid json")
+        self.metrics.observe('decode', endpoint,
+                             time.perf_counter() - downloaded,
+                             size=len(body))
+        self.learn_aliases(url, json_dict)
+        if self.cache:
+            self.cache.set(url, body, json_dict,
+                           self.validators_of(response_headers))
+        return json_dict
+
+    async def revalidate_data(self, url: str, validators: tuple = None):
+        """
+        Downloads and decodes the data of a URL, bypassing the cache, unless
+        the server answers that it has not been modified since the response
+        the validators were taken from
+        :param url: a String
+        :param validators: a tuple of the ETag and Last-Modified headers of
+        an earlier response, or None to download the data as is
+        :return: a tuple of the dict, or None if it was not modified, and
+        the validators of the response
+        """
+        endpoint = self.endpoint_of(url)
+        start = time.perf_counter()
+        async with self:
+            body, headers = await self.scheduler.fetch(
+                self.open_session(), url,
+                self.conditional_headers(validators), endpoint)
+        downloaded = time.perf_counter()
+        if body is None:
+            self.metrics.observe('revalidate', endpoint, downloaded - start)
+            return None, self.validators_of(headers) or validators
+        try:
+            data = self.decode(url, body)
+        except ValueError:
+            raise PokeAPIError(url, message="Response is not valid json")
+        self.learn_aliases(url, data)
+        return data, self.validators_of(headers)
+
+    async def get_data_with_validators(self, url: str) -> tuple:
+        """
+        Retrieves the data of a URL with the validators it can be
+        revalidated with later, from the cache when a fresh response is
+        available or else downloading it
+        :param url: a String
+        :return: a tuple of the dict and the validators of the response
+        """
+        if self.cache:
+            entry = self.cache.lookup(self.normalize_url(url))
+            if entry is not None and self.cache.is_fresh(entry[1]):
+                self.metrics.observe('cache_hit', self.endpoint_of(url))
+                return entry[0], entry[2]
+        return await self.revalidate_data(url)
+
+    async def get_data_or_error(self, url: str):
+        """
+        Retrieves data from a specified API endpoint URL, returning the
+        error instead of raising it if the request fails
+        :param url: a String
+        :return: a dict or a PokeAPIError
+        """
+        try:
+            return await self.get_data(url)
+        except PokeAPIError as e:
+            return e
 
     async def process_multiple_url(self, urls: list) -> list:
         """
-        Retrieves datum from a list of API endpoint URLs
+        Retrieves datum from a list of API endpoint URLs. A failed request
+        results in a PokeAPIError in place of its data.
         :param urls: a list
         :return: a list
         """
-        async with aiohttp.ClientSession() as session:
-            async_coroutines = [self.get_data(url, session) for url in urls]
+        async with self:
+            async_coroutines = [self.get_data_or_error(url) for url in urls]
             responses = await asyncio.gather(*async_coroutines)
             return responses
 
+    async def process_unique_requests(self, url: str, requests: list) -> tuple:
+        """
+        Retrieves the datum of a list of IDs or names, retrieving a resource
+        requested more than once, by name or by ID, only once. Resources
+        requested by ID are retrieved first so the names of the ones
+        requested both ways resolve to their IDs. A failed request results
+        in a PokeAPIError in place of its data.
+        :param url: a String of the URL of the endpoint with a {} for the
+        ID or name
+        :param requests: a list
+        :return: a tuple of the list of the positions of the data of each
+        request and the list of the data of each resource
+        """
+        urls = [self.canonical_url(url.format(request))
+                for request in requests]
+        id_urls = list(OrderedDict.fromkeys(
+            url for url in urls
+            if url.rstrip('/').rpartition('/')[2].isdigit()))
+        retrieved = OrderedDict(zip(id_urls,
+                                    await self.process_multiple_url(id_urls)))
+        urls = [url if url in retrieved else self.canonical_url(url)
+                for url in urls]
+        name_urls = list(OrderedDict.fromkeys(
+            url for url in urls if url not in retrieved))
+        retrieved.update(zip(name_urls,
+                             await self.process_multiple_url(name_urls)))
+        positions = {url: position for position, url in enumerate(retrieved)}
+        return [positions[url] for url in urls], list(retrieved.values())
+
+    async def process_single_url(self, url: str) -> dict:
+        """
+        Retrieves data from a single API endpoint URL
+        :param url: a String
+        :return: a dict
+        """
+        async with self:
+            return await self.get_data(url)
+
+    async def process_list_request(self, endpoint: str,
+                                   page_size: int = DEFAULT_PAGE_SIZE,
+                                   cached: bool = True) -> list:
+        """
+        Retrieves the names and URLs of every resource of an endpoint by
+        paging through its list
+        :param endpoint: a String
+        :param page_size: an int
+        :param cached: a bool, False to download every page
+        :return: a list of dicts
+        """
+        url = self.list_url.format(endpoint, page_size, 0)
+        resources = []
+        async with self:
+            while url:
+                if cached:
+                    page = await self.get_data(url)
+                else:
+                    page, _ = await self.revalidate_data(url)
+                resources.extend(page["results"])
+                url = page["next"]
+        return resources
+
     async def process_ability_requests(self, requests: list) -> list:
         """
         Retrieves a list of json dicts containing information for Abilities
         :param requests: a list
         :return:a list
         """
-        async with aiohttp.ClientSession() as session:
-            async_coroutines = [self.get_data(self.ability_url.format(id_),
-                                              session) for id_ in requests]
-            responses = await asyncio.gather(*async_coroutines)
-            return responses
+        return await self.process_multiple_url(
+            [self.ability_url.format(id_) for id_ in requests])
 
     async def process_ability_request(self, id_) -> dict:
         """
@@ -357,10 +4470,7 @@ class PokeAPICaller:
         :param id_: a String
         :return: a dict
         """
-        async with aiohttp.ClientSession() as session:
-            response = await self.get_data(self.ability_url.format(id_),
-                                           session)
-            return response
+        return await self.process_single_url(self.ability_url.format(id_))
 
     async def process_move_requests(self, requests: list) -> list:
         """
@@ -368,11 +4478,8 @@ class PokeAPICaller:
         :param requests: a list
         :return: a list
         """
-        async with aiohttp.ClientSession() as session:
-            async_coroutines = [self.get_data(self.move_url.format(id_),
-                                              session) for id_ in requests]
-            responses = await asyncio.gather(*async_coroutines)
-            return responses
+        return await self.process_multiple_url(
+            [self.move_url.format(id_) for id_ in requests])
 
     async def process_move_request(self, id_) -> dict:
         """
@@ -380,9 +4487,7 @@ class PokeAPICaller:
         :param id_: a String
         :return: a dict
         """
-        async with aiohttp.ClientSession() as session:
-            response = await self.get_data(self.move_url.format(id_), session)
-            return response
+        return await self.process_single_url(self.move_url.format(id_))
 
     async def process_pokemon_requests(self, requests: list) -> list:
         """
@@ -390,22 +4495,60 @@ class PokeAPICaller:
         :param requests: a list
         :return: a list
         """
-        async with aiohttp.ClientSession() as session:
-            async_coroutines = [self.get_data(self.pokemon_url.format(id_),
-                                              session) for id_ in requests]
-            responses = await asyncio.gather(*async_coroutines)
-            return responses
+        return await self.process_multiple_url(
+            [self.pokemon_url.format(id_) for id_ in requests])
 
     async def process_pokemon_request(self, id_) -> dict:
-        async with aiohttp.ClientSession() as session:
-            response = await self.get_data(self.pokemon_url.format(id_),
-                                           session)
-            return response
+        """
+        Retrieves a json dict containing information for a Pokemon
+        :param id_: a String
+        :return: a dict
+        """
+        return await self.process_single_url(self.pokemon_url.format(id_))
 
 
 class DataHandler:
     """This class is responsible for using json dict to create PokeData"""
 
+    detail_keys = {'stats': 'stat', 'abilities': 'ability', 'moves': 'move'}
+
+    def __init__(self, api_caller: PokeAPICaller = None):
+        self.api_caller = api_caller
+        self.metrics = NullMetrics()
+        self.detail_lookup = {}
+        self.stat_names = NameTable()
+        self.move_names = NameTable()
+        self.expanded_references = 0
+        self.expanded_resolved = 0
+        self.detail_creators = {'stats': self.create_stat,
+                                'abilities': self.create_ability,
+                                'moves': self.create_move}
+
+    def create_datum(self, create, datum: list) -> list:
+        """
+        Creates a list of PokeData with a list of json dicts, passing on
+        the PokeAPIErrors of failed requests in their place
+        :param create: a function creating a PokeData from a json dict
+        :param datum: a list
+        :return: a list
+        """
+        with self.metrics.timer('create', create.__name__, len(datum)):
+            return [data if isinstance(data, PokeAPIError) else create(data)
+                    for data in datum]
+
+    @staticmethod
+    def effect_entry(effect_entries: list) -> dict:
+        """
+        Selects the English entry of a list of effect entries, or the first
+        one if none is in English, so every path to a PokeData renders the
+        same effect
+        :param effect_entries: a list of dicts
+        :return: a dict
+        """
+        return next((entry for entry in effect_entries
+                     if entry["language"]["name"] == "en"),
+                    effect_entries[0])
+
     @staticmethod
     def create_ability(ability_data: dict) -> Ability:
         """
@@ -416,8 +4559,9 @@ class DataHandler:
         name = ability_data["name"]
         id_ = ability_data["id"]
         generation = ability_data["generation"]["name"]
-        effect = ability_data["effect_entries"][0]["effect"]
-        effect_short = ability_data["effect_entries"][0]["short_effect"]
+        effect_entry = DataHandler.effect_entry(ability_data["effect_entries"])
+        effect = effect_entry["effect"]
+        effect_short = effect_entry["short_effect"]
         pokemon = [pokemon["pokemon"]["name"] for pokemon
                    in ability_data["pokemon"]]
         return Ability(name, id_, generation, effect, effect_short, pokemon)
@@ -428,8 +4572,7 @@ class DataHandler:
         :param ability_datum: a list
         :return: a list
         """
-        ability_list = [self.create_ability(ability_data) for ability_data
-                        in ability_datum]
+        ability_list = self.create_datum(self.create_ability, ability_datum)
         return ability_list
 
     @staticmethod
@@ -447,8 +4590,9 @@ class DataHandler:
         pp = move_data["pp"]
         type_ = move_data["type"]["name"]
         damage_class = move_data["damage_class"]["name"]
-        effect_short = move_data["effect_entries"][0]["short_effect"]
-        return Moves(name, id_, generation, accuracy, power, pp, type_,
+        effect_short = DataHandler.effect_entry(
+            move_data["effect_entries"])["short_effect"]
+        return Moves(name, id_, generation, accuracy, pp, power, type_,
                      damage_class, effect_short)
 
     def create_moves(self, move_datum: list) -> list:
@@ -457,14 +4601,13 @@ class DataHandler:
         :param move_datum: a list
         :return: a list
         """
-        move_list = [self.create_move(move_data) for move_data
-                     in move_datum]
+        move_list = self.create_datum(self.create_move, move_datum)
         return move_list
 
-    @staticmethod
-    def create_pokemon(pokemon_data: dict):
+    def create_pokemon(self, pokemon_data: dict):
         """
-        Creates a Pokemon with a json dict for a Pokemon
+        Creates a Pokemon with a json dict for a Pokemon, sharing the name
+        tables of its stats and moves with the other Pokemon it created
         :param pokemon_data: a dict
         :return: a Pokemon
         """
@@ -481,7 +4624,7 @@ class DataHandler:
                   move["version_group_details"][0]["level_learned_at"])
                  for move in pokemon_data["moves"]]
         return Pokemon(name, id_, height, weight, stats, types, abilities,
-                       moves)
+                       moves, self.stat_names, self.move_names)
 
     def create_pokemons(self, pokemon_datum: list) -> list:
         """
@@ -489,8 +4632,7 @@ class DataHandler:
         :param pokemon_datum: a list
         :return: a list
         """
-        pokemon_list = [self.create_pokemon(pokemon_data) for pokemon_data
-                        in pokemon_datum]
+        pokemon_list = self.create_datum(self.create_pokemon, pokemon_datum)
         return pokemon_list
 
     @staticmethod
@@ -511,46 +4653,300 @@ class DataHandler:
         :param stat_datum: a list
         :return: a list
         """
-        stat_list = [self.create_stat(stat_data) for stat_data
-                     in stat_datum]
+        stat_list = self.create_datum(self.create_stat, stat_datum)
         return stat_list
 
-    def create_pokemon_expanded(self, pokemon_data: dict):
+    @staticmethod
+    def build_pokemon_expanded(pokemon_data: dict, lookup: dict):
         """
         Creates a Pokemon with expanded details with a json dict for Pokemon
+        and a table of the PokeData its details refer to by URL
         :param pokemon_data: a dict
-        :return: a Pokemon
+        :param lookup: a dict of URLs to PokeData or PokeAPIError
+        :return: a Pokemon, or a PokeAPIError if any of its details could
+        not be retrieved
         """
-        poke_request = PokeAPICaller()
+        if isinstance(pokemon_data, PokeAPIError):
+            return pokemon_data
         name = pokemon_data["name"]
         id_ = pokemon_data["id"]
         height = pokemon_data["height"]
         weight = pokemon_data["weight"]
-        stats = [stat["stat"]["url"] for stat in pokemon_data["stats"]]
-        stats = asyncio.run(poke_request.process_multiple_url(stats))
-        stats = self.create_stats(stats)
         types = [type_["type"]["name"] for type_ in pokemon_data["types"]]
-        abilities = [ability["ability"]["url"] for ability in
-                     pokemon_data["abilities"]]
-        abilities = asyncio.run(poke_request.process_multiple_url(abilities))
-        abilities = self.create_abilities(abilities)
-        moves = [move["move"]["url"] for move in pokemon_data["moves"]]
-        moves = asyncio.run(poke_request.process_multiple_url(moves))
-        moves = self.create_moves(moves)
+        stats = [lookup[stat["stat"]["url"]] for stat
+                 in pokemon_data["stats"]]
+        abilities = [lookup[ability["ability"]["url"]] for ability
+                     in pokemon_data["abilities"]]
+        moves = [lookup[move["move"]["url"]] for move
+                 in pokemon_data["moves"]]
+        for data in stats + abilities + moves:
+            if isinstance(data, PokeAPIError):
+                return data
         return Pokemon(name, id_, height, weight, stats, types, abilities,
                        moves)
 
-    def create_pokemons_expanded(self, pokemon_datum: list) -> list:
+    async def create_pokemon_expanded(self, pokemon_data: dict):
+        """
+        Creates a Pokemon with expanded details with a json dict for Pokemon
+        :param pokemon_data: a dict
+        :return: a Pokemon, or a PokeAPIError if any of its details could
+        not be retrieved
+        """
+        pokemon_list = await self.create_pokemons_expanded([pokemon_data])
+        return pokemon_list[0]
+
+    async def fetch_details(self, detail_urls: dict) -> dict:
+        """
+        Retrieves and creates the PokeData of the stats, abilities and moves
+        at the given URLs, adding them to the details shared between
+        Pokemon. URLs already in the shared details are not fetched again.
+        :param detail_urls: a dict of the attributes of a Pokemon to the
+        URLs of its details
+        :return: a dict of the URLs that failed to their PokeAPIError
+        """
+        poke_request = self.api_caller or PokeAPICaller()
+        detail_urls = {attribute: [url for url in dict.fromkeys(urls)
+                                   if url not in self.detail_lookup]
+                       for attribute, urls in detail_urls.items()}
+        async with poke_request:
+            detail_datum = await asyncio.gather(
+                *[poke_request.process_multiple_url(urls)
+                  for urls in detail_urls.values()])
+        failed = {}
+        for (attribute, urls), datum in zip(detail_urls.items(),
+                                            detail_datum):
+            create = self.detail_creators[attribute]
+            for url, data in zip(urls, self.create_datum(create, datum)):
+                if isinstance(data, PokeAPIError):
+                    failed[url] = data
+                else:
+                    self.detail_lookup[url] = data
+                self.expanded_resolved += 1
+        return failed
+
+    async def create_pokemons_expanded(self, pokemon_datum: list) -> list:
         """
         Creates a list of Pokemon with expanded details with a list of
-        json dict for Pokemon
-        :param pokemon_datum:
-        :return:
+        json dict for Pokemon. The stats, abilities and moves referenced by
+        the whole batch are retrieved once each and identical details are
+        shared between the Pokemon, including those of earlier batches.
+        :param pokemon_datum: a list
+        :return: a list
         """
-        pokemon_list = [self.create_pokemon_expanded(pokemon_data) for
-                        pokemon_data in pokemon_datum]
+        detail_urls = {attribute: [] for attribute in self.detail_keys}
+        for pokemon_data in pokemon_datum:
+            if isinstance(pokemon_data, PokeAPIError):
+                continue
+            for attribute, key in self.detail_keys.items():
+                detail_urls[attribute].extend(
+                    detail[key]["url"] for detail in pokemon_data[attribute])
+        self.expanded_references += sum(map(len, detail_urls.values()))
+        failed = await self.fetch_details(detail_urls)
+        lookup = ChainMap(failed, self.detail_lookup)
+        with self.metrics.timer('create', 'build_pokemon_expanded',
+                                len(pokemon_datum)):
+            pokemon_list = [self.build_pokemon_expanded(pokemon_data, lookup)
+                            for pokemon_data in pokemon_datum]
         return pokemon_list
 
+    async def fetch_detail_payloads(self, pokemon_datum: list) -> dict:
+        """
+        Retrieves the json dicts of the stats, abilities and moves
+        referenced by a list of json dicts for Pokemon without creating
+        their PokeData, so they can be created in other processes
+        :param pokemon_datum: a list
+        :return: a dict of the attributes of a Pokemon to dicts of URLs to
+        json dicts or PokeAPIErrors
+        """
+        poke_request = self.api_caller or PokeAPICaller()
+        detail_urls = {attribute: {} for attribute in self.detail_keys}
+        for pokemon_data in pokemon_datum:
+            if isinstance(pokemon_data, PokeAPIError):
+                continue
+            for attribute, key in self.detail_keys.items():
+                for detail in pokemon_data[attribute]:
+                    detail_urls[attribute][detail[key]["url"]] = None
+                self.expanded_references += len(pokemon_data[attribute])
+        async with poke_request:
+            detail_datum = await asyncio.gather(
+                *[poke_request.process_multiple_url(list(urls))
+                  for urls in detail_urls.values()])
+        self.expanded_resolved += sum(map(len, detail_urls.values()))
+        return {attribute: dict(zip(urls, datum))
+                for (attribute, urls), datum in zip(detail_urls.items(),
+                                                    detail_datum)}
+
+    def create_pokemon_lazy(self, pokemon_data: dict):
+        """
+        Creates a Pokemon whose stats, abilities and moves are LazyDetails,
+        retrieved through this DataHandler only when they are first used
+        or prefetched
+        :param pokemon_data: a dict
+        :return: a Pokemon
+        """
+        name = pokemon_data["name"]
+        id_ = pokemon_data["id"]
+        height = pokemon_data["height"]
+        weight = pokemon_data["weight"]
+        types = [type_["type"]["name"] for type_ in pokemon_data["types"]]
+        stats, abilities, moves = (
+            LazyDetails(self, attribute,
+                        [detail[key] for detail in pokemon_data[attribute]])
+            for attribute, key in self.detail_keys.items())
+        return Pokemon(name, id_, height, weight, stats, types, abilities,
+                       moves)
+
+    def create_pokemons_lazy(self, pokemon_datum: list) -> list:
+        """
+        Creates a list of Pokemon with lazy details with a list of json
+        dict for Pokemon
+        :param pokemon_datum: a list
+        :return: a list
+        """
+        return self.create_datum(self.create_pokemon_lazy, pokemon_datum)
+
+    async def prefetch(self, lazy_details: list):
+        """
+        Resolves a list of LazyDetails, of one or many Pokemon, with a
+        single batch of requests. LazyDetails whose details could not all
+        be retrieved keep their PokeAPIError and stay unresolved.
+        :param lazy_details: a list of LazyDetails
+        """
+        lazy_details = [details for details in lazy_details
+                        if not details.resolved]
+        detail_urls = {attribute: [] for attribute in self.detail_keys}
+        for details in lazy_details:
+            detail_urls[details.attribute].extend(details.urls)
+        self.expanded_references += sum(map(len, detail_urls.values()))
+        failed = await self.fetch_details(detail_urls)
+        lookup = ChainMap(failed, self.detail_lookup)
+        for details in lazy_details:
+            details.set_items([lookup[url] for url in details.urls])
+
+    def resolve(self, lazy_details: list):
+        """
+        Resolves a list of LazyDetails with a single batch of requests
+        from synchronous code
+        :param lazy_details: a list of LazyDetails
+        :raises PokeAPIError: if a detail could not be retrieved
+        :raises RuntimeError: if it is called from a running event loop, in
+        which case prefetch() must be awaited instead
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            detached = self.api_caller.detached_session() \
+                if self.api_caller else nullcontext()
+            with detached:
+                asyncio.run(self.prefetch(lazy_details))
+        else:
+            raise RuntimeError("Lazy details cannot be retrieved while an "
+                               "event loop is running, await prefetch() "
+                               "first")
+        for details in lazy_details:
+            if details.error:
+                raise details.error
+
+
+class ProcessRenderer:
+    """Shards json data across a pool of worker processes which create and
+    render its PokeData, while the PokeAPI is called from the event loop of
+    the main process. Rendered chunks are returned in input order."""
+
+    def __init__(self, workers: int, mode: str, serializer_class,
+                 chunk_size: int = DEFAULT_WORKER_CHUNK):
+        self.workers = workers
+        self.mode = mode
+        self.serializer_class = serializer_class
+        self.chunk_size = chunk_size
+        self.pool = futures_process.ProcessPoolExecutor(workers)
+
+    def chunks(self, poke_data: list, details: dict = None) -> list:
+        """
+        Splits json data into chunks small enough to keep every worker busy,
+        each with the details of expanded Pokemon it refers to
+        :param poke_data: a list of json dicts or PokeAPIErrors
+        :param details: a dict of the attributes of a Pokemon to dicts of
+        URLs to json dicts, or None if the Pokemon are not expanded
+        :return: a list of (json data, details) tuples
+        """
+        size = max(1, min(self.chunk_size,
+                          -(-len(poke_data) // (self.workers * 4))))
+        chunks = []
+        for start in range(0, len(poke_data), size):
+            payloads = poke_data[start:start + size]
+            chunk_details = None
+            if details is not None:
+                chunk_details = {attribute: {} for attribute in details}
+                for pokemon_data in payloads:
+                    if isinstance(pokemon_data, PokeAPIError):
+                        continue
+                    for attribute, key in DataHandler.detail_keys.items():
+                        for detail in pokemon_data[attribute]:
+                            url = detail[key]["url"]
+                            chunk_details[attribute][url] = \
+                                details[attribute][url]
+            chunks.append((payloads, chunk_details))
+        return chunks
+
+    async def render(self, poke_data: list, details: dict = None):
+        """
+        Renders json data in the worker processes
+        :param poke_data: a list of json dicts or PokeAPIErrors
+        :param details: a dict of the attributes of a Pokemon to dicts of
+        URLs to json dicts, or None if the Pokemon are not expanded
+        :return: an async iterator of chunks rendered by the Serializer
+        """
+        loop = asyncio.get_running_loop()
+        futures = [loop.run_in_executor(self.pool, self.render_chunk,
+                                        self.mode, self.serializer_class,
+                                        payloads, chunk_details)
+                   for payloads, chunk_details
+                   in self.chunks(poke_data, details)]
+        try:
+            for future in futures:
+                yield await future
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def render_chunk(mode: str, serializer_class, poke_data: list,
+                     details: dict = None):
+        """
+        Creates and renders the PokeData of a chunk of json data, in a
+        worker process
+        :param mode: a String
+        :param serializer_class: the class of Serializer rendering it
+        :param poke_data: a list of json dicts or PokeAPIErrors
+        :param details: a dict of the attributes of a Pokemon to dicts of
+        URLs to json dicts, or None if the Pokemon are not expanded
+        :return: the chunk rendered by the Serializer
+        """
+        data_handler = DataHandler()
+        if details is not None:
+            lookup = {}
+            for attribute, detail_datum in details.items():
+                create = data_handler.detail_creators[attribute]
+                lookup.update(zip(detail_datum, data_handler.create_datum(
+                    create, list(detail_datum.values()))))
+            datum = [data_handler.build_pokemon_expanded(pokemon_data, lookup)
+                     for pokemon_data in poke_data]
+        else:
+            poke_data_map = {
+                'pokemon': data_handler.create_pokemons,
+                'ability': data_handler.create_abilities,
+                'move': data_handler.create_moves
+            }
+            datum = poke_data_map[mode](poke_data)
+        return serializer_class.render(datum)
+
+    def close(self):
+        """
+        Shuts the pool of worker processes down
+        """
+        self.pool.shutdown(cancel_futures=True)
+
 
 def main(request_: PokeRequest):
     pokedex = PokeDex()
@@ -558,6 +4954,13 @@ def main(request_: PokeRequest):
     pokedex.start_pokedex()
 
 
+def run():
+    """
+    Runs the PokeDex with the arguments of the command line, the entry
+    point of the pokedex console script
+    """
+    main(setup_request_commandline())
+
+
 if __name__ == '__main__':
-    request = setup_request_commandline()
-    main(request)
+    run()
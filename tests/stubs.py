@@ -0,0 +1,18 @@
+"""Stub PokeAPIs shared by the tests."""
+
+from benchmark import (StubServer, make_ability, make_move, make_pokemon,
+                       make_stat, make_type)
+
+COUNTS = {'pokemon': 12, 'ability': 5, 'move': 9, 'stat': 6, 'type': 18}
+
+
+class SmallStubServer(StubServer):
+    """A stub PokeAPI with a few resources of each endpoint"""
+
+    makers = {
+        'pokemon': (make_pokemon, COUNTS['pokemon']),
+        'ability': (make_ability, COUNTS['ability']),
+        'move': (make_move, COUNTS['move']),
+        'stat': (make_stat, COUNTS['stat']),
+        'type': (make_type, COUNTS['type'])
+    }
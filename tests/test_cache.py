@@ -0,0 +1,169 @@
+"""Tests of the ResponseCache and of cache revalidation against the stub
+PokeAPI of the benchmarks."""
+
+import asyncio
+import os.path
+import tempfile
+import time
+import unittest
+
+import pokedex
+from benchmark import StubServer, run_pokedex
+
+URL = "https://pokeapi.co/api/v2/pokemon/1/"
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expires_entries_after_the_ttl(self):
+        cache = pokedex.ResponseCache(ttl=60)
+        self.assertTrue(cache.is_fresh(time.time() - 59))
+        self.assertFalse(cache.is_fresh(time.time() - 61))
+        self.assertTrue(pokedex.ResponseCache(ttl=None).is_fresh(0))
+
+    def test_looks_up_expired_entries_with_their_validators(self):
+        cache = pokedex.ResponseCache(ttl=0)
+        cache.set(URL, b'{"id": 1}', {"id": 1}, ('"etag"', None))
+        self.assertIsNone(cache.get(URL))
+        data, _, validators = cache.lookup(URL)
+        self.assertEqual((data, validators), ({"id": 1}, ('"etag"', None)))
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_refresh_makes_an_entry_fresh_again(self):
+        cache = pokedex.ResponseCache(ttl=60)
+        cache.set(URL, b'{"id": 1}', {"id": 1})
+        cache.memory.touch(URL, time.time() - 120)
+        self.assertIsNone(cache.get(URL))
+        cache.refresh(URL)
+        self.assertEqual(cache.get(URL), {"id": 1})
+        self.assertEqual(cache.revalidated, 1)
+
+    def test_persists_entries_on_disk(self):
+        cache = pokedex.ResponseCache(self.directory.name, ttl=60)
+        cache.set(URL, b'{"id": 1}', {"id": 1}, ('"etag"', None))
+        cache.close()
+        cache = pokedex.ResponseCache(self.directory.name, ttl=60)
+        try:
+            self.assertEqual(cache.get(URL), {"id": 1})
+            self.assertEqual(cache.lookup(URL)[2], ('"etag"', None))
+        finally:
+            cache.close()
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = pokedex.DiskCache(self.directory.name, max_size=3,
+                                       flush_size=2)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def count(self):
+        return self.cache.connect().execute(
+            "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def test_reads_writes_before_they_are_committed(self):
+        self.cache.set(URL, b'{"id": 1}', 1.0, ('"etag"', None))
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.cache.get(URL),
+                         (b'{"id": 1}', 1.0, ('"etag"', None)))
+
+    def test_commits_writes_in_batches(self):
+        for id_ in range(1, 4):
+            self.cache.set(f"{URL}{id_}/", b'{}', 1.0)
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(len(self.cache.pending), 1)
+
+    def test_commits_from_a_running_loop_in_the_writer_thread(self):
+        async def write():
+            self.cache.set(f"{URL}1/", b'{"id": 1}', 1.0)
+            self.cache.set(f"{URL}2/", b'{"id": 2}', 1.0)
+            self.assertEqual(len(self.cache.writing), 1)
+            self.assertEqual(self.cache.get(f"{URL}2/")[0], b'{"id": 2}')
+            while self.cache.writing:
+                await asyncio.sleep(0.01)
+        asyncio.run(write())
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.cache.get(f"{URL}2/")[0], b'{"id": 2}')
+
+    def test_evicts_the_least_recently_used_entries(self):
+        for id_ in range(1, 5):
+            self.cache.set(f"{URL}{id_}/", b'{}', float(id_))
+        self.cache.close()
+        self.assertEqual(self.count(), 3)
+        self.assertIsNone(self.cache.get(f"{URL}1/"))
+
+    def test_reads_uncompressed_bodies(self):
+        self.cache.set(URL, b'{}', 1.0)
+        self.cache.close()
+        connection = self.cache.connect()
+        connection.execute("UPDATE responses SET body = ?", ('{"id": 1}',))
+        connection.commit()
+        self.assertEqual(self.cache.get(URL)[0], '{"id": 1}')
+
+
+class RevalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        self.output = os.path.join(self.directory.name, "output.txt")
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def run_mode(self, cache_ttl: int) -> int:
+        requests = self.server.requests
+        run_pokedex(pokedex, self.server.api_url, 'pokemon', "3",
+                    self.output, expanded=True, cache_dir=self.cache_dir,
+                    cache_ttl=cache_ttl)
+        return self.server.requests - requests
+
+    def test_serves_fresh_responses_from_the_cache(self):
+        self.assertGreater(self.run_mode(3600), 0)
+        self.assertEqual(self.run_mode(3600), 0)
+
+    def test_revalidates_expired_responses(self):
+        downloaded = self.run_mode(3600)
+        with open(self.output, encoding='utf-8') as output_file:
+            report = output_file.read()
+        not_modified = self.server.not_modified
+        self.assertEqual(self.run_mode(0), downloaded)
+        self.assertEqual(self.server.not_modified - not_modified, downloaded)
+        with open(self.output, encoding='utf-8') as output_file:
+            self.assertEqual(output_file.read(), report)
+
+    def test_serves_stale_responses_while_revalidating(self):
+        caller = pokedex.PokeAPICaller(cache=pokedex.ResponseCache(ttl=0),
+                                       api_url=self.server.api_url)
+        caller.stale_while_revalidate = True
+        url = caller.pokemon_url.format(1)
+
+        async def get_twice():
+            async with caller:
+                first = await caller.get_data(url)
+                stale = await caller.get_data(url)
+                await asyncio.gather(*caller.refreshing)
+                return first, stale
+
+        first, stale = asyncio.run(get_twice())
+        self.assertEqual(stale, first)
+        self.assertEqual(caller.cache.served_stale, 1)
+        self.assertEqual(caller.cache.revalidated, 1)
+        self.assertEqual(self.server.not_modified, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Tests of the PokeDexClient library interface against the stub PokeAPI
+of the benchmarks."""
+
+import asyncio
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from tests.stubs import SmallStubServer
+
+
+class PokeDexClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SmallStubServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fetch(self, client, ids):
+        async def fetch():
+            async with client:
+                return await client.fetch_pokemon(ids)
+        return asyncio.run(fetch())
+
+    def test_caches_responses_in_memory_by_default(self):
+        client = pokedex.PokeDexClient(api_url=self.server.api_url)
+        self.assertIsNone(client.api_caller.cache.disk)
+        pokemon = self.fetch(client, "1-3,1")
+        self.assertEqual([data.id_ for data in pokemon], [1, 2, 3, 1])
+        self.fetch(client, "1-3")
+        self.assertEqual(self.server.requests, 3)
+
+    def test_keeps_a_persistent_cache_in_a_given_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            client = pokedex.PokeDexClient(api_url=self.server.api_url,
+                                           cache_dir=directory)
+            self.fetch(client, [1, 2])
+            self.assertTrue(os.path.isfile(
+                os.path.join(directory, "responses.sqlite3")))
+            client = pokedex.PokeDexClient(api_url=self.server.api_url,
+                                           cache_dir=directory)
+            self.fetch(client, [1, 2])
+        self.assertEqual(self.server.requests, 2)
+
+    def test_rejects_unknown_options(self):
+        with self.assertRaises(TypeError):
+            pokedex.PokeDexClient(cache_directory="cache")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+"""Tests of in-flight request coalescing against the stub PokeAPI of the
+benchmarks."""
+
+import asyncio
+import unittest
+
+import pokedex
+from tests.stubs import SmallStubServer
+
+
+class CoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SmallStubServer()
+        self.server.start()
+        self.caller = pokedex.PokeAPICaller(api_url=self.server.api_url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_coalesces_concurrent_requests_for_a_url(self):
+        urls = [self.caller.pokemon_url.format(key)
+                for key in ("4", "4/", "4", "5")]
+        datum = asyncio.run(self.caller.process_multiple_url(urls))
+        self.assertEqual([data["id"] for data in datum], [4, 4, 4, 5])
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.caller.coalesced, 2)
+        self.assertEqual(self.caller.in_flight, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
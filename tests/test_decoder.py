@@ -0,0 +1,96 @@
+"""Tests of the decoding and projection of PokeAPI responses over
+generated payloads."""
+
+import contextlib
+import io
+import json
+import unittest
+from unittest import mock
+
+import pokedex
+from benchmark import API_URL, make_ability, make_move, make_pokemon
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.caller = pokedex.PokeAPICaller(api_url=API_URL)
+
+    def test_drops_the_fields_a_pokemon_does_not_use(self):
+        payload = make_pokemon(12)
+        pokemon = self.caller.decode(self.caller.pokemon_url.format(12),
+                                     json.dumps(payload))
+        self.assertEqual(set(pokemon),
+                         set(pokedex.FIELD_PROJECTIONS['pokemon']))
+        self.assertNotIn('base_experience', pokemon)
+        self.assertEqual(pokemon['stats'][0],
+                         {'base_stat': payload['stats'][0]['base_stat'],
+                          'stat': payload['stats'][0]['stat']})
+        self.assertEqual([type_['type'] for type_ in pokemon['types']],
+                         [type_['type'] for type_ in payload['types']])
+        for move, original in zip(pokemon['moves'], payload['moves']):
+            self.assertEqual(move, {
+                'move': original['move'],
+                'version_group_details': [{
+                    'level_learned_at': original['version_group_details'][0][
+                        'level_learned_at']}]})
+
+    def test_keeps_other_resources_and_lists_whole(self):
+        move = make_move(3)
+        self.assertEqual(self.caller.decode(self.caller.move_url.format(3),
+                                            json.dumps(move)), move)
+        listing = {"count": 1, "next": None, "results": [
+            {"name": "pokemon-1", "url": "u", "extra": 1}]}
+        url = self.caller.list_url.format('pokemon', 1, 0)
+        self.assertEqual(self.caller.decode(url, json.dumps(listing)),
+                         listing)
+
+
+class DecoderTest(unittest.TestCase):
+
+    def create_pokedex(self, decoder):
+        request = pokedex.PokeRequest()
+        request.use_cache = False
+        request.decoder = decoder
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        return pokedex_
+
+    def test_falls_back_to_json_without_orjson(self):
+        stderr = io.StringIO()
+        with mock.patch.object(pokedex, 'orjson', None), \
+                contextlib.redirect_stderr(stderr):
+            pokedex_ = self.create_pokedex('orjson')
+            auto = self.create_pokedex('auto')
+        self.assertIs(pokedex_.api_caller.loads, json.loads)
+        self.assertIs(auto.api_caller.loads, json.loads)
+        self.assertEqual(stderr.getvalue(),
+                         "orjson is not installed, using json instead.\n")
+
+    @unittest.skipIf(pokedex.orjson is None, "orjson is not installed")
+    def test_decoders_create_the_same_records(self):
+        payloads = [('pokemon', make_pokemon(id_)) for id_ in (1, 25)] + \
+            [('ability', make_ability(id_)) for id_ in (1, 7)] + \
+            [('move', make_move(id_)) for id_ in (1, 33)]
+        records = {}
+        for decoder in ('json', 'orjson'):
+            pokedex_ = self.create_pokedex(decoder)
+            caller, data_handler = pokedex_.api_caller, pokedex_.data_handler
+            creators = {'pokemon': data_handler.create_pokemon,
+                        'ability': data_handler.create_ability,
+                        'move': data_handler.create_move}
+            urls = {'pokemon': caller.pokemon_url,
+                    'ability': caller.ability_url, 'move': caller.move_url}
+            output = io.StringIO()
+            serializer = pokedex.JsonLinesSerializer(output)
+            for mode, payload in payloads:
+                body = json.dumps(payload).encode('utf-8')
+                serializer.write(creators[mode](caller.decode(
+                    urls[mode].format(payload['id']), body)))
+            records[decoder] = output.getvalue()
+        self.assertEqual(records['json'], records['orjson'])
+        self.assertEqual(len(records['json'].splitlines()), len(payloads))
+
+
+if __name__ == '__main__':
+    unittest.main()
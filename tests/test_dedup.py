@@ -0,0 +1,119 @@
+"""Tests of input specs, and of request deduplication against the stub
+PokeAPI of the benchmarks."""
+
+import asyncio
+import contextlib
+import io
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import StubServer, make_pokemon
+from tests.stubs import SmallStubServer
+
+
+class InputSpecTest(unittest.TestCase):
+
+    def test_expands_ranges_lists_and_names(self):
+        self.assertEqual(
+            list(pokedex.FileHandler.expand_spec("1-3, Pikachu,5-5,,all")),
+            ["1", "2", "3", "Pikachu", "5", "all"])
+
+    def test_rejects_reverse_ranges(self):
+        with self.assertRaises(pokedex.InputError):
+            list(pokedex.FileHandler.expand_spec("1,3-1"))
+
+    def test_reads_the_files_of_a_glob_in_path_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, lines in (("b.txt", "4\n\nmew\n"), ("a.txt", "1-3\n"),
+                                ("c.csv", "9\n")):
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write(lines)
+            params = list(pokedex.FileHandler.iter_input_spec(
+                os.path.join(directory, "*.txt")))
+            self.assertEqual(params, ["1", "2", "3", "4", "mew"])
+            with self.assertRaises(pokedex.InputError):
+                list(pokedex.FileHandler.iter_input_spec(
+                    os.path.join(directory, "*.json")))
+
+
+class DedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SmallStubServer()
+        self.server.start()
+        self.caller = pokedex.PokeAPICaller(api_url=self.server.api_url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_retrieves_a_resource_requested_twice_once(self):
+        positions, datum = asyncio.run(self.caller.process_unique_requests(
+            self.caller.pokemon_url, ["1", "Pokemon-1", "1/", "2", "1"]))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual([datum[position]["id"] for position in positions],
+                         [1, 1, 1, 2, 1])
+
+    def test_keeps_the_error_of_a_failed_resource_in_place(self):
+        positions, datum = asyncio.run(self.caller.process_unique_requests(
+            self.caller.pokemon_url, ["99", "2", "99"]))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(positions[0], positions[2])
+        self.assertIsInstance(datum[positions[0]], pokedex.PokeAPIError)
+        self.assertEqual(datum[positions[1]]["id"], 2)
+
+    def test_forgets_the_least_recently_used_aliases(self):
+        self.caller.alias_limit = 4
+        asyncio.run(self.caller.process_unique_requests(
+            self.caller.pokemon_url,
+            [f"pokemon-{id_}" for id_ in range(1, 7)]))
+        self.assertEqual(len(self.caller.aliases), 4)
+        self.assertEqual(
+            self.caller.normalize_url(self.caller.pokemon_url.format(
+                "Pokemon-6")), self.caller.pokemon_url.format(6))
+        url = self.caller.pokemon_url.format("pokemon-1")
+        self.assertEqual(self.caller.normalize_url(url), url)
+
+
+class ExpandedDedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def test_retrieves_a_detail_shared_by_pokemon_once(self):
+        references = [reference[key]["url"] for id_ in range(1, 11)
+                      for attribute, key in (('stats', 'stat'),
+                                             ('abilities', 'ability'),
+                                             ('moves', 'move'))
+                      for reference in make_pokemon(
+                          id_, self.server.api_url)[attribute]]
+        unique = set(references)
+        self.assertLess(len(unique), len(references))
+        request = pokedex.PokeRequest()
+        request.mode = 'pokemon'
+        request.input = "1-10"
+        request.expanded = True
+        request.use_cache = False
+        request.api_url = self.server.api_url
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(stderr):
+            pokedex_.start_pokedex()
+        detail_paths = {path: count for path, count
+                        in self.server.paths.items()
+                        if not path.startswith("/api/v2/pokemon/")}
+        self.assertEqual(len(detail_paths), len(unique))
+        self.assertEqual(set(detail_paths.values()), {1})
+        self.assertIn(f"Expanded: {len(unique)} unique details resolved for "
+                      f"{len(references)} references "
+                      f"({len(references) - len(unique)} lookups saved)",
+                      stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
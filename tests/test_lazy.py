@@ -0,0 +1,74 @@
+"""Tests of Pokemon with lazy details against the stub PokeAPI of the
+benchmarks."""
+
+import asyncio
+import unittest
+
+import pokedex
+from benchmark import StubServer, make_pokemon
+
+
+class LazyDetailsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer()
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def create_client(self):
+        return pokedex.PokeDexClient(use_cache=False, concurrency=1,
+                                     api_url=self.server.api_url)
+
+    def fetch_lazy(self, client, ids):
+        async def fetch():
+            async with client:
+                return await client.fetch_pokemon(ids, lazy=True)
+        return asyncio.run(fetch())
+
+    def test_prints_lazy_pokemon_one_after_another(self):
+        client = self.create_client()
+        for pokemon in self.fetch_lazy(client, [1, 2, 3, 4, 5]):
+            text = str(pokemon)
+            self.assertIn("Is Battle Only", text)
+            self.assertTrue(all(details.resolved for details in (
+                pokemon.stats, pokemon.abilities, pokemon.moves)))
+
+    def test_prints_lazy_pokemon_in_a_running_loop_by_name(self):
+        client = self.create_client()
+
+        async def render():
+            async with client:
+                pokemon, = await client.fetch_pokemon(6, lazy=True)
+                unresolved = str(pokemon)
+                await pokemon.prefetch()
+                return pokemon, unresolved, str(pokemon)
+
+        pokemon, unresolved, resolved = asyncio.run(render())
+        self.assertIn(pokemon.moves.names[0], unresolved)
+        self.assertNotIn("Is Battle Only", unresolved)
+        self.assertIn("Is Battle Only", resolved)
+
+    def test_keeps_the_session_of_the_caller(self):
+        client = self.create_client()
+        pokemon, = self.fetch_lazy(client, [7])
+        self.assertIsNone(client.api_caller.session)
+        str(pokemon)
+        self.assertIsNone(client.api_caller.session)
+        self.assertEqual(client.api_caller.session_users, 0)
+
+    def test_prints_lazy_pokemon_of_a_data_handler_without_a_caller(self):
+        data_handler = pokedex.DataHandler()
+        pokemon = data_handler.create_pokemon_lazy(
+            make_pokemon(8, self.server.api_url))
+        text = str(pokemon)
+        self.assertIn("Is Battle Only", text)
+        self.assertEqual([move.name for move in pokemon.moves],
+                         list(pokemon.moves.names))
+
+
+if __name__ == '__main__':
+    unittest.main()
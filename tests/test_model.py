@@ -0,0 +1,58 @@
+"""Tests of the compact PokeData model over generated PokeData."""
+
+import unittest
+
+import pokedex
+from benchmark import make_ability, make_move, make_pokemon
+
+
+class NamedValuesTest(unittest.TestCase):
+
+    def test_shares_the_ids_of_a_name_table(self):
+        table = pokedex.NameTable()
+        stats = pokedex.NamedValues(table, [("hp", 45), ("speed", 90)])
+        moves = pokedex.NamedValues(table, [("speed", 1), ("tackle", 0)])
+        self.assertEqual(table.names, ["hp", "speed", "tackle"])
+        self.assertEqual(list(moves.name_ids), [1, 2])
+        self.assertEqual(table.id_of("speed"), 1)
+        self.assertEqual(table.name_of(2), "tackle")
+        self.assertEqual(list(stats), [("hp", 45), ("speed", 90)])
+        self.assertEqual(stats[-1], ("speed", 90))
+        self.assertEqual(moves[::-1], [("tackle", 0), ("speed", 1)])
+        self.assertEqual(dict(stats), {"hp": 45, "speed": 90})
+
+    def test_holds_values_from_0_to_65535_only(self):
+        table = pokedex.NameTable()
+        bounds = pokedex.NamedValues(table, [("min", 0), ("max", 65535)])
+        self.assertEqual(list(bounds), [("min", 0), ("max", 65535)])
+        for value in (65536, -1):
+            with self.subTest(value=value), \
+                    self.assertRaises(OverflowError):
+                pokedex.NamedValues(table, [("out", value)])
+
+    def test_holds_65536_names_per_table(self):
+        table = pokedex.NameTable()
+        names = [(f"move-{id_}", 0) for id_ in range(65536)]
+        self.assertEqual(len(pokedex.NamedValues(table, names)), 65536)
+        with self.assertRaises(OverflowError):
+            pokedex.NamedValues(table, [("one-too-many", 0)])
+
+
+class SlotsTest(unittest.TestCase):
+
+    def test_poke_data_have_no_instance_dict(self):
+        data_handler = pokedex.DataHandler()
+        pokemon = data_handler.create_pokemon(make_pokemon(1))
+        for data in (pokemon, pokemon.stats, pokemon.moves,
+                     data_handler.create_ability(make_ability(1)),
+                     data_handler.create_move(make_move(1)),
+                     pokedex.Stats("hp", 1, False),
+                     data_handler.create_pokemon_lazy(make_pokemon(2)).moves):
+            with self.subTest(type(data).__name__):
+                self.assertFalse(hasattr(data, '__dict__'))
+                with self.assertRaises(AttributeError):
+                    data.nickname = "bulby"
+
+
+if __name__ == '__main__':
+    unittest.main()
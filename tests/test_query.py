@@ -0,0 +1,101 @@
+"""Tests of PokeQuery and PokeIndex over generated PokeData, and of query
+mode over a snapshot of the stub PokeAPI of the benchmarks."""
+
+import contextlib
+import io
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import make_ability, make_move, make_pokemon, run_pokedex
+from tests.stubs import SmallStubServer
+
+
+class PokeIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_handler = pokedex.DataHandler()
+        cls.pokemon = [data_handler.create_pokemon(make_pokemon(id_))
+                       for id_ in range(1, 201)]
+        cls.moves = [data_handler.create_move(make_move(id_))
+                     for id_ in range(1, 101)]
+        cls.index = pokedex.PokeIndex()
+        cls.index.add_all(cls.pokemon + cls.moves + [
+            data_handler.create_ability(make_ability(id_))
+            for id_ in range(1, 21)])
+
+    def select(self, text):
+        return self.index.select(pokedex.PokeQuery.parse(text))
+
+    def test_filters_by_text_and_number_fields(self):
+        _, results, matched = self.select(
+            "pokemon type=fire speed>100 fields=name,type,speed")
+        expected = sorted(
+            pokemon.id_ for pokemon in self.pokemon
+            if 'fire' in pokemon.types and dict(pokemon.stats)['speed'] > 100)
+        self.assertEqual(matched, len(expected))
+        self.assertEqual([int(name.rpartition('-')[2])
+                          for name, _, _ in results], expected)
+        self.assertTrue(all('fire' in types and speed > 100
+                            for _, types, speed in results))
+
+    def test_counts_matches_before_the_limit(self):
+        _, results, matched = self.select("move type!=normal limit=3")
+        expected = sum(move.type_ != 'normal' for move in self.moves)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(matched, expected)
+
+    def test_sorts_in_descending_order(self):
+        _, results, _ = self.select("move power>=60 sort=-power "
+                                    "fields=power")
+        powers = [power for power, in results]
+        self.assertEqual(powers, sorted(powers, reverse=True))
+        self.assertTrue(all(power >= 60 for power in powers))
+
+    def test_rejects_invalid_queries(self):
+        for text in ("", "pokemon speed~1", "pokemon type>fire",
+                     "pokemon colour=red", "berry id=1"):
+            with self.assertRaises(pokedex.QueryError):
+                self.select(text)
+
+    def test_shares_the_name_tables_of_its_data_handler(self):
+        stats, moves = self.pokemon[0].stats, self.pokemon[0].moves
+        self.assertTrue(all(pokemon.stats.table is stats.table
+                            and pokemon.moves.table is moves.table
+                            for pokemon in self.pokemon))
+        pokemon = pokedex.DataHandler().create_pokemon(make_pokemon(1))
+        self.assertIsNot(pokemon.stats.table, stats.table)
+        self.assertEqual(list(pokemon.stats), list(stats))
+
+
+class QueryModeTest(unittest.TestCase):
+
+    def test_reports_the_matches_and_the_results_shown(self):
+        server = SmallStubServer()
+        server.start()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                store = os.path.join(directory, "store.db")
+                run_pokedex(pokedex, server.api_url, 'snapshot', store, None)
+                request = pokedex.PokeRequest()
+                request.mode = 'query'
+                request.input = "pokemon id>=1 limit=2"
+                request.offline = store
+                request.output = 'print'
+                pokedex_ = pokedex.PokeDex()
+                pokedex_.set_request(request)
+                stdout, stderr = io.StringIO(), io.StringIO()
+                with contextlib.redirect_stdout(stdout), \
+                        contextlib.redirect_stderr(stderr):
+                    pokedex_.start_pokedex()
+        finally:
+            server.stop()
+        self.assertIn("12 of 12 pokemon matched, showing 2",
+                      stderr.getvalue())
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
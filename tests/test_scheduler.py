@@ -0,0 +1,199 @@
+"""Tests of the RequestScheduler against the stub PokeAPI of the
+benchmarks."""
+
+import asyncio
+import contextlib
+import io
+import socket
+import sys
+import time
+import unittest
+from unittest import mock
+
+import aiohttp
+
+import pokedex
+from benchmark import StubServer
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer()
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def fetch_all(self, scheduler, ids):
+        async def fetch():
+            async with aiohttp.ClientSession() as session:
+                return await asyncio.gather(*[
+                    scheduler.fetch(session,
+                                    f"{self.server.api_url}/pokemon/{id_}/",
+                                    endpoint='pokemon')
+                    for id_ in ids])
+        return asyncio.run(fetch())
+
+    def test_runs_in_consecutive_event_loops(self):
+        scheduler = pokedex.RequestScheduler(concurrency=1)
+        for ids in ([1, 2], [3, 4]):
+            responses = self.fetch_all(scheduler, ids)
+            self.assertEqual(len(responses), 2)
+            self.assertTrue(all(body for body, _ in responses))
+        self.assertEqual(scheduler.sent, 4)
+
+    def test_records_every_attempt_in_the_metrics(self):
+        scheduler = pokedex.RequestScheduler(concurrency=1)
+        scheduler.metrics = pokedex.Metrics()
+        self.fetch_all(scheduler, [1])
+        with self.assertRaises(pokedex.PokeAPIError):
+            self.fetch_all(scheduler, [99999])
+        metrics = scheduler.metrics.stages[('network', 'pokemon')]
+        self.assertEqual((metrics.count, metrics.timed, metrics.errors),
+                         (2, 2, 1))
+        self.assertIn('pokedex_stage_errors_total{stage="network",'
+                      'endpoint="pokemon"} 1', scheduler.metrics.prometheus())
+
+    def test_creates_no_asyncio_primitive_outside_a_loop(self):
+        scheduler = pokedex.RequestScheduler(concurrency=1)
+        self.assertIsNone(scheduler.semaphore)
+
+    def test_reports_why_a_listing_failed(self):
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+        request = pokedex.PokeRequest()
+        request.mode = 'pokemon'
+        request.input = 'all'
+        request.use_cache = False
+        request.retries = 0
+        request.api_url = f"http://127.0.0.1:{port}/api/v2"
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            pokedex_.start_pokedex()
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertIn(f"Could not retrieve {request.api_url}/pokemon/",
+                      stderr.getvalue())
+
+
+class ConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(latency=0.02)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_bounds_the_requests_in_flight(self):
+        scheduler = pokedex.RequestScheduler(concurrency=3)
+
+        async def fetch():
+            async with aiohttp.ClientSession() as session:
+                return await asyncio.gather(*[
+                    scheduler.fetch(session,
+                                    f"{self.server.api_url}/move/{id_}/",
+                                    endpoint='move')
+                    for id_ in range(1, 13)])
+
+        self.assertEqual(len(asyncio.run(fetch())), 12)
+        self.assertEqual(self.server.max_in_flight, 3)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_paces_acquisitions_once_the_burst_is_spent(self):
+        bucket = pokedex.TokenBucket(rate=50, capacity=2)
+
+        async def acquire(count):
+            start = time.monotonic()
+            for _ in range(count):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertLess(asyncio.run(acquire(2)), 0.01)
+        elapsed = asyncio.run(acquire(5))
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 0.5)
+
+    def test_starts_with_a_burst_of_one_second(self):
+        self.assertEqual(pokedex.TokenBucket(rate=20).capacity, 20)
+        self.assertEqual(pokedex.TokenBucket(rate=0.5).capacity, 1)
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def parse(self, *options):
+        arguments = ['pokedex.py', 'pokemon', '1', *options]
+        with mock.patch.object(sys, 'argv', arguments), \
+                contextlib.redirect_stderr(io.StringIO()) as stderr:
+            try:
+                return pokedex.setup_request_commandline(), ''
+            except SystemExit:
+                return None, stderr.getvalue()
+
+    def test_rejects_concurrency_and_timeouts_below_their_bounds(self):
+        for options, message in (
+                (('--concurrency', '0'), "--concurrency must be at least 1"),
+                (('--concurrency', '-2'), "--concurrency must be at least 1"),
+                (('--timeout', '0'), "--timeout must be greater than 0"),
+                (('--timeout', '-1.5'), "--timeout must be greater than 0")):
+            with self.subTest(options=options):
+                request, error = self.parse(*options)
+                self.assertIsNone(request)
+                self.assertIn(message, error)
+
+    def test_accepts_the_smallest_valid_values(self):
+        request, _ = self.parse('--concurrency', '1', '--timeout', '0.5',
+                                '--rate', '0', '--connections', '0')
+        self.assertEqual((request.concurrency, request.timeout), (1, 0.5))
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(error_rate=1.0)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_retries_until_it_runs_out_of_retries(self):
+        scheduler = pokedex.RequestScheduler(retries=2, backoff=0.001)
+        scheduler.metrics = pokedex.Metrics()
+
+        async def fetch():
+            async with aiohttp.ClientSession() as session:
+                await scheduler.fetch(
+                    session, f"{self.server.api_url}/pokemon/1/",
+                    endpoint='pokemon')
+
+        with self.assertRaises(pokedex.PokeAPIError) as error:
+            asyncio.run(fetch())
+        self.assertEqual(error.exception.status, 503)
+        self.assertEqual((scheduler.sent, scheduler.retried), (3, 2))
+        self.assertEqual(self.server.requests, 3)
+        metrics = scheduler.metrics.stages[('network', 'pokemon')]
+        self.assertEqual((metrics.count, metrics.errors, metrics.retries),
+                         (3, 3, 2))
+
+    def test_returns_an_error_per_failed_item(self):
+        caller = pokedex.PokeAPICaller(
+            scheduler=pokedex.RequestScheduler(retries=1, backoff=0.001),
+            api_url=self.server.api_url)
+        self.server.error_rate = 0.0
+        urls = [caller.pokemon_url.format(key) for key in (1, 99999, 2)]
+        datum = asyncio.run(caller.process_multiple_url(urls))
+        self.assertEqual([data["id"] for data in datum[::2]], [1, 2])
+        self.assertIsInstance(datum[1], pokedex.PokeAPIError)
+        self.assertEqual(datum[1].status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
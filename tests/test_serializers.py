@@ -0,0 +1,162 @@
+"""Tests of the machine-readable serializers of PokeData."""
+
+import asyncio
+import csv
+import io
+import json
+import unittest
+
+import pokedex
+from benchmark import StubServer
+
+
+def make_pokemon():
+    return pokedex.Pokemon(
+        "mr-mime", 122, 13, 545, [("hp", 40), ("speed", 90)],
+        ["psychic", "fairy"], ["filter", "soundproof"],
+        [("barrier", 1), ("pipe|line", 12), ("back\\slash", 0)])
+
+
+def make_ability():
+    return pokedex.Ability(
+        "filter", 111, "generation-iv", "Takes less damage, \"super\".",
+        "Less damage from super effective moves.",
+        ["mr-mime", "a|b", "c\\|d"])
+
+
+def make_move():
+    return pokedex.Moves("barrier", 112, "generation-i", None, 20, None,
+                         "psychic", "status", "Raises Defense, by two.")
+
+
+class ColumnarSerializerTest(unittest.TestCase):
+
+    def test_reads_back_what_it_writes(self):
+        output = io.BytesIO()
+        serializer = pokedex.ColumnarSerializer(output, row_group_size=2)
+        serializer.write_all([make_pokemon(), make_ability(), make_move(),
+                              make_pokemon(), make_pokemon(),
+                              pokedex.Stats("hp", 1, False)])
+        serializer.close()
+        output.seek(0)
+        row_groups = pokedex.ColumnarSerializer.read(output)
+        self.assertEqual([name for name, _ in row_groups],
+                         ['Pokemon', 'Ability', 'Moves', 'Pokemon', 'Stats'])
+        pokemon = row_groups[0][1]
+        self.assertEqual(list(pokemon), list(
+            pokedex.Serializer.fields['Pokemon']))
+        self.assertEqual(pokemon['name'], ["mr-mime", "mr-mime"])
+        self.assertEqual(pokemon['types'], [["psychic", "fairy"]] * 2)
+        self.assertEqual(pokemon['stats'], [["hp", "speed"]] * 2)
+        self.assertEqual(pokemon['base_stats'], [[40, 90]] * 2)
+        self.assertEqual(pokemon['moves'],
+                         [["barrier", "pipe|line", "back\\slash"]] * 2)
+        self.assertEqual(pokemon['move_levels'], [[1, 12, 0]] * 2)
+        self.assertEqual(row_groups[3][1]['id'], [122])
+        ability = row_groups[1][1]
+        self.assertEqual(ability['effect'], ["Takes less damage, \"super\"."])
+        self.assertEqual(ability['pokemon'], [["mr-mime", "a|b", "c\\|d"]])
+        move = row_groups[2][1]
+        self.assertEqual(move['accuracy'], [None])
+        self.assertEqual(move['pp'], [20])
+        self.assertEqual(move['power'], [None])
+        self.assertEqual(row_groups[4][1], {
+            'name': ["hp"], 'id': [1], 'is_battle_only': [0]})
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            pokedex.ColumnarSerializer.read(io.BytesIO(b"name,id\n"))
+
+
+class CsvSerializerTest(unittest.TestCase):
+
+    @staticmethod
+    def split_list(field):
+        items, item, escaped = [], '', False
+        for char in field:
+            if escaped:
+                item += char
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '|':
+                items.append(item)
+                item = ''
+            else:
+                item += char
+        return items + [item]
+
+    def write_rows(self, datum):
+        output = io.StringIO()
+        serializer = pokedex.CsvSerializer(output)
+        serializer.write_all(datum)
+        serializer.close()
+        return list(csv.reader(io.StringIO(output.getvalue())))
+
+    def test_escapes_list_fields(self):
+        rows = self.write_rows([make_pokemon(), make_ability()])
+        header, pokemon, ability_header, ability = rows
+        self.assertEqual(header, list(pokedex.Serializer.fields['Pokemon']))
+        pokemon = dict(zip(header, pokemon))
+        self.assertEqual(pokemon['moves'], "barrier|pipe\\|line|back\\\\slash")
+        self.assertEqual(self.split_list(pokemon['moves']),
+                         ["barrier", "pipe|line", "back\\slash"])
+        self.assertEqual(pokemon['move_levels'], "1|12|0")
+        ability = dict(zip(ability_header, ability))
+        self.assertEqual(ability['effect'], "Takes less damage, \"super\".")
+        self.assertEqual(self.split_list(ability['pokemon']),
+                         ["mr-mime", "a|b", "c\\|d"])
+
+    def test_writes_a_header_when_the_class_changes(self):
+        rows = self.write_rows([make_move(), make_move(), make_ability(),
+                                make_move()])
+        self.assertEqual([row[0] for row in rows],
+                         ['name', 'barrier', 'barrier', 'name', 'filter',
+                          'name', 'barrier'])
+
+
+class JsonLinesSerializerTest(unittest.TestCase):
+
+    def write_records(self, datum):
+        output = io.StringIO()
+        serializer = pokedex.JsonLinesSerializer(output)
+        serializer.write_all(datum)
+        serializer.close()
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_keeps_list_fields_as_lists(self):
+        pokemon, ability = self.write_records([make_pokemon(),
+                                               make_ability()])
+        self.assertEqual(pokemon['moves'], [
+            {"name": "barrier", "level_learned_at": 1},
+            {"name": "pipe|line", "level_learned_at": 12},
+            {"name": "back\\slash", "level_learned_at": 0}])
+        self.assertEqual(pokemon['stats'], {"hp": 40, "speed": 90})
+        self.assertEqual(ability['pokemon'], ["mr-mime", "a|b", "c\\|d"])
+        self.assertEqual(ability['effect'], "Takes less damage, \"super\".")
+
+    def test_writes_lazy_pokemon_in_a_running_loop_by_name(self):
+        server = StubServer()
+        server.start()
+        self.addCleanup(server.stop)
+        client = pokedex.PokeDexClient(use_cache=False, concurrency=1,
+                                       api_url=server.api_url)
+
+        async def render():
+            async with client:
+                pokemon, = await client.fetch_pokemon(6, lazy=True)
+                unresolved = self.write_records([pokemon])
+                await pokemon.prefetch()
+                return pokemon, unresolved, self.write_records([pokemon])
+
+        pokemon, (unresolved,), (resolved,) = asyncio.run(render())
+        self.assertEqual(unresolved['moves'], list(pokemon.moves.names))
+        self.assertEqual(unresolved['abilities'],
+                         list(pokemon.abilities.names))
+        self.assertEqual([move['name'] for move in resolved['moves']],
+                         list(pokemon.moves.names))
+        self.assertIn("is_battle_only", resolved['stats'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Tests of serve mode against the stub PokeAPI of the benchmarks."""
+
+import asyncio
+import json
+import unittest
+
+from aiohttp import ClientSession, web
+
+import pokedex
+from benchmark import StubServer
+
+
+class ParseAddressTest(unittest.TestCase):
+
+    def test_parses_a_port_and_a_host(self):
+        self.assertEqual(pokedex.PokeDexService.parse_address("8080"),
+                         (pokedex.DEFAULT_SERVICE_HOST, 8080))
+        self.assertEqual(pokedex.PokeDexService.parse_address("0.0.0.0:80"),
+                         ("0.0.0.0", 80))
+
+    def test_rejects_malformed_addresses(self):
+        for address in ("", "localhost", "localhost:http", "8080:", "0",
+                        "70000", "-1"):
+            with self.assertRaises(pokedex.InputError):
+                pokedex.PokeDexService.parse_address(address)
+
+
+class PokeDexServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(latency=0.05)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def serve(self, use):
+        """
+        Runs a PokeDexService over the stub PokeAPI while a coroutine uses
+        it through a session of its own
+        :param use: a coroutine function of the session and the service URL
+        :return: what the coroutine returns
+        """
+        request = pokedex.PokeRequest()
+        request.mode = 'serve'
+        request.use_cache = False
+        request.api_url = self.server.api_url
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        service = pokedex.PokeDexService(pokedex_)
+
+        async def run():
+            async with pokedex_.api_caller:
+                runner = web.AppRunner(service.create_app())
+                await runner.setup()
+                try:
+                    site = web.TCPSite(runner, '127.0.0.1', 0)
+                    await site.start()
+                    port = runner.addresses[0][1]
+                    async with ClientSession() as session:
+                        return await use(session, f"http://127.0.0.1:{port}")
+                finally:
+                    await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_looks_up_pokemon(self):
+        async def use(session, url):
+            async with session.get(f"{url}/pokemon/25") as response:
+                pokemon = (response.status, await response.json())
+            async with session.get(f"{url}/pokemon/pokemon-3?expanded=1") \
+                    as response:
+                expanded = await response.json()
+            async with session.get(f"{url}/pokemon/99999") as response:
+                missing = (response.status, await response.json())
+            return pokemon, expanded, missing
+
+        pokemon, expanded, missing = self.serve(use)
+        self.assertEqual(pokemon[0], 200)
+        self.assertEqual((pokemon[1]["name"], pokemon[1]["id"]),
+                         ("pokemon-25", 25))
+        self.assertEqual(expanded["id"], 3)
+        self.assertIn("is_battle_only", expanded["stats"][0])
+        self.assertIn("damage_class", expanded["moves"][0])
+        self.assertEqual(missing[0], 404)
+        self.assertIn("error", missing[1])
+
+    def test_answers_a_batch_in_order(self):
+        async def use(session, url):
+            async with session.post(f"{url}/batch", json={
+                    "mode": "move", "ids": [3, "move-1", 99999]}) as response:
+                return response.status, await response.json()
+
+        status, moves = self.serve(use)
+        self.assertEqual(status, 200)
+        self.assertEqual([move.get("id") for move in moves], [3, 1, None])
+        self.assertIn("error", moves[2])
+
+    def test_rejects_malformed_batches(self):
+        bodies = [b"not json", json.dumps({"ids": [1]}).encode(),
+                  json.dumps({"mode": "berry", "ids": [1]}).encode(),
+                  json.dumps({"mode": "move", "ids": 1}).encode()]
+
+        async def use(session, url):
+            statuses = []
+            for body in bodies:
+                async with session.post(f"{url}/batch", data=body) \
+                        as response:
+                    statuses.append(response.status)
+            return statuses
+
+        self.assertEqual(self.serve(use), [400] * len(bodies))
+
+    def test_coalesces_concurrent_lookups(self):
+        async def get(session, url):
+            async with session.get(url) as response:
+                return await response.json()
+
+        async def use(session, url):
+            requests = self.server.requests
+            pokemon = await asyncio.gather(
+                *[get(session, f"{url}/pokemon/{key}")
+                  for key in ["7"] * 5 + ["POKEMON-7"] * 5])
+            fetched = self.server.requests - requests
+            cached = await get(session, f"{url}/pokemon/7")
+            stats = await get(session, f"{url}/stats")
+            return pokemon, fetched, cached, stats
+
+        pokemon, fetched, cached, stats = self.serve(use)
+        self.assertEqual(fetched, 2)
+        self.assertEqual({data["name"] for data in pokemon}, {"pokemon-7"})
+        self.assertEqual(cached, pokemon[0])
+        self.assertEqual(stats["lookups"], 11)
+        self.assertEqual(stats["coalesced"], 8)
+        self.assertEqual(stats["responses_cached"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Tests that a whole PokeDex run shares one session against the stub
+PokeAPI of the benchmarks."""
+
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import StubServer, run_pokedex
+
+
+class SharedSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "dex.txt")
+
+    def test_expanded_run_reuses_its_connections(self):
+        run_pokedex(pokedex, self.server.api_url, 'pokemon', "1-20",
+                    self.output, expanded=True)
+        self.assertGreater(self.server.requests, 100)
+        self.assertLessEqual(len(self.server.connections),
+                             pokedex.DEFAULT_CONNECTION_LIMIT_PER_HOST)
+        with open(self.output) as report:
+            self.assertEqual(report.read().count("Name: pokemon-"), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests of snapshot and sync mode against the stub PokeAPI of the
+benchmarks."""
+
+import json
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import make_ability, make_move, run_pokedex
+from tests.stubs import COUNTS, SmallStubServer
+
+
+class SnapshotSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SmallStubServer()
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = os.path.join(self.directory.name, "store.db")
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def run_mode(self, mode: str, cache_ttl: int = 3600) -> int:
+        requests = self.server.requests
+        run_pokedex(pokedex, self.server.api_url, mode, self.store, None,
+                    cache_dir=self.cache_dir, cache_ttl=cache_ttl)
+        return self.server.requests - requests
+
+    def test_snapshot_stores_every_resource(self):
+        self.run_mode('snapshot')
+        store = pokedex.SnapshotStore(self.store)
+        try:
+            for endpoint, count in COUNTS.items():
+                self.assertEqual(store.ids_of(endpoint),
+                                 set(range(1, count + 1)))
+            self.assertEqual(store.get('pokemon', 'pokemon-3')["id"], 3)
+        finally:
+            store.close()
+
+    def test_snapshot_writes_a_sync_manifest(self):
+        self.run_mode('snapshot')
+        with open(self.store + pokedex.MANIFEST_SUFFIX,
+                  encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(manifest["api_url"], self.server.api_url)
+        for endpoint, count in COUNTS.items():
+            resources = manifest["endpoints"][endpoint]["resources"]
+            self.assertEqual(len(resources), count)
+            self.assertTrue(all(entry["validators"]
+                                for entry in resources.values()))
+
+    def test_sync_after_snapshot_only_lists(self):
+        self.run_mode('snapshot')
+        self.assertEqual(self.run_mode('sync'), len(COUNTS))
+
+    def test_sync_revalidates_due_resources(self):
+        self.run_mode('sync')
+        not_modified = self.server.not_modified
+        requests = self.run_mode('sync', cache_ttl=0)
+        self.assertEqual(requests, len(COUNTS) + sum(COUNTS.values()))
+        self.assertEqual(self.server.not_modified - not_modified,
+                         sum(COUNTS.values()))
+
+
+class CompactTest(unittest.TestCase):
+
+    @staticmethod
+    def german_first(data: dict) -> dict:
+        entry = dict(data["effect_entries"][0], effect="Effekt",
+                     short_effect="Kurzer Effekt", language={"name": "de"})
+        return dict(data, effect_entries=[entry] + data["effect_entries"])
+
+    def test_ability_renders_the_same_offline(self):
+        data = self.german_first(make_ability(4))
+        online = pokedex.DataHandler.create_ability(data)
+        offline = pokedex.DataHandler.create_ability(
+            pokedex.SnapshotStore.compact('ability', data))
+        self.assertEqual(online.effect, "Effect of ability 4.")
+        self.assertEqual(str(online), str(offline))
+
+    def test_move_renders_the_same_offline(self):
+        data = self.german_first(make_move(4))
+        online = pokedex.DataHandler.create_move(data)
+        offline = pokedex.DataHandler.create_move(
+            pokedex.SnapshotStore.compact('move', data))
+        self.assertEqual(online.effect_short, "Short effect of move 4.")
+        self.assertEqual(str(online), str(offline))
+
+
+if __name__ == '__main__':
+    unittest.main()
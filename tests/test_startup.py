@@ -0,0 +1,78 @@
+"""Tests of the modules the command line imports in a fresh interpreter,
+against the stub PokeAPI of the benchmarks."""
+
+import os.path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import DEFAULT_CACHE_TTL, StubServer, run_pokedex
+
+
+class StartupImportsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer()
+        cls.server.start()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cache_dir = os.path.join(cls.directory.name, "cache")
+        run_pokedex(pokedex, cls.server.api_url, 'pokemon', '25', os.devnull,
+                    False, cls.cache_dir, DEFAULT_CACHE_TTL)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        cls.directory.cleanup()
+
+    def imports(self, *args) -> set:
+        """
+        Runs the command line in a fresh interpreter
+        :param args: the arguments of the command line
+        :return: a set of the modules it imported and of their packages
+        """
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', pokedex.__file__, *args],
+            capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        imports = set()
+        for line in process.stderr.splitlines():
+            if line.startswith("import time:") and '|' in line:
+                parts = line.rpartition('|')[2].strip().split('.')
+                imports.update('.'.join(parts[:end])
+                               for end in range(1, len(parts) + 1))
+        return imports
+
+    def assertNotImported(self, imports: set):
+        for module in ('aiohttp', 'multiprocessing',
+                       'concurrent.futures.process'):
+            self.assertNotIn(module, imports)
+
+    def lookup(self, key: str) -> set:
+        output = os.path.join(self.directory.name, f"{key}.txt")
+        imports = self.imports('pokemon', key, '--api-url',
+                               self.server.api_url, '--cache-dir',
+                               self.cache_dir, '--output', output)
+        with open(output) as report:
+            self.assertIn(f"Name: pokemon-{key}", report.read())
+        return imports
+
+    def test_help_does_not_import_heavy_modules(self):
+        imports = self.imports('--help')
+        self.assertIn('argparse', imports)
+        self.assertNotImported(imports)
+
+    def test_warm_cache_lookup_does_not_import_heavy_modules(self):
+        requests = self.server.requests
+        imports = self.lookup('25')
+        self.assertEqual(self.server.requests, requests)
+        self.assertNotImported(imports)
+
+    def test_cold_lookup_imports_aiohttp(self):
+        self.assertIn('aiohttp', self.lookup('26'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests of stream mode against the stub PokeAPI of the benchmarks."""
+
+import contextlib
+import io
+import json
+import os.path
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pokedex
+from benchmark import make_pokemon
+from tests.stubs import COUNTS, SmallStubServer
+
+
+def make_broken_pokemon(id_: int, api_url: str) -> dict:
+    """
+    Creates a Pokemon whose even IDs are missing their stats
+    """
+    data = make_pokemon(id_, api_url)
+    if id_ % 2 == 0:
+        del data["stats"]
+    return data
+
+
+class BrokenStubServer(SmallStubServer):
+    """A stub PokeAPI serving Pokemon that cannot all be created"""
+
+    makers = dict(SmallStubServer.makers,
+                  pokemon=(make_broken_pokemon, COUNTS['pokemon']))
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BrokenStubServer()
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "dex.jsonl")
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def stream(self, input_: str) -> list:
+        request = pokedex.PokeRequest()
+        request.mode = 'pokemon'
+        request.input = input_
+        request.output = self.output
+        request.output_format = 'jsonl'
+        request.use_cache = False
+        request.stream = True
+        request.ordered = True
+        request.api_url = self.server.api_url
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            pokedex_.start_pokedex()
+        with open(self.output, encoding='utf-8') as output:
+            return [json.loads(line) for line in output]
+
+    def test_reports_items_that_cannot_be_created_in_place(self):
+        records = self.stream("1-5,99")
+        self.assertEqual([record.get("id") for record in records],
+                         [1, None, 3, None, 5, None])
+        self.assertIn("KeyError", records[1]["error"])
+        self.assertTrue(records[3]["url"].endswith("/pokemon/4/"))
+        self.assertEqual(records[5]["status"], 404)
+
+    def test_rejects_workers(self):
+        arguments = ['pokedex.py', 'pokemon', '1', '--stream', '--workers',
+                     '2']
+        with mock.patch.object(sys, 'argv', arguments), \
+                contextlib.redirect_stderr(io.StringIO()), \
+                self.assertRaises(SystemExit):
+            pokedex.setup_request_commandline()
+
+    def test_rejects_an_empty_window(self):
+        for window in ('0', '-1'):
+            arguments = ['pokedex.py', 'pokemon', '1', '--stream',
+                         '--stream-window', window]
+            with self.subTest(window=window), \
+                    mock.patch.object(sys, 'argv', arguments), \
+                    contextlib.redirect_stderr(io.StringIO()) as stderr, \
+                    self.assertRaises(SystemExit):
+                pokedex.setup_request_commandline()
+            self.assertIn("--stream-window must be at least 1",
+                          stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests of the PokeTables build over generated PokeData, and of tables mode
+over a cache of the stub PokeAPI of the benchmarks."""
+
+from array import array
+import io
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import (MOVE_COUNT, TYPES, make_move, make_pokemon,
+                       make_type, run_pokedex)
+from tests.stubs import COUNTS, SmallStubServer
+
+
+class MovesStubServer(SmallStubServer):
+    """A stub PokeAPI with a few Pokemon and every Move they learn"""
+
+    makers = dict(SmallStubServer.makers, move=(make_move, MOVE_COUNT))
+
+
+class PokeTablesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_handler = pokedex.DataHandler()
+        cls.pokemon = [data_handler.create_pokemon(make_pokemon(id_))
+                       for id_ in range(40, 0, -1)]
+        cls.moves = [data_handler.create_move(make_move(id_))
+                     for id_ in range(1, 101)]
+        cls.types = [make_type(id_) for id_ in range(1, len(TYPES) + 1)]
+        cls.tables = pokedex.PokeTables.build(cls.pokemon, cls.moves,
+                                              cls.types)
+
+    def test_builds_a_row_per_pokemon_in_id_order(self):
+        self.assertEqual(len(self.tables), 40)
+        self.assertEqual(list(self.tables.ids), list(range(1, 41)))
+        pokemon = self.pokemon[-3]
+        self.assertEqual(self.tables.stats_of(pokemon.name),
+                         dict(pokemon.stats))
+        self.assertEqual(self.tables.stats_of(3), dict(pokemon.stats))
+
+    def test_computes_the_type_chart(self):
+        count = len(TYPES)
+        for attacking, type_data in enumerate(self.types):
+            relations = type_data["damage_relations"]
+            for relation, multiplier in (('double_damage_to', 2.0),
+                                         ('half_damage_to', 0.5),
+                                         ('no_damage_to', 0.0)):
+                for defending in relations[relation]:
+                    position = TYPES.index(defending["name"])
+                    self.assertEqual(self.tables.effectiveness[
+                        attacking * count + position], multiplier)
+
+    def test_computes_the_coverage_of_damaging_moves(self):
+        pokemon = self.pokemon[-1]
+        moves = {move.name: move for move in self.moves}
+        expected = {moves[name].type_ for name, _ in pokemon.moves
+                    if name in moves and moves[name].power
+                    and moves[name].damage_class != 'status'}
+        self.assertEqual(set(self.tables.coverage_of(1)), expected)
+
+    def test_round_trips_through_a_tables_file(self):
+        output = io.BytesIO()
+        self.tables.write(output)
+        output.seek(0)
+        tables = pokedex.PokeTables.read(output)
+        self.assertEqual(tables.pokemon, self.tables.pokemon)
+        self.assertEqual(tables.type_names, self.tables.type_names)
+        for name in pokedex.PokeTables.tables:
+            self.assertEqual(getattr(tables, name),
+                             getattr(self.tables, name))
+        self.assertEqual(tables.best_counters([1, 2]),
+                         self.tables.best_counters([1, 2]))
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            pokedex.PokeTables.read(io.BytesIO(b"not tables"))
+
+    def test_ranks_counters_outside_of_the_team(self):
+        counters = self.tables.best_counters(["pokemon-1", 2], limit=None)
+        self.assertEqual(len(counters), 38)
+        self.assertNotIn(1, [id_ for _, id_, _, _, _ in counters])
+        keys = [(-score, -total, id_) for _, id_, score, total, _ in counters]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(self.tables.best_counters([1], limit=5)), 5)
+        with self.assertRaises(KeyError):
+            self.tables.best_counters(["missingno"])
+
+    @unittest.skipUnless(pokedex.NUMPY_AVAILABLE, "NumPy is not installed")
+    def test_scores_the_same_vectorized(self):
+        members = [0, 5, 9]
+        for loops, vectorized in zip(
+                self.tables.score_counters(members),
+                self.tables.score_counters_vectorized(members)):
+            self.assertAlmostEqual(loops, vectorized, places=5)
+
+
+class TablesModeTest(unittest.TestCase):
+
+    def test_writes_the_tables_of_a_cache(self):
+        server = MovesStubServer()
+        server.start()
+        with tempfile.TemporaryDirectory() as directory:
+            cache_dir = os.path.join(directory, "cache")
+            tables_file = os.path.join(directory, "dex.pkdt")
+            try:
+                run_pokedex(pokedex, server.api_url, 'pokemon', "all",
+                            os.path.join(directory, "dex.txt"),
+                            cache_dir=cache_dir, cache_ttl=3600)
+                run_pokedex(pokedex, server.api_url, 'tables', tables_file,
+                            None, cache_dir=cache_dir, cache_ttl=3600)
+            finally:
+                server.stop()
+            with open(tables_file, mode='rb') as input_file:
+                tables = pokedex.PokeTables.read(input_file)
+        self.assertEqual(len(tables), COUNTS['pokemon'])
+        self.assertEqual(tables.type_names, TYPES)
+        self.assertTrue(all(tables.coverage))
+        counters = tables.best_counters([1, 2], limit=None)
+        tables.coverage = array('Q', [0]) * len(tables)
+        self.assertNotEqual(tables.best_counters([1, 2], limit=None),
+                            counters)
+
+
+if __name__ == '__main__':
+    unittest.main()
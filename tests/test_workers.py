@@ -0,0 +1,62 @@
+"""Tests of creating and rendering PokeData in worker processes against
+the stub PokeAPI of the benchmarks."""
+
+import contextlib
+import io
+import os.path
+import tempfile
+import unittest
+
+import pokedex
+from benchmark import StubServer
+
+
+class WorkersTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer()
+        cls.server.start()
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        cls.directory.cleanup()
+
+    def report(self, mode: str, output_format: str, workers: int,
+               expanded: bool = False) -> bytes:
+        output = os.path.join(self.directory.name,
+                              f"{mode}-{output_format}-{workers}")
+        request = pokedex.PokeRequest()
+        request.mode = mode
+        request.input = "1-8,3,pokemon-2"
+        request.expanded = expanded
+        request.output = output
+        request.output_format = output_format
+        request.cache_dir = os.path.join(self.directory.name, "cache")
+        request.api_url = self.server.api_url
+        request.workers = workers
+        pokedex_ = pokedex.PokeDex()
+        pokedex_.set_request(request)
+        with contextlib.redirect_stdout(io.TextIOWrapper(io.BytesIO())), \
+                contextlib.redirect_stderr(io.StringIO()):
+            pokedex_.start_pokedex()
+        with open(output, mode='rb') as report:
+            return report.read()
+
+    def test_reports_the_same_bytes_as_a_single_process(self):
+        for output_format in ('text', 'jsonl', 'csv', 'columnar'):
+            for mode, expanded in (('pokemon', False), ('pokemon', True),
+                                   ('ability', False), ('move', False)):
+                with self.subTest(output_format=output_format, mode=mode,
+                                  expanded=expanded):
+                    single = self.report(mode, output_format, 0, expanded)
+                    self.assertTrue(single)
+                    self.assertEqual(
+                        self.report(mode, output_format, 2, expanded),
+                        single)
+
+
+if __name__ == '__main__':
+    unittest.main()